@@ -4,7 +4,62 @@ import socket
 from datetime import datetime, timedelta
 import time
 import os
+import platform
+import gzip
+import json
+import math
+import random
+import sqlite3
+import subprocess
+import threading
 import netifaces
+from mining_monitor import get_cpu_mining_stats
+
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:  # Canal WebSocket optionnel
+    ws_connect = None
+
+# Fréquence d'échantillonnage (Hz) et intervalle d'envoi (secondes)
+SAMPLE_RATE = float(os.environ.get("MINEOPS_SAMPLE_RATE", "1"))
+REPORT_INTERVAL = int(os.environ.get("MINEOPS_REPORT_INTERVAL", "30"))
+
+# File d'attente sur disque des métriques non envoyées (API injoignable)
+SPOOL_PATH = os.environ.get("MINEOPS_SPOOL_PATH", "/var/lib/mineops-agent/spool.db")
+SPOOL_MAX_BYTES = int(os.environ.get("MINEOPS_SPOOL_MAX_BYTES", str(50 * 1024 * 1024)))
+# Secret remis au premier enregistrement, exigé pour se réenregistrer et ouvrir le canal
+SECRET_PATH = os.environ.get("MINEOPS_AGENT_SECRET_PATH", "/var/lib/mineops-agent/agent_secret")
+SPOOL_MAX_AGE = int(os.environ.get("MINEOPS_SPOOL_MAX_AGE", str(7 * 86400)))  # Rétention brute de l'API
+REPLAY_BATCH_SIZE = 500
+
+# Timeouts HTTP (connexion, lecture) et taille à partir de laquelle le corps est compressé
+CONNECT_TIMEOUT = float(os.environ.get("MINEOPS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("MINEOPS_READ_TIMEOUT", "30"))
+GZIP_MIN_SIZE = 1024
+BACKOFF_BASE = 5
+BACKOFF_MAX = 600
+
+# Mode d'envoi : "interval" (envoi complet toutes les REPORT_INTERVAL secondes) ou "adaptive"
+# (envoi dès qu'une valeur sort de sa bande morte, sinon simple battement de cœur)
+REPORT_MODE = os.environ.get("MINEOPS_REPORT_MODE", "interval").lower()
+CHECK_INTERVAL = float(os.environ.get("MINEOPS_CHECK_INTERVAL", "5"))
+# Doit rester sous le délai au-delà duquel l'API considère l'agent offline (2 min par défaut)
+HEARTBEAT_INTERVAL = float(os.environ.get("MINEOPS_HEARTBEAT_INTERVAL", "60"))
+# Envoi complet au moins à cet intervalle, même sans variation (disque, agrégats)
+MAX_REPORT_INTERVAL = float(os.environ.get("MINEOPS_MAX_REPORT_INTERVAL", "900"))
+# Bandes mortes : points de pourcentage, et variation relative pour le hashrate
+CPU_DEADBAND = float(os.environ.get("MINEOPS_CPU_DEADBAND", "5"))
+MEMORY_DEADBAND = float(os.environ.get("MINEOPS_MEMORY_DEADBAND", "2"))
+DISK_DEADBAND = float(os.environ.get("MINEOPS_DISK_DEADBAND", "1"))
+HASHRATE_DEADBAND = float(os.environ.get("MINEOPS_HASHRATE_DEADBAND", "0.05"))
+
+# Faits statiques : l'adresse IP (scan des interfaces) n'est revérifiée qu'à cet intervalle
+FACTS_CHECK_INTERVAL = float(os.environ.get("MINEOPS_FACTS_CHECK_INTERVAL", "300"))
+REGISTER_RETRY = 60
+
+# Canal WebSocket persistant (échantillons montants, commandes descendantes), désactivé par défaut
+AGENT_CHANNEL = os.environ.get("MINEOPS_AGENT_CHANNEL", "0") == "1"
+COMMAND_TIMEOUT = 30
 
 def get_api_url():
     """Récupère l'URL de l'API depuis la variable d'environnement ou fallback"""
@@ -34,56 +89,571 @@ def get_ip_address():
     except Exception as e:
         print(f"Erreur lors du scan des interfaces: {e}")
 
-def get_uptime():
+def percentile(values, p):
+    """Percentile par rang le plus proche sur une liste triée"""
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+def summarize(prefix, values):
+    values = sorted(values)
+    return {
+        f"{prefix}_min": values[0],
+        f"{prefix}_max": values[-1],
+        f"{prefix}_p95": percentile(values, 95),
+    }, round(sum(values) / len(values), 2)
+
+class WindowSampler:
+    """Échantillonne CPU et mémoire en continu dans un thread (deltas psutil non bloquants).
+
+    Chaque envoi résume la fenêtre écoulée (moyenne, min, max, p95) : un arrêt de minage de
+    quelques secondes entre deux envois reste visible sans envoyer plus souvent.
+    """
+
+    def __init__(self, rate):
+        self.period = 1 / rate
+        self.lock = threading.Lock()
+        self.cpu = []
+        self.memory = []
+
+    def start(self):
+        psutil.cpu_percent(interval=None)  # Point de départ du premier delta
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.period
+            time.sleep(max(next_tick - time.monotonic(), 0))
+            cpu = psutil.cpu_percent(interval=None)
+            memory = psutil.virtual_memory().percent
+            with self.lock:
+                self.cpu.append(cpu)
+                self.memory.append(memory)
+
+    def collect(self):
+        """Retourne et réinitialise les échantillons de la fenêtre"""
+        with self.lock:
+            cpu, memory = self.cpu, self.memory
+            self.cpu, self.memory = [], []
+        if not cpu:
+            # Fenêtre vide (démarrage) : une mesure instantanée
+            cpu, memory = [psutil.cpu_percent(interval=None)], [psutil.virtual_memory().percent]
+        return cpu, memory
+
+    def recent(self, seconds):
+        """Moyennes CPU et mémoire des dernières `seconds` secondes, sans vider la fenêtre"""
+        count = max(int(seconds / self.period), 1)
+        with self.lock:
+            cpu, memory = self.cpu[-count:], self.memory[-count:]
+        if not cpu:
+            return psutil.cpu_percent(interval=None), psutil.virtual_memory().percent
+        return sum(cpu) / len(cpu), sum(memory) / len(memory)
+
+def get_os():
+    """Distribution (os-release) et version du noyau"""
+    name = platform.system()
     try:
-        boot_time = psutil.boot_time()
-        current_time = datetime.now().timestamp()
-        uptime_seconds = int(current_time - boot_time)
-        
-        days = uptime_seconds // 86400
-        hours = (uptime_seconds % 86400) // 3600
-        minutes = (uptime_seconds % 3600) // 60
-
-        uptime_format = []
-        if days > 0:
-            uptime_format.append(f"{days} jour{'s' if days > 1 else ''}")
-        if hours > 0:
-            uptime_format.append(f"{hours} heure{'s' if hours > 1 else ''}")
-        if minutes > 0:
-            uptime_format.append(f"{minutes} minute{'s' if minutes > 1 else ''}")
-        return ", ".join(uptime_format) if uptime_format else "moins d'une minute"
-    except Exception as e:
-        return f"Erreur: {e}"
+        with open("/etc/os-release") as f:
+            for line in f:
+                if line.startswith("PRETTY_NAME="):
+                    name = line.split("=", 1)[1].strip().strip('"')
+                    break
+    except OSError:
+        pass
+    return f"{name} ({platform.release()})"
 
-def get_metrics():
-    cpu_utilization = psutil.cpu_percent(interval=1)
-    memory_utilization = psutil.virtual_memory().percent
+def get_metrics(sampler, registration, miners=None):
+    cpu, memory = sampler.collect()
+    cpu_window, cpu_utilization = summarize("cpu", cpu)
+    memory_window, memory_utilization = summarize("memory", memory)
     disk_usage = psutil.disk_usage('/').percent
 
     metrics = {
         "cpu_utilization": cpu_utilization,
         "memory_utilization": memory_utilization,
         "disk_usage": disk_usage,
-        "ip_address": get_ip_address(),
-        "hostname": socket.gethostname(),
+        **cpu_window,
+        **memory_window,
         "last_seen": datetime.utcnow().isoformat(),
-        "uptime": get_uptime()
+        **registration.identity(),
     }
+    if miners is None:
+        miners = get_miners()
+    if miners:
+        metrics["miners"] = miners
     return metrics
 
-def send_metrics(metrics):
+def get_miners():
+    """Hashrate, shares et température de chaque mineur CPU (nom de processus unique par host)"""
     try:
-        response = requests.post(API_URL, json=metrics)
-        print(f"Status: {response.status_code} - {response.text}")
+        stats = get_cpu_mining_stats()
     except Exception as e:
-        print("Send error: ", e)
+        print(f"Erreur lors de la collecte des stats de mining : {e}")
+        return []
+    if not stats:
+        return []
+    miners = []
+    seen = {}
+    for miner in stats['cpu_miners']:
+        # Plusieurs instances du même mineur : suffixe pour les distinguer
+        seen[miner['process']] = seen.get(miner['process'], 0) + 1
+        name = miner['process'] if seen[miner['process']] == 1 else f"{miner['process']}#{seen[miner['process']]}"
+        miners.append({
+            "name": name,
+            "hashrate": miner['hashrate'],
+            "accepted_shares": miner['accepted_shares'],
+            "rejected_shares": miner['rejected_shares'],
+            "temp": miner['temp'],
+        })
+    return miners
+
+class ChangeDetector:
+    """Mode adaptatif : compare les valeurs courantes à celles du dernier envoi complet"""
+
+    def __init__(self):
+        self.reference = None
+
+    def changed(self, current):
+        reference = self.reference
+        if reference is None:
+            return True
+        if (abs(current["cpu"] - reference["cpu"]) > CPU_DEADBAND
+                or abs(current["memory"] - reference["memory"]) > MEMORY_DEADBAND
+                or abs(current["disk"] - reference["disk"]) > DISK_DEADBAND):
+            return True
+        # Mineur apparu ou arrêté
+        if current["miners"].keys() != reference["miners"].keys():
+            return True
+        for name, hashrate in current["miners"].items():
+            previous = reference["miners"][name]
+            if (hashrate is None) != (previous is None):
+                return True
+            if hashrate is not None and abs(hashrate - previous) > HASHRATE_DEADBAND * max(previous, 1):
+                return True
+        return False
+
+    def sent(self, current):
+        self.reference = current
+
+class Spool:
+    """File SQLite des métriques en attente, bornée en taille et en âge (les plus anciennes partent d'abord)"""
+
+    def __init__(self, path, max_bytes, max_age):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY, created REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._refresh()
+
+    def _refresh(self):
+        """Taille (caractères JSON) et nombre de métriques en attente"""
+        self.bytes, self.count = self.conn.execute(
+            "SELECT coalesce(sum(length(payload)), 0), count(*) FROM spool"
+        ).fetchone()
+
+    def append(self, metrics):
+        payload = json.dumps(metrics)
+        with self.conn:
+            self.conn.execute("INSERT INTO spool (created, payload) VALUES (?, ?)", (time.time(), payload))
+        self.bytes += len(payload)
+        self.count += 1
+        self.enforce_limits()
+
+    def enforce_limits(self):
+        cutoff = time.time() - self.max_age
+        oldest = self.conn.execute("SELECT created FROM spool ORDER BY id LIMIT 1").fetchone()
+        with self.conn:
+            if oldest and oldest[0] < cutoff:
+                self.conn.execute("DELETE FROM spool WHERE created < ?", (cutoff,))
+                self._refresh()
+            while self.bytes > self.max_bytes and self.count:
+                # Suppression par paquets de 10 % pour ne pas recalculer la taille à chaque ligne
+                self.conn.execute(
+                    "DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)",
+                    (max(self.count // 10, 1),),
+                )
+                self._refresh()
+
+    def peek(self, limit):
+        rows = self.conn.execute("SELECT id, payload FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [row[0] for row in rows], [json.loads(row[1]) for row in rows]
+
+    def remove(self, ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM spool WHERE id = ?", [(id_,) for id_ in ids])
+        self._refresh()
+
+class Transport:
+    """Session HTTP persistante (keep-alive) avec timeouts et corps JSON compressés en gzip"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def post(self, url, payload):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        headers = {}
+        if len(body) >= GZIP_MIN_SIZE:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            return self.session.post(url, data=body, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except requests.RequestException:
+            # Connexion du pool peut-être coupée par le serveur : elle sera recréée
+            self.session.close()
+            raise
+
+class Registration:
+    """Enregistrement auprès de l'API (POST /agents/register).
+
+    Les faits statiques (hostname, IP, démarrage, nombre de CPU, OS) sont envoyés une
+    fois et les métriques ne portent ensuite que l'agent_id renvoyé. Un fait qui change
+    (nouvelle IP, redémarrage...) déclenche un nouvel enregistrement. Tant que l'agent
+    n'est pas enregistré (API injoignable), les métriques partent au format complet.
+
+    Le secret remis par l'API au premier enregistrement est gardé sur disque
+    (SECRET_PATH) : il est exigé pour tout réenregistrement du host et pour le canal.
+    """
+
+    def __init__(self, transport, secret_path=SECRET_PATH):
+        self.transport = transport
+        self.agent_id = None
+        self.secret_path = secret_path
+        self.secret = self._load_secret()
+        self.registered = None  # Faits connus de l'API
+        self.ip_address = None
+        self.ip_checked = float("-inf")
+        self.retry_at = 0.0
+        self.os = get_os()
+
+    def facts(self):
+        now = time.monotonic()
+        if now - self.ip_checked >= FACTS_CHECK_INTERVAL:
+            self.ip_address = get_ip_address()
+            self.ip_checked = now
+        return {
+            "hostname": socket.gethostname(),
+            "ip_address": self.ip_address,
+            "boot_time": int(psutil.boot_time()),  # L'uptime est calculé par l'API
+            "cpu_count": psutil.cpu_count(),
+            "os": self.os,
+        }
+
+    def _load_secret(self):
+        try:
+            with open(self.secret_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _save_secret(self, secret):
+        try:
+            os.makedirs(os.path.dirname(self.secret_path) or ".", exist_ok=True)
+            fd = os.open(self.secret_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secret)
+        except OSError as e:
+            print(f"Secret d'agent non sauvegardé ({self.secret_path}) : {e}")
+
+    def invalidate(self):
+        """L'API ne connaît plus l'agent_id (base réinitialisée) : nouvel enregistrement au prochain envoi"""
+        self.agent_id = None
+        self.registered = None
+        self.retry_at = 0.0
+
+    def identity(self):
+        """Champs d'identification d'une métrique"""
+        facts = self.facts()
+        if facts != self.registered:
+            self.agent_id = None
+            if time.monotonic() >= self.retry_at:
+                self._register(facts)
+        if self.agent_id is not None:
+            return {"agent_id": self.agent_id}
+        return {key: facts[key] for key in ("hostname", "ip_address", "boot_time")}
+
+    def _register(self, facts):
+        try:
+            response = self.transport.post(REGISTER_URL, {**facts, "agent_secret": self.secret})
+            if response.status_code == 200:
+                registered = response.json()
+                self.agent_id = registered["agent_id"]
+                if registered.get("agent_secret") and registered["agent_secret"] != self.secret:
+                    self.secret = registered["agent_secret"]
+                    self._save_secret(self.secret)
+                self.registered = facts
+                print(f"Agent enregistré : {self.agent_id} ({facts})")
+                return
+            print(f"Enregistrement refusé : {response.status_code} - {response.text[:200]}")
+        except Exception as e:
+            print("Registration error: ", e)
+        self.retry_at = time.monotonic() + REGISTER_RETRY
+
+def apply_sampling(sampler, settings):
+    """Nouvelle fréquence d'échantillonnage et/ou intervalle d'envoi (commande set_sampling)"""
+    global REPORT_INTERVAL
+    applied = {}
+    if settings.get("sample_rate"):
+        sampler.period = 1 / float(settings["sample_rate"])
+        applied["sample_rate"] = float(settings["sample_rate"])
+    if settings.get("report_interval"):
+        REPORT_INTERVAL = int(settings["report_interval"])
+        applied["report_interval"] = REPORT_INTERVAL
+    return applied
+
+class AgentChannel:
+    """Connexion WebSocket persistante vers l'API (MINEOPS_AGENT_CHANNEL=1).
+
+    Les échantillons et battements de cœur y passent sans requête HTTP, et l'API y
+    pousse des commandes (run, reboot, set_sampling) exécutées chacune dans un thread.
+    Pendant une coupure, l'envoi HTTP (et sa file sur disque) prend le relais le temps
+    de la reconnexion.
+    """
+
+    def __init__(self, registration, sampler):
+        self.registration = registration
+        self.sampler = sampler
+        self.ws = None
+        self.agent_id = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        failures = 0
+        while True:
+            agent_id, secret = self.registration.agent_id, self.registration.secret
+            if agent_id is None:
+                time.sleep(BACKOFF_BASE)  # Connexion après l'enregistrement
+                continue
+            try:
+                ws = ws_connect(CHANNEL_URL, open_timeout=CONNECT_TIMEOUT)
+                ws.send(json.dumps({"type": "hello", "agent_id": agent_id, "secret": secret}))
+                with self.lock:
+                    self.ws, self.agent_id = ws, agent_id
+                print(f"Canal WebSocket connecté ({CHANNEL_URL})")
+                failures = 0
+                for message in ws:
+                    self._dispatch(json.loads(message))
+            except Exception as e:
+                print("Channel error: ", e)
+            with self.lock:
+                self.ws = None
+            failures += 1
+            time.sleep(random.uniform(0, min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)))
+
+    def _dispatch(self, message):
+        if message.get("type") == "command":
+            threading.Thread(target=self._execute, args=(message,), daemon=True).start()
+        elif message.get("type") == "error":
+            print(f"Erreur du canal : {message.get('message')}")
+            if message.get("code") in ("unknown_agent", "unauthorized"):
+                # Secret périmé (base restaurée, autre enregistrement) : un nouveau est demandé
+                self.registration.invalidate()
+
+    def _execute(self, command):
+        try:
+            reply = self._handle(command)
+        except Exception as e:
+            # Commande mal formée ou échec inattendu : l'API reçoit une réponse au lieu d'attendre son délai
+            reply = {"output": f"Erreur: {e}", "return_code": -1}
+        self._send({"type": "result", "id": command.get("id"), **reply})
+
+    def _handle(self, command):
+        action = command.get("action")
+        if action == "run":
+            timeout = command.get("timeout_seconds", COMMAND_TIMEOUT)
+            try:
+                result = subprocess.run(command["command"], shell=True, capture_output=True, text=True, timeout=timeout)
+                reply = {"output": result.stdout + result.stderr, "return_code": result.returncode}
+            except subprocess.TimeoutExpired:
+                reply = {"output": f"Commande timeout ({timeout}s)", "return_code": -1}
+        elif action == "reboot":
+            # Réponse envoyée avant que la connexion ne tombe
+            threading.Timer(1, subprocess.run, args=(["systemctl", "reboot"],)).start()
+            reply = {"output": "Redémarrage en cours", "return_code": 0}
+        elif action == "set_sampling":
+            reply = {"applied": apply_sampling(self.sampler, command), "return_code": 0}
+        else:
+            reply = {"output": f"Action inconnue : {action}", "return_code": -1}
+        return reply
+
+    def _send(self, message):
+        with self.lock:
+            ws = self.ws
+            if ws is None:
+                return False
+            try:
+                ws.send(json.dumps(message, separators=(",", ":")))
+                return True
+            except Exception as e:
+                print("Channel send error: ", e)
+                self.ws = None
+                ws.close()
+                return False
+
+    def send_sample(self, metrics):
+        """True si l'échantillon est parti par le canal (sinon envoi HTTP)"""
+        if metrics.get("agent_id") != self.agent_id:
+            # Réenregistré sous un autre id : reconnexion avec le nouveau
+            with self.lock:
+                if self.ws is not None:
+                    self.ws.close()
+            return False
+        return self._send({"type": "sample", "data": metrics})
+
+    def send_heartbeat(self, heartbeat):
+        return heartbeat.get("agent_id") == self.agent_id and self._send({"type": "heartbeat", **heartbeat})
+
+class Sender:
+    """Envoi direct tant que l'API répond ; sinon mise en file et rejeu par lots avec backoff exponentiel"""
+
+    def __init__(self, spool, transport):
+        self.spool = spool
+        self.transport = transport
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_status = None
+
+    def _post(self, url, payload):
+        """True si l'API a traité la requête (y compris un rejet définitif), False s'il faut réessayer"""
+        try:
+            response = self.transport.post(url, payload)
+        except Exception as e:
+            print("Send error: ", e)
+            return False
+        self.last_status = response.status_code
+        print(f"Status: {response.status_code} - {response.text[:200]}")
+        # 408/429/5xx : temporaire ; autres 4xx : la donnée ne sera jamais acceptée
+        return response.status_code < 500 and response.status_code not in (408, 429)
+
+    def _backoff(self):
+        self.failures += 1
+        delay = min(BACKOFF_BASE * 2 ** (self.failures - 1), BACKOFF_MAX)
+        # Full jitter : les agents d'un parc ne reviennent pas tous en même temps
+        self.retry_at = time.monotonic() + random.uniform(0, delay)
+        print(f"API injoignable, {self.spool.count} métriques en attente, nouvel essai dans {self.retry_at - time.monotonic():.0f}s")
+
+    def send(self, metrics, deadline):
+        if self.spool.count == 0 and time.monotonic() >= self.retry_at:
+            if self._post(API_URL, metrics):
+                self.failures = 0
+                return
+            self.spool.append(metrics)
+            self._backoff()
+            return
+        self.spool.append(metrics)
+        self.replay(deadline)
+
+    def heartbeat(self, payload, deadline):
+        """Signal de vie ; False si l'API ne connaît pas (plus) le host et attend un envoi complet"""
+        if self.spool.count or time.monotonic() < self.retry_at:
+            # Les métriques en attente passent avant (et valent signal de vie)
+            self.replay(deadline)
+            return True
+        try:
+            response = self.transport.post(f"{API_URL}/heartbeat", payload)
+        except Exception as e:
+            print("Heartbeat error: ", e)
+            self._backoff()
+            return True
+        if response.status_code >= 500 or response.status_code in (408, 429):
+            self._backoff()
+            return True
+        self.failures = 0
+        return response.status_code != 404
+
+    def replay(self, deadline):
+        """Vide la file par lots (dans l'ordre) jusqu'à l'échec suivant ou la date limite"""
+        while self.spool.count and time.monotonic() >= self.retry_at and time.monotonic() < deadline:
+            ids, batch = self.spool.peek(REPLAY_BATCH_SIZE)
+            if not self._post(f"{API_URL}/batch", batch):
+                self._backoff()
+                return
+            self.failures = 0
+            self.spool.remove(ids)
+            print(f"Rejeu : {len(ids)} métriques envoyées, {self.spool.count} restantes")
 
 API_URL = get_api_url()
+REGISTER_URL = f"{API_URL.rsplit('/metrics', 1)[0]}/agents/register"
+CHANNEL_URL = f"{API_URL.rsplit('/metrics', 1)[0].replace('http', 'ws', 1)}/agents/ws"
 print(f"Using API URL: {API_URL}")
 
-if __name__ == "__main__":
+def send_report(sender, registration, channel, metrics, deadline):
+    # Par le canal WebSocket s'il est ouvert et que rien n'attend dans la file
+    if channel is not None and sender.spool.count == 0 and channel.send_sample(metrics):
+        return
+    sender.last_status = None
+    sender.send(metrics, deadline)
+    if sender.last_status == 404 and "agent_id" in metrics:
+        registration.invalidate()
+
+def run_interval(sampler, sender, registration, channel):
+    """Envoi complet à intervalle fixe"""
+    next_report = time.monotonic()
     while True:
-        metrics = get_metrics()
+        next_report += REPORT_INTERVAL
+        time.sleep(max(next_report - time.monotonic(), 0))
+        metrics = get_metrics(sampler, registration)
         print("Envoi des metrics : ", metrics)
-        send_metrics(metrics)
-        time.sleep(30)
\ No newline at end of file
+        # Le rejeu s'arrête avant l'envoi suivant
+        send_report(sender, registration, channel, metrics, next_report + REPORT_INTERVAL)
+
+def run_adaptive(sampler, sender, registration, channel):
+    """Envoi complet quand une valeur sort de sa bande morte, battement de cœur sinon.
+
+    Sans nouvel échantillon, l'API considère que les valeurs n'ont pas changé ; le
+    battement de cœur maintient seulement l'agent online.
+    """
+    detector = ChangeDetector()
+    last_report = last_contact = float("-inf")
+    next_check = time.monotonic()
+    while True:
+        next_check += CHECK_INTERVAL
+        time.sleep(max(next_check - time.monotonic(), 0))
+        now = time.monotonic()
+        miners = get_miners()
+        cpu, memory = sampler.recent(CHECK_INTERVAL)
+        current = {
+            "cpu": cpu,
+            "memory": memory,
+            "disk": psutil.disk_usage('/').percent,
+            "miners": {miner["name"]: miner["hashrate"] for miner in miners},
+        }
+        if detector.changed(current) or now - last_report >= MAX_REPORT_INTERVAL:
+            metrics = get_metrics(sampler, registration, miners)
+            print("Envoi des metrics : ", metrics)
+            send_report(sender, registration, channel, metrics, next_check + CHECK_INTERVAL)
+            detector.sent(current)
+            last_report = last_contact = now
+        elif now - last_contact >= HEARTBEAT_INTERVAL:
+            heartbeat = {"last_seen": datetime.utcnow().isoformat(), **registration.identity()}
+            if channel is not None and sender.spool.count == 0 and channel.send_heartbeat(heartbeat):
+                pass
+            elif not sender.heartbeat(heartbeat, next_check + CHECK_INTERVAL):
+                # Host inconnu de l'API : enregistrement et envoi complet au prochain contrôle
+                registration.invalidate()
+                detector.sent(None)
+            last_contact = now
+
+if __name__ == "__main__":
+    sampler = WindowSampler(SAMPLE_RATE)
+    sampler.start()
+    transport = Transport()
+    sender = Sender(Spool(SPOOL_PATH, SPOOL_MAX_BYTES, SPOOL_MAX_AGE), transport)
+    registration = Registration(transport)
+    channel = None
+    if AGENT_CHANNEL:
+        if ws_connect is None:
+            print("MINEOPS_AGENT_CHANNEL=1 mais le paquet websockets est absent : envoi HTTP uniquement")
+        else:
+            channel = AgentChannel(registration, sampler)
+            channel.start()
+    if REPORT_MODE == "adaptive":
+        run_adaptive(sampler, sender, registration, channel)
+    else:
+        run_interval(sampler, sender, registration, channel)
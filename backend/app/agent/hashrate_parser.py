@@ -0,0 +1,106 @@
+import re
+
+# Multiplicateurs vers H/s (les mineurs écrivent kH/s, KH/s, khash/s, MH/s...)
+UNIT_MULTIPLIERS = {'k': 1e3, 'm': 1e6, 'g': 1e9}
+
+NUMBER = r'\d+(?:\.\d+)?'
+UNIT = r'[kmg]?h(?:ash)?/s'
+
+GROUP_NAME = re.compile(r'\(\?P<(\w+)>')
+
+def to_hashrate(value, unit):
+    """(valeur, unité telle qu'écrite dans le log) -> H/s"""
+    return float(value) * UNIT_MULTIPLIERS.get(unit[0].lower(), 1)
+
+def hashrate_fields(g, *names):
+    """Première valeur numérique parmi les groupes `names` (xmrig écrit n/a au démarrage)"""
+    unit = g('unit')
+    for name in names:
+        value = g(name)
+        if value and value[0].isdigit():
+            return {'hashrate': to_hashrate(value, unit), 'unit': unit}
+    return {}
+
+def shares_fields(g):
+    """Compteurs (acceptées/rejetées), format xmrig"""
+    return {'accepted_shares': int(g('accepted')), 'rejected_shares': int(g('rejected'))}
+
+def shares_ratio_fields(g):
+    """Compteurs (acceptées/soumises), format cpuminer"""
+    accepted = int(g('accepted'))
+    return {'accepted_shares': accepted, 'rejected_shares': int(g('total')) - accepted}
+
+class MinerProfile:
+    """Format de log d'un mineur : règles regex fusionnées en une seule alternative compilée.
+
+    Chaque règle est (nom, regex avec groupes nommés, extraction). Les groupes sont préfixés
+    par le nom de la règle et chaque règle est entourée d'un groupe à son nom : un seul
+    finditer par ligne trouve toutes les valeurs (hashrate et shares sur la même ligne par
+    exemple) et match.lastgroup indique la règle qui a reconnu chaque morceau.
+    """
+
+    def __init__(self, name, process_prefixes, rules):
+        self.name = name
+        self.process_prefixes = process_prefixes
+        self.extractors = {}
+        alternatives = []
+        for rule, pattern, extract in rules:
+            pattern = GROUP_NAME.sub(lambda m, rule=rule: f'(?P<{rule}_{m.group(1)}>', pattern)
+            alternatives.append(f'(?P<{rule}>{pattern})')
+            self.extractors[rule] = extract
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE)
+
+    def matches(self, process_name):
+        return process_name.lower().startswith(self.process_prefixes)
+
+    def parse_line(self, line):
+        """Valeurs trouvées dans une ligne ({} si aucune)"""
+        fields = {}
+        for match in self.pattern.finditer(line):
+            rule = match.lastgroup
+            fields.update(self.extractors[rule](lambda name: match.group(f'{rule}_{name}')))
+        return fields
+
+    def parse_lines(self, lines):
+        """Dernière valeur de chaque champ (hashrate, unit, accepted_shares, rejected_shares, temp)"""
+        stats = {}
+        for line in lines:
+            fields = self.parse_line(line)
+            if fields:
+                stats.update(fields)
+        return stats
+
+GENERIC = MinerProfile('generic', (), [
+    ('speed', rf'(?P<value>{NUMBER})\s*(?P<unit>{UNIT})', lambda g: hashrate_fields(g, 'value')),
+    ('accepted', rf'accepted[:\s]*(?P<accepted>\d+)(?:\s*/\s*(?P<total>\d+))?',
+     lambda g: shares_ratio_fields(g) if g('total') else {'accepted_shares': int(g('accepted'))}),
+    ('rejected', r'rejected[:\s]*(?P<rejected>\d+)', lambda g: {'rejected_shares': int(g('rejected'))}),
+    ('temp', rf'temp(?:erature)?[:=\s]*(?P<temp>{NUMBER})\s*°?C\b', lambda g: {'temp': float(g('temp'))}),
+])
+
+PROFILES = [
+    # [2024-01-01 12:00:00.123]  miner    speed 10s/60s/15m 1234.5 1230.1 n/a H/s max 1300.0 H/s
+    # [2024-01-01 12:00:00.123]  cpu      accepted (12/0) diff 100001 (45 ms)
+    MinerProfile('xmrig', ('xmrig',), [
+        ('speed', rf'speed 10s/60s/15m\s+(?P<s10>{NUMBER}|n/a)\s+(?P<s60>{NUMBER}|n/a)\s+(?P<s15m>{NUMBER}|n/a)\s+(?P<unit>{UNIT})',
+         lambda g: hashrate_fields(g, 's10', 's60', 's15m')),
+        ('shares', r'(?:accepted|rejected) \((?P<accepted>\d+)/(?P<rejected>\d+)\)', shares_fields),
+    ]),
+    # accepted: 12/12 (100.00%), 1234.56 khash/s (yay!!!)   (minerd)
+    # [2024-01-01 12:00:00] Accepted 12/12 (100.0%), diff 0.01, 1.23 kH/s   (cpuminer-opt)
+    # [2024-01-01 12:00:00] CPU temp: curr 56C max 61C, Freq: 3.9/3.9 GHz
+    MinerProfile('cpuminer', ('cpuminer', 'minerd'), [
+        ('shares', r'accepted:?\s+(?P<accepted>\d+)(?:/|\s+of\s+)(?P<total>\d+)', shares_ratio_fields),
+        # Les lignes par thread ("thread 0: 2097152 hashes, 512.0 khash/s") ne sont pas le total
+        ('speed', rf'(?:total:?\s*|(?<!hashes),\s*)(?P<value>{NUMBER})\s*(?P<unit>{UNIT})',
+         lambda g: hashrate_fields(g, 'value')),
+        ('temp', rf'temp:?\s*(?:curr\s*)?(?P<temp>{NUMBER})\s*°?C\b', lambda g: {'temp': float(g('temp'))}),
+    ]),
+]
+
+def profile_for(process_name):
+    """Profil du mineur d'après le nom du processus (générique si inconnu)"""
+    for profile in PROFILES:
+        if profile.matches(process_name):
+            return profile
+    return GENERIC
@@ -1,68 +1,124 @@
 import psutil
-import re
 import os
-import subprocess
-from pathlib import Path
+import time
+from hashrate_parser import GENERIC, profile_for
 
-def detect_cpu_mining_processes():
-    """Détecte les processus de mining CPU"""
-    mining_processes = []
-    
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'cmdline']):
-        try:
-            # Ignorer les processus système et non-mining
-            system_processes = [
-                'kernel', 'kthreadd', 'systemd', 'python', 'node', 'nginx', 'apache',
-                'mysql', 'postgres', 'ssh', 'NetworkManager', 'dbus', 'cron'
-            ]
-            
-            if proc.info['name'] in system_processes:
+# Processus système et non-mining ignorés
+SYSTEM_PROCESSES = frozenset({
+    'kernel', 'kthreadd', 'systemd', 'python', 'node', 'nginx', 'apache',
+    'mysql', 'postgres', 'ssh', 'NetworkManager', 'dbus', 'cron'
+})
+
+# Keywords spécifiques CPU mining (ligne de commande ou nom du processus)
+CPU_MINING_KEYWORDS = (
+    '--cpu', '--threads', '--algo', '--url', '--user',
+    'stratum', 'mining', 'hashrate'
+)
+
+# Outils de charge qui utilisent tous les cores sans être des mineurs
+STRESS_TOOLS = frozenset({'stress', 'burnin'})
+
+class ProcessScanner:
+    """Détection des mineurs CPU en un seul passage sur les processus.
+
+    Deux instantanés des temps CPU de tous les processus donnent l'utilisation CPU de
+    chacun. L'instantané d'un scan sert de point de départ au suivant : seul le premier
+    scan attend `interval` secondes, les suivants mesurent la moyenne depuis le scan
+    précédent (l'intervalle d'envoi de l'agent) sans bloquer. Le nom et la ligne de
+    commande ne sont lus et classés qu'une fois par processus, identifié par
+    (pid, create_time) pour ne pas confondre un pid réutilisé. Les critères de charge
+    (CPU, threads) sont réévalués à chaque scan : un pic isolé ne fait pas d'un shell ou
+    d'un compilateur un mineur pour le reste de sa vie.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.cpu_count = psutil.cpu_count() or 1
+        self.classified = {}
+        self.previous = None
+
+    def _cpu_snapshot(self):
+        """{(pid, create_time): (process, temps CPU cumulé)} pour tous les processus accessibles"""
+        snapshot = {}
+        for proc in psutil.process_iter(['create_time', 'cpu_times']):
+            create_time = proc.info['create_time']
+            cpu_times = proc.info['cpu_times']
+            if create_time is None or cpu_times is None:
                 continue
-                
-            # Critères spécifiques au mining CPU
-            cpu_usage = proc.cpu_percent(interval=1)
-            cmdline = ' '.join(proc.info['cmdline']) if proc.info['cmdline'] else ""
-            
-            is_cpu_miner = False
-            
-            # 1. CPU intensif (>70% pour CPU mining)
-            if cpu_usage > 70:
-                is_cpu_miner = True
-                
-            # 2. Keywords spécifiques CPU mining
-            cpu_mining_keywords = [
-                '--cpu', '--threads', '--algo', '--url', '--user',
-                'stratum', 'mining', 'hashrate'
-            ]
-            
-            if any(keyword in cmdline.lower() or keyword in proc.info['name'].lower() 
-                   for keyword in cpu_mining_keywords):
-                is_cpu_miner = True
-            
-            # 3. Processus utilisant tous les cores CPU
-            if cpu_usage > 50 and proc.info['name'] not in ['stress', 'burnin']:
-                # Vérifier si le processus utilise plusieurs threads
-                try:
-                    process = psutil.Process(proc.info['pid'])
-                    if process.num_threads() >= psutil.cpu_count() // 2:
-                        is_cpu_miner = True
-                except:
-                    pass
-            
-            if is_cpu_miner:
+            snapshot[(proc.pid, create_time)] = (proc, cpu_times.user + cpu_times.system)
+        return snapshot, time.monotonic()
+
+    def _classify(self, key, proc):
+        """Critères statiques (nom, ligne de commande), calculés une fois par processus"""
+        entry = self.classified.get(key)
+        if entry is None:
+            with proc.oneshot():
+                name = proc.name()
+                cmdline = proc.cmdline()
+            cmdline = ' '.join(cmdline) if cmdline else ""
+            name_lower = name.lower()
+            cmdline_lower = cmdline.lower()
+            entry = self.classified[key] = {
+                'name': name,
+                'cmdline': cmdline,
+                'excluded': name in SYSTEM_PROCESSES,
+                'keyword': any(keyword in cmdline_lower or keyword in name_lower for keyword in CPU_MINING_KEYWORDS),
+            }
+        return entry
+
+    def scan(self):
+        if self.previous is None:
+            self.previous = self._cpu_snapshot()
+            time.sleep(self.interval)
+        before, started = self.previous
+        after, finished = self.previous = self._cpu_snapshot()
+        elapsed = finished - started
+
+        # Les processus terminés sont oubliés
+        self.classified = {key: entry for key, entry in self.classified.items() if key in after}
+
+        mining_processes = []
+        for key, (proc, cpu_time) in after.items():
+            if key not in before:
+                continue  # Démarré pendant l'intervalle : évalué au prochain scan
+            cpu_usage = round((cpu_time - before[key][1]) / elapsed * 100, 1)
+            try:
+                entry = self._classify(key, proc)
+                if entry['excluded']:
+                    continue
+                threads = None
+                miner = entry['keyword']
+                if not miner:
+                    # 1. CPU intensif (>70% pour CPU mining)
+                    if cpu_usage > 70:
+                        miner = True
+                    # 2. Processus utilisant tous les cores CPU
+                    elif cpu_usage > 50 and entry['name'] not in STRESS_TOOLS:
+                        threads = proc.num_threads()
+                        miner = threads >= self.cpu_count // 2
+                if not miner:
+                    continue
                 mining_processes.append({
-                    'pid': proc.info['pid'],
-                    'name': proc.info['name'],
+                    'pid': key[0],
+                    'create_time': key[1],
+                    'name': entry['name'],
                     'cpu_percent': cpu_usage,
-                    'memory_percent': proc.info['memory_percent'],
-                    'cmdline': cmdline,
-                    'threads': process.num_threads() if 'process' in locals() else 0
+                    'memory_percent': proc.memory_percent(),
+                    'cmdline': entry['cmdline'],
+                    'threads': threads if threads is not None else proc.num_threads(),
                 })
-                
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            continue
-            
-    return mining_processes
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self.classified.pop(key, None)
+                continue
+
+        return mining_processes
+
+# Instance partagée : le cache de classification persiste d'un cycle à l'autre
+process_scanner = ProcessScanner()
+
+def detect_cpu_mining_processes():
+    """Détecte les processus de mining CPU"""
+    return process_scanner.scan()
 
 def find_cpu_mining_logs(process_info):
     """Trouve les logs spécifiques au mining CPU"""
@@ -97,10 +153,10 @@ def find_cpu_mining_logs(process_info):
         for search_dir in search_dirs[:2]:  # Limiter la recherche
             try:
                 for root, dirs, files in os.walk(search_dir):
-                    # Éviter les répertoires trop profonds
-                    if root.count('/') > search_dir.count('/') + 2:
-                        continue
-                        
+                    # Éviter les répertoires trop profonds (sans les parcourir)
+                    if root.count('/') >= search_dir.count('/') + 2:
+                        dirs[:] = []
+
                     for file in files:
                         file_lower = file.lower()
                         if (name.lower() in file_lower or 
@@ -118,77 +174,108 @@ def find_cpu_mining_logs(process_info):
     
     return list(set(log_locations))[:5]  # Max 5 logs uniques
 
-def parse_cpu_hashrate_from_logs(log_files):
-    """Parse le hashrate CPU depuis les fichiers de log"""
-    cpu_hashrate_patterns = [
-        # Patterns spécifiques CPU mining
-        r'(\d+(?:\.\d+)?)\s*H/s',
-        r'(\d+(?:\.\d+)?)\s*KH/s',
-        r'(\d+(?:\.\d+)?)\s*MH/s',
-        r'speed[:\s]*(\d+(?:\.\d+)?)\s*(H/s|KH/s|MH/s)',
-        r'hashrate[:\s]*(\d+(?:\.\d+)?)\s*(H/s|KH/s|MH/s)',
-        r'CPU[:\s]*(\d+(?:\.\d+)?)\s*(H/s|KH/s|MH/s)',
-    ]
-    
-    latest_hashrate = None
+class TrackedLog:
+    """Position de lecture d'un fichier de log : inode, offset et fin de ligne incomplète"""
+
+    __slots__ = ('inode', 'offset', 'partial')
+
+    def __init__(self, inode, offset):
+        self.inode = inode
+        self.offset = offset
+        self.partial = b''
+
+class LogTracker:
+    """Lecture incrémentale des logs des mineurs.
+
+    Les chemins de logs sont cherchés une fois par processus mineur, identifié par
+    (pid, create_time), et gardés jusqu'à la fin du processus. Pour chaque fichier, seul
+    ce qui a été ajouté depuis le cycle précédent est lu. Un changement d'inode (rotation
+    par renommage) ou une taille inférieure à l'offset (troncature, copytruncate) fait
+    reprendre la lecture au début du fichier.
+    """
+
+    def __init__(self, initial_tail=64 * 1024, max_read=1024 * 1024):
+        self.initial_tail = initial_tail  # Octets relus à la découverte d'un log
+        self.max_read = max_read  # Octets lus au plus par fichier et par cycle
+        self.paths = {}
+        self.files = {}
+        self.latest = {}  # Dernières valeurs parsées par processus (conservées sans nouvelle ligne)
+
+    def log_paths(self, process_info):
+        key = (process_info['pid'], process_info['create_time'])
+        paths = self.paths.get(key)
+        if paths is None:
+            paths = self.paths[key] = find_cpu_mining_logs(process_info)
+        return paths
+
+    def prune(self, processes):
+        """Oublie les processus terminés et les fichiers qui ne sont plus suivis"""
+        live = {(proc['pid'], proc['create_time']) for proc in processes}
+        self.paths = {key: paths for key, paths in self.paths.items() if key in live}
+        self.latest = {key: values for key, values in self.latest.items() if key in live}
+        tracked = {path for paths in self.paths.values() for path in paths}
+        self.files = {path: state for path, state in self.files.items() if path in tracked}
+
+    def read_new_lines(self, path):
+        """Lignes complètes ajoutées depuis le dernier appel"""
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                inode = (stat.st_dev, stat.st_ino)
+                state = self.files.get(path)
+                if state is None:
+                    # Nouveau log : seule la fin est lue, comme un tail
+                    state = self.files[path] = TrackedLog(inode, max(stat.st_size - self.initial_tail, 0))
+                    skip_first = state.offset > 0
+                elif state.inode != inode or stat.st_size < state.offset:
+                    state.inode, state.offset, state.partial = inode, 0, b''
+                    skip_first = False
+                else:
+                    skip_first = False
+                if stat.st_size - state.offset > self.max_read:
+                    # Trop de retard : on saute à la fin plutôt que de tout relire
+                    state.offset, state.partial = stat.st_size - self.max_read, b''
+                    skip_first = True
+                if stat.st_size == state.offset:
+                    return []
+                f.seek(state.offset)
+                data = f.read(stat.st_size - state.offset)
+        except OSError as e:
+            print(f"Erreur lecture log CPU {path}: {e}")
+            return []
+
+        state.offset += len(data)
+        data = state.partial + data
+        lines = data.split(b'\n')
+        state.partial = lines.pop()
+        if skip_first and lines:
+            lines.pop(0)  # Ligne coupée par le saut
+        return [line.decode('utf-8', errors='ignore') for line in lines]
+
+    def read_process_logs(self, process_info):
+        return {path: self.read_new_lines(path) for path in self.log_paths(process_info)}
+
+# Instance partagée entre les cycles
+log_tracker = LogTracker()
+
+def parse_cpu_hashrate_from_logs(log_lines, profile=GENERIC):
+    """Parse hashrate, shares et température depuis les nouvelles lignes de chaque log ({chemin: lignes})"""
+    stats = {}
+    for lines in log_lines.values():
+        stats.update(profile.parse_lines(lines))
     additional_stats = {
-        'accepted_shares': None,
-        'rejected_shares': None,
-        'temp': None
+        'unit': stats.get('unit'),
+        'accepted_shares': stats.get('accepted_shares'),
+        'rejected_shares': stats.get('rejected_shares'),
+        'temp': stats.get('temp')
     }
-    
-    for log_file in log_files:
-        try:
-            # Lire les 50 dernières lignes pour CPU mining
-            with open(log_file, 'r', errors='ignore') as f:
-                lines = f.readlines()[-50:]
-                
-            for line in reversed(lines):
-                # Chercher hashrate
-                if not latest_hashrate:
-                    for pattern in cpu_hashrate_patterns:
-                        match = re.search(pattern, line, re.IGNORECASE)
-                        if match:
-                            try:
-                                if len(match.groups()) >= 2:
-                                    value = float(match.group(1))
-                                    unit = match.group(2).upper()
-                                else:
-                                    value = float(match.group(1))
-                                    # Déterminer l'unité depuis le contexte
-                                    if 'KH/s' in line.upper():
-                                        unit = 'KH/S'
-                                    elif 'MH/s' in line.upper():
-                                        unit = 'MH/S'
-                                    else:
-                                        unit = 'H/S'
-                                
-                                # Convertir en H/s
-                                multipliers = {'H/S': 1, 'KH/S': 1000, 'MH/S': 1000000}
-                                latest_hashrate = value * multipliers.get(unit, 1)
-                                break
-                            except (ValueError, IndexError):
-                                continue
-                
-                # Chercher shares acceptées
-                if 'accepted' in line.lower() and not additional_stats['accepted_shares']:
-                    share_match = re.search(r'accepted[:\s]*(\d+)', line, re.IGNORECASE)
-                    if share_match:
-                        additional_stats['accepted_shares'] = int(share_match.group(1))
-                
-                if latest_hashrate:
-                    break
-                    
-        except Exception as e:
-            print(f"Erreur lecture log CPU {log_file}: {e}")
-            continue
-    
-    return latest_hashrate, additional_stats
+    return stats.get('hashrate'), additional_stats
 
 def get_cpu_mining_stats():
     """Fonction principale pour obtenir les stats de mining CPU"""
     cpu_mining_processes = detect_cpu_mining_processes()
-    
+    log_tracker.prune(cpu_mining_processes)
+
     if not cpu_mining_processes:
         return None
     
@@ -196,19 +283,28 @@ def get_cpu_mining_stats():
     mining_data = []
     
     for proc in cpu_mining_processes:
-        # Chercher les logs
-        log_files = find_cpu_mining_logs(proc)
-        
-        # Parser le hashrate CPU
-        hashrate, additional_stats = parse_cpu_hashrate_from_logs(log_files)
+        # Logs (cherchés une fois par processus) et lignes ajoutées depuis le dernier cycle
+        log_files = log_tracker.log_paths(proc)
+        profile = profile_for(proc['name'])
+        new_hashrate, new_stats = parse_cpu_hashrate_from_logs(log_tracker.read_process_logs(proc), profile)
+
+        # Sans nouvelle valeur dans les logs, la dernière connue reste valable
+        key = (proc['pid'], proc['create_time'])
+        hashrate, additional_stats = log_tracker.latest.get(key, (None, {}))
+        hashrate = new_hashrate if new_hashrate is not None else hashrate
+        additional_stats = {**additional_stats, **{k: v for k, v in new_stats.items() if v is not None}}
+        log_tracker.latest[key] = (hashrate, additional_stats)
         
         mining_data.append({
             'process': proc['name'],
             'pid': proc['pid'],
             'cpu_percent': proc['cpu_percent'],
             'threads': proc['threads'],
+            'profile': profile.name,
             'hashrate': hashrate,
             'accepted_shares': additional_stats.get('accepted_shares'),
+            'rejected_shares': additional_stats.get('rejected_shares'),
+            'temp': additional_stats.get('temp'),
             'log_files': [os.path.basename(f) for f in log_files[:2]]  # Juste les noms
         })
         
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import queue
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from app.schemas import MetricsIn, HeartbeatIn
+from app.ingest import resolve_agent
+from app.metrics_writer import metrics_writer
+from app.hosts import host_registry, heartbeats
+from app.segments import to_naive_utc
+from app.config import INGEST_DURABILITY
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal d'une commande poussée à un agent (hors commandes avec leur propre timeout)
+COMMAND_TIMEOUT = 30
+
+class AgentNotConnected(Exception):
+    """Commande non transmise : l'appelant peut passer par SSH"""
+
+class AgentDisconnected(AgentNotConnected):
+    """Agent déconnecté après réception de la commande : elle a pu s'exécuter"""
+
+class AgentConnection:
+    def __init__(self, agent_id: int, websocket: WebSocket):
+        self.agent_id = agent_id
+        self.websocket = websocket
+        self.connected_at = datetime.utcnow()
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.send_lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        async with self.send_lock:
+            await self.websocket.send_text(json.dumps(message))
+
+class AgentChannelManager:
+    """Canal WebSocket persistant ouvert par les agents (optionnel).
+
+    L'agent y envoie ses échantillons et battements de cœur ; le backend y pousse des
+    commandes (run, reboot, set_sampling) dont le résultat revient par la même
+    connexion, sans démarrer ssh/ansible par host. Les agents non connectés restent
+    joignables par SSH.
+
+    Messages agent -> backend : hello {agent_id, secret}, sample {data}, heartbeat
+    {last_seen}, result {id, ...}. Backend -> agent : command {id, action, ...}, error
+    {message}. Le secret est celui remis par /agents/register : sans lui, la connexion est
+    fermée avant de remplacer celle de l'agent.
+    """
+
+    def __init__(self):
+        self.connections: Dict[int, AgentConnection] = {}
+
+    def is_connected(self, agent_id: Optional[int]) -> bool:
+        return agent_id is not None and agent_id in self.connections
+
+    def agent_for_ip(self, ip_address: str) -> Optional[int]:
+        """Agent connecté dont le host a cette adresse IP"""
+        for agent_id in list(self.connections):
+            host = host_registry.get_host(agent_id)
+            if host and host[1] == ip_address:
+                return agent_id
+        return None
+
+    def list(self) -> list:
+        return [
+            {
+                "agent_id": agent_id,
+                "hostname": (host_registry.get_host(agent_id) or (None,))[0],
+                "connected_at": connection.connected_at.isoformat(),
+                "pending_commands": len(connection.pending),
+            }
+            for agent_id, connection in list(self.connections.items())
+        ]
+
+    async def send_command(self, agent_id: int, action: str, timeout: float = COMMAND_TIMEOUT, **params) -> dict:
+        """Pousse une commande à un agent connecté et attend son résultat"""
+        connection = self.connections.get(agent_id)
+        if connection is None:
+            raise AgentNotConnected(agent_id)
+        command_id = uuid.uuid4().hex[:12]
+        future = asyncio.get_running_loop().create_future()
+        connection.pending[command_id] = future
+        try:
+            try:
+                await connection.send({"type": "command", "id": command_id, "action": action, **params})
+            except Exception:
+                raise AgentNotConnected(agent_id)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            connection.pending.pop(command_id, None)
+
+    async def _ingest(self, connection: AgentConnection, data: dict):
+        try:
+            row = MetricsIn.model_validate({"agent_id": connection.agent_id, **data}).model_dump()
+        except ValidationError as e:
+            await connection.send({"type": "error", "message": f"Échantillon invalide : {e.errors()[0]['msg']}"})
+            return
+        if not resolve_agent(row):
+            await connection.send({"type": "error", "code": "unknown_agent", "message": "Agent inconnu, réenregistrement nécessaire"})
+            return
+        try:
+            future = metrics_writer.submit([row])
+        except queue.Full:
+            await connection.send({"type": "error", "message": "File d'ingestion saturée"})
+            return
+        if INGEST_DURABILITY != "async":
+            await asyncio.wrap_future(future)
+
+    async def _heartbeat(self, connection: AgentConnection, data: dict):
+        try:
+            heartbeat = HeartbeatIn.model_validate({**data, "agent_id": connection.agent_id})
+        except ValidationError as e:
+            await connection.send({"type": "error", "message": f"Battement invalide : {e.errors()[0]['msg']}"})
+            return
+        hostname = (host_registry.get_host(connection.agent_id) or (None,))[0]
+        if hostname:
+            heartbeats.touch(hostname, to_naive_utc(heartbeat.last_seen))
+
+    async def handle(self, websocket: WebSocket):
+        """Vie d'une connexion agent : hello, puis messages jusqu'à la déconnexion"""
+        await websocket.accept()
+        try:
+            hello = json.loads(await websocket.receive_text())
+            agent_id = hello.get("agent_id") if hello.get("type") == "hello" else None
+            secret = hello.get("secret")
+        except (WebSocketDisconnect, ValueError, AttributeError):
+            return
+        if not isinstance(agent_id, int) or host_registry.get_host(agent_id) is None:
+            await websocket.send_text(json.dumps({
+                "type": "error", "code": "unknown_agent", "message": "Agent inconnu, réenregistrement nécessaire",
+            }))
+            await websocket.close(code=4404)
+            return
+        if not host_registry.check_secret(agent_id, secret):
+            logger.warning(f"Agent channel {agent_id}: secret invalide, connexion refusée")
+            await websocket.send_text(json.dumps({
+                "type": "error", "code": "unauthorized", "message": "Secret d'agent invalide, réenregistrement nécessaire",
+            }))
+            await websocket.close(code=4401)
+            return
+
+        previous = self.connections.get(agent_id)
+        if previous is not None:
+            # Reconnexion : l'ancienne connexion est remplacée
+            try:
+                await previous.websocket.close()
+            except Exception:
+                pass
+        connection = self.connections[agent_id] = AgentConnection(agent_id, websocket)
+        logger.info(f"Agent {agent_id} connecté par WebSocket")
+        try:
+            async for message in websocket.iter_text():
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                kind = data.get("type")
+                if kind == "sample":
+                    sample = data.get("data")
+                    await self._ingest(connection, sample if isinstance(sample, dict) else {})
+                elif kind == "heartbeat":
+                    await self._heartbeat(connection, data)
+                elif kind == "result":
+                    future = connection.pending.get(data.get("id"))
+                    if future is not None and not future.done():
+                        future.set_result(data)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error(f"Agent channel {agent_id} error: {e}")
+        finally:
+            if self.connections.get(agent_id) is connection:
+                del self.connections[agent_id]
+            for future in connection.pending.values():
+                if not future.done():
+                    future.set_exception(AgentDisconnected(agent_id))
+            logger.info(f"Agent {agent_id} déconnecté")
+
+# Instance globale
+agent_channels = AgentChannelManager()
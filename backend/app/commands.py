@@ -0,0 +1,111 @@
+import asyncio
+import os
+import shlex
+import signal
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+class CommandTimeout(Exception):
+    pass
+
+async def run_process(args: List[str], timeout: Optional[float] = None) -> Tuple[int, str, str]:
+    """Lance un processus sans bloquer la boucle ; (code retour, stdout, stderr).
+
+    Le processus a son propre groupe : à l'expiration du délai ou à l'annulation de la
+    tâche (échéance globale), tout le groupe est tué, ssh lancé par ansible compris.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException as e:
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await asyncio.shield(process.wait())
+        if isinstance(e, asyncio.TimeoutError):
+            raise CommandTimeout(timeout) from None
+        raise
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+def ansible_shell_args(ip_address: str, user: str, command: str) -> List[str]:
+    return ["ansible", ip_address, "-i", f"{ip_address},", "-m", "shell", "-a", command, "-u", user]
+
+def command_output(returncode: int, stdout: str, stderr: str) -> str:
+    """Sortie affichée d'une commande, retours à la ligne préservés ; stderr si échec sans stdout"""
+    if returncode == 0:
+        return stdout.rstrip()
+    return stdout.rstrip() or stderr.rstrip()
+
+def ansible_output(returncode: int, stdout: str, stderr: str) -> str:
+    """Sortie d'une commande shell ansible, sans l'en-tête "host | CHANGED | rc=0 >>" """
+    if returncode == 0 and ">>" in stdout:
+        stdout = stdout.split(">>", 1)[1]
+    return command_output(returncode, stdout, stderr)
+
+def reboot_command(user: str) -> str:
+    """Redémarrage différé et détaché : la commande répond avant que le host ne coupe la connexion.
+
+    sudo reste au premier plan (seul le redémarrage différé est détaché) : un refus de
+    sudo remonte avec son code retour et son stderr.
+    """
+    reboot = "nohup sh -c 'sleep 1; reboot' > /dev/null 2>&1 &"
+    return reboot if user == "root" else f"sudo -n sh -c {shlex.quote(reboot)}"
+
+async def iter_fan_out(
+    jobs: Dict[str, Callable[[], Awaitable[dict]]],
+    concurrency: int,
+    deadline: float,
+    on_deadline: Callable[[str], dict],
+) -> AsyncIterator[Tuple[str, dict]]:
+    """Exécute les jobs ({clé: fabrique de coroutine}) en parallèle, au plus `concurrency` à la fois,
+    et produit (clé, résultat) dans l'ordre de fin : un host lent ne retient pas les autres.
+
+    Chaque résultat reçoit queued_ms (attente d'une place) et duration_ms (exécution).
+    À l'échéance globale, les jobs non terminés sont annulés et remplacés par
+    on_deadline(clé). Fermer l'itérateur (contextlib.aclosing) annule les jobs en cours.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+    run_started: Dict[str, float] = {}
+
+    async def timed(key: str, job: Callable[[], Awaitable[dict]]) -> dict:
+        async with semaphore:
+            run_started[key] = time.monotonic()
+            result = await job()
+        result["queued_ms"] = round((run_started[key] - started) * 1000)
+        result["duration_ms"] = round((time.monotonic() - run_started[key]) * 1000)
+        return result
+
+    tasks = {asyncio.create_task(timed(key, job)): key for key, job in jobs.items()}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(started + deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                break
+            for task in done:
+                yield tasks[task], task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    finished = time.monotonic()
+    for task in pending:
+        key = tasks[task]
+        # Annulé en attente d'une place : durée d'exécution nulle
+        begun = run_started.get(key, finished)
+        yield key, {
+            **on_deadline(key),
+            "queued_ms": round((begun - started) * 1000),
+            "duration_ms": round((finished - begun) * 1000),
+        }
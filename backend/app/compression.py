@@ -0,0 +1,69 @@
+import json
+import zlib
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Taille maximale d'un corps décompressé (protection contre les archives piégées)
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+class GzipRequestMiddleware:
+    """Décompresse les corps de requête envoyés avec Content-Encoding: gzip.
+
+    Les routes reçoivent le JSON en clair : l'agent peut compresser ses lots sans que
+    les endpoints aient à le savoir. La réponse n'est pas concernée.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int = MAX_DECOMPRESSED_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = [(name, value) for name, value in scope["headers"] if name != b"content-encoding"]
+        encoding = next((value for name, value in scope["headers"] if name == b"content-encoding"), None)
+        if encoding is None or encoding.strip().lower() != b"gzip":
+            await self.app(scope, receive, send)
+            return
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = bytearray()
+        more_body = True
+        try:
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                more_body = message.get("more_body", False)
+                body += decompressor.decompress(message.get("body", b""), self.max_size + 1 - len(body))
+                if len(body) > self.max_size or decompressor.unconsumed_tail:
+                    await self._error(send, 413, "Corps de requête trop volumineux")
+                    return
+            body += decompressor.flush()
+        except zlib.error:
+            await self._error(send, 400, "Corps gzip invalide")
+            return
+
+        headers = [(name, value) for name, value in headers if name != b"content-length"]
+        headers.append((b"content-length", str(len(body)).encode()))
+        scope = dict(scope, headers=headers)
+        sent = False
+
+        async def decompressed_receive() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": bytes(body), "more_body": False}
+            return await receive()
+
+        await self.app(scope, decompressed_receive, send)
+
+    @staticmethod
+    async def _error(send: Send, status: int, detail: str):
+        content = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())],
+        })
+        await send({"type": "http.response.body", "body": content})
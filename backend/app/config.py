@@ -0,0 +1,83 @@
+import os
+
+# Configuration du backend, surchargeable par variables d'environnement
+
+DATABASE_URL = os.environ.get("MINEOPS_DATABASE_URL", "sqlite:///./data/metrics.db")
+
+# Compromis durabilité / latence de l'ingestion :
+#   "async"  : réponse dès la mise en file ; les métriques en file (quelques ms) sont
+#              perdues si le backend s'arrête brutalement. PRAGMA synchronous=NORMAL.
+#   "commit" : réponse après le commit du groupe contenant la métrique. synchronous=NORMAL
+#              (en WAL, une coupure de courant peut perdre les derniers commits).
+#   "fsync"  : réponse après commit, synchronous=FULL (fsync à chaque commit de groupe).
+INGEST_DURABILITY = os.environ.get("MINEOPS_INGEST_DURABILITY", "async").lower()
+if INGEST_DURABILITY not in ("async", "commit", "fsync"):
+    raise ValueError(f"MINEOPS_INGEST_DURABILITY invalide : {INGEST_DURABILITY} (async, commit, fsync)")
+
+SQLITE_SYNCHRONOUS = "FULL" if INGEST_DURABILITY == "fsync" else "NORMAL"
+
+# Délai maximal de regroupement des écritures avant commit (millisecondes)
+INGEST_FLUSH_INTERVAL_MS = int(os.environ.get("MINEOPS_INGEST_FLUSH_INTERVAL_MS", "5"))
+# Nombre maximal de métriques par commit de groupe
+INGEST_MAX_GROUP_SIZE = int(os.environ.get("MINEOPS_INGEST_MAX_GROUP_SIZE", "5000"))
+# Nombre maximal de lots en attente dans la file d'écriture
+INGEST_QUEUE_SIZE = int(os.environ.get("MINEOPS_INGEST_QUEUE_SIZE", "10000"))
+
+# Rétention par niveau de données (en jours)
+RETENTION_RAW_DAYS = int(os.environ.get("MINEOPS_RETENTION_RAW_DAYS", "7"))
+RETENTION_ROLLUP_DAYS = {
+    60: int(os.environ.get("MINEOPS_RETENTION_ROLLUP_1M_DAYS", "30")),
+    300: int(os.environ.get("MINEOPS_RETENTION_ROLLUP_5M_DAYS", "90")),
+    3600: int(os.environ.get("MINEOPS_RETENTION_ROLLUP_1H_DAYS", "365")),
+}
+# Intervalle entre deux passes de rétention automatiques (secondes)
+RETENTION_INTERVAL = int(os.environ.get("MINEOPS_RETENTION_INTERVAL", "3600"))
+# Lignes supprimées par transaction, et pause entre deux lots pour laisser passer l'ingestion
+RETENTION_CHUNK_SIZE = int(os.environ.get("MINEOPS_RETENTION_CHUNK_SIZE", "2000"))
+RETENTION_CHUNK_PAUSE_MS = int(os.environ.get("MINEOPS_RETENTION_CHUNK_PAUSE_MS", "50"))
+# Pages libérées par étape de PRAGMA incremental_vacuum
+RETENTION_VACUUM_PAGES = int(os.environ.get("MINEOPS_RETENTION_VACUUM_PAGES", "1000"))
+
+# Cache mémoire des dernières métriques par host (buffers circulaires préalloués).
+# Mémoire par host : HOT_TIER_CAPACITY * 28 octets (480 échantillons = ~13 Ko).
+HOT_TIER_HOURS = int(os.environ.get("MINEOPS_HOT_TIER_HOURS", "2"))
+# Échantillons conservés par host : par défaut de quoi couvrir la fenêtre à un envoi toutes les 15 s
+HOT_TIER_CAPACITY = int(os.environ.get("MINEOPS_HOT_TIER_CAPACITY", str(HOT_TIER_HOURS * 3600 // 15)))
+
+# Agents en mode adaptatif : une absence de métrique signifie "valeurs inchangées". Au-delà de
+# cet écart (MINEOPS_MAX_REPORT_INTERVAL des agents), un mineur sans échantillon est considéré arrêté.
+REPORT_MAX_INTERVAL = int(os.environ.get("MINEOPS_REPORT_MAX_INTERVAL", "900"))
+
+# Exécution de commandes sur le parc (/execute-command) : hosts traités en parallèle au plus,
+# délai par host et échéance globale de la requête (secondes). L'échéance par défaut reste sous
+# le timeout de 60 s du frontend : la réponse arrive toujours, avec les hosts non terminés en erreur.
+COMMAND_CONCURRENCY = int(os.environ.get("MINEOPS_COMMAND_CONCURRENCY", "20"))
+COMMAND_HOST_TIMEOUT = float(os.environ.get("MINEOPS_COMMAND_HOST_TIMEOUT", "30"))
+COMMAND_DEADLINE = float(os.environ.get("MINEOPS_COMMAND_DEADLINE", "50"))
+
+# Exécution des commandes par SSH : "ssh" (connexions paramiko gardées ouvertes, voir
+# app/ssh_pool.py) ou "ansible" (un processus ansible par host et par commande)
+COMMAND_BACKEND = os.environ.get("MINEOPS_COMMAND_BACKEND", "ssh").lower()
+if COMMAND_BACKEND not in ("ssh", "ansible"):
+    raise ValueError(f"MINEOPS_COMMAND_BACKEND invalide : {COMMAND_BACKEND} (ssh, ansible)")
+SSH_CONNECT_TIMEOUT = float(os.environ.get("MINEOPS_SSH_CONNECT_TIMEOUT", "10"))
+# Connexion fermée après ce délai sans commande (secondes)
+SSH_POOL_IDLE_TIMEOUT = int(os.environ.get("MINEOPS_SSH_POOL_IDLE_TIMEOUT", "300"))
+SSH_POOL_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("MINEOPS_SSH_POOL_MAX_CONNECTIONS_PER_HOST", "2"))
+# Commandes simultanées par connexion (sous le MaxSessions=10 par défaut d'OpenSSH)
+SSH_POOL_MAX_CHANNELS = int(os.environ.get("MINEOPS_SSH_POOL_MAX_CHANNELS", "8"))
+# Threads des appels paramiko bloquants (au moins MINEOPS_COMMAND_CONCURRENCY)
+SSH_POOL_WORKERS = int(os.environ.get("MINEOPS_SSH_POOL_WORKERS", str(max(32, COMMAND_CONCURRENCY))))
+
+# Opérations en arrière-plan (/jobs) : jobs exécutés simultanément au total et par type,
+# jobs en attente au plus, et conservation des jobs terminés (jours)
+JOB_MAX_RUNNING = int(os.environ.get("MINEOPS_JOB_MAX_RUNNING", "8"))
+JOB_TYPE_LIMITS = {
+    "add-miner": int(os.environ.get("MINEOPS_JOB_LIMIT_ADD_MINER", "2")),
+    "reboot": int(os.environ.get("MINEOPS_JOB_LIMIT_REBOOT", "4")),
+    "execute-command": int(os.environ.get("MINEOPS_JOB_LIMIT_EXECUTE_COMMAND", "2")),
+}
+JOB_MAX_QUEUED = int(os.environ.get("MINEOPS_JOB_MAX_QUEUED", "100"))
+JOB_RETENTION_DAYS = int(os.environ.get("MINEOPS_JOB_RETENTION_DAYS", "7"))
+# Échéance par défaut d'une commande exécutée en job : rien n'attend la réponse HTTP (secondes)
+JOB_COMMAND_DEADLINE = float(os.environ.get("MINEOPS_JOB_COMMAND_DEADLINE", "900"))
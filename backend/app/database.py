@@ -1,10 +1,35 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.models import Base
+from app.migrations import run_migrations, enable_incremental_vacuum
+from app.config import DATABASE_URL, SQLITE_SYNCHRONOUS
+from app.segments import segment_registry, mining_segment_registry
+from app.hosts import host_registry
+from app.mining import miner_registry
 
-engine = create_engine("sqlite:///./data/metrics.db")
+engine = create_engine(DATABASE_URL)
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, _connection_record):
+    """WAL : les lectures du dashboard ne bloquent plus les commits d'ingestion (et inversement)"""
+    cursor = dbapi_connection.cursor()
+    # Doit précéder la création des tables pour une nouvelle base (voir enable_incremental_vacuum)
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-16000")  # 16 Mo de cache de pages par connexion
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA wal_autocheckpoint=1000")
+    cursor.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Création des tables si elles n'existent pas
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+# Mise à niveau des bases existantes, puis création des tables manquantes au schéma courant
+run_migrations(engine)
+Base.metadata.create_all(bind=engine)
+segment_registry.load(engine)
+mining_segment_registry.load(engine)
+host_registry.load(engine)
+miner_registry.load(engine)
+enable_incremental_vacuum(engine)
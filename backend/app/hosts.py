@@ -0,0 +1,182 @@
+import hashlib
+import hmac
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models import HostDB
+from app.rollups import to_epoch
+
+UPTIME_PATTERN = re.compile(r"(\d+)\s*(jour|heure|minute)")
+UPTIME_UNITS = {"jour": 86400, "heure": 3600, "minute": 60}
+
+def format_uptime(seconds: Optional[float]) -> Optional[str]:
+    """Rendu de l'uptime identique à l'ancien agent ("2 jours, 3 heures, 5 minutes")"""
+    if seconds is None:
+        return None
+    seconds = max(int(seconds), 0)
+    days = seconds // 86400
+    hours = (seconds % 86400) // 3600
+    minutes = (seconds % 3600) // 60
+
+    uptime_format = []
+    if days > 0:
+        uptime_format.append(f"{days} jour{'s' if days > 1 else ''}")
+    if hours > 0:
+        uptime_format.append(f"{hours} heure{'s' if hours > 1 else ''}")
+    if minutes > 0:
+        uptime_format.append(f"{minutes} minute{'s' if minutes > 1 else ''}")
+    return ", ".join(uptime_format) if uptime_format else "moins d'une minute"
+
+def uptime_at(last_seen: datetime, boot_time: Optional[int]) -> Optional[str]:
+    """Uptime affiché pour une métrique (calculé à la lecture, jamais stocké)"""
+    if boot_time is None:
+        return None
+    return format_uptime(to_epoch(last_seen) - boot_time)
+
+def hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def parse_uptime(uptime: Optional[str]) -> Optional[int]:
+    """Secondes d'uptime d'une chaîne envoyée par un ancien agent (None si illisible)"""
+    if not uptime:
+        return None
+    matches = UPTIME_PATTERN.findall(uptime)
+    if not matches:
+        return 0 if uptime.startswith("moins") else None
+    return sum(int(value) * UPTIME_UNITS[unit] for value, unit in matches)
+
+class HostRegistry:
+    """Correspondance hostname <-> host_id (table hosts), en cache mémoire.
+
+    Les échantillons ne stockent que host_id : le hostname et l'adresse IP ne sont
+    écrits qu'une fois par host (ou quand l'IP change) au lieu d'une fois par métrique.
+    L'id sert aussi d'identifiant d'agent : un agent enregistré n'envoie plus que lui.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_name: Dict[str, Tuple[int, str]] = {}
+        self.by_id: Dict[int, Tuple[str, str, Optional[int]]] = {}
+        self.secret_hashes: Dict[int, str] = {}
+
+    def _set(self, id_: int, hostname: str, ip_address: str, boot_time: Optional[int]):
+        self.by_name[hostname] = (id_, ip_address)
+        self.by_id[id_] = (hostname, ip_address, boot_time)
+
+    def load(self, engine: Engine):
+        with engine.connect() as conn:
+            rows = conn.execute(select(
+                HostDB.id, HostDB.hostname, HostDB.ip_address, HostDB.boot_time, HostDB.agent_secret_hash,
+            )).all()
+        with self.lock:
+            self.by_name = {}
+            self.by_id = {}
+            self.secret_hashes = {}
+            for id_, hostname, ip_address, boot_time, secret_hash in rows:
+                self._set(id_, hostname, ip_address, boot_time)
+                if secret_hash:
+                    self.secret_hashes[id_] = secret_hash
+
+    def get_id(self, hostname: str) -> Optional[int]:
+        with self.lock:
+            entry = self.by_name.get(hostname)
+        return entry[0] if entry else None
+
+    def get_host(self, id_: int) -> Optional[Tuple[str, str, Optional[int]]]:
+        """(hostname, adresse IP, boot_time) d'un host ou d'un agent enregistré"""
+        with self.lock:
+            return self.by_id.get(id_)
+
+    def has_secret(self, hostname: str) -> bool:
+        with self.lock:
+            entry = self.by_name.get(hostname)
+            return entry is not None and entry[0] in self.secret_hashes
+
+    def check_secret(self, id_: int, secret: Optional[str]) -> bool:
+        """Le secret présenté par un agent est-il celui remis à son dernier enregistrement"""
+        with self.lock:
+            expected = self.secret_hashes.get(id_)
+        if expected is None or not isinstance(secret, str):
+            return False
+        return hmac.compare_digest(hash_secret(secret), expected)
+
+    def register(self, db: Session, facts: dict) -> int:
+        """Crée ou met à jour le host d'un agent avec ses faits statiques ; retourne l'id (sans commit)"""
+        stmt = sqlite_insert(HostDB).values(**facts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[HostDB.hostname],
+            set_={field: stmt.excluded[field] for field in facts if field != "hostname"},
+        ).returning(HostDB.id, HostDB.hostname, HostDB.ip_address, HostDB.boot_time)
+        id_, hostname, ip_address, boot_time = db.execute(stmt).one()
+        with self.lock:
+            self._set(id_, hostname, ip_address, boot_time)
+            if facts.get("agent_secret_hash"):
+                self.secret_hashes[id_] = facts["agent_secret_hash"]
+        return id_
+
+    def resolve(self, db: Session, rows: List[dict]) -> bool:
+        """Renseigne row["host_id"] ; retourne True si la table hosts a été modifiée (à commiter).
+
+        Les échantillons compacts des agents enregistrés ont déjà leur host_id.
+        """
+        changed = {}
+        rows = [row for row in rows if row.get("host_id") is None]
+        with self.lock:
+            for row in rows:
+                entry = self.by_name.get(row["hostname"])
+                if entry is None or entry[1] != row["ip_address"]:
+                    changed[row["hostname"]] = row["ip_address"]
+        if changed:
+            stmt = sqlite_insert(HostDB).values([
+                {"hostname": hostname, "ip_address": ip_address}
+                for hostname, ip_address in changed.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[HostDB.hostname],
+                set_={"ip_address": stmt.excluded.ip_address},
+            ).returning(HostDB.id, HostDB.hostname, HostDB.ip_address, HostDB.boot_time)
+            result = db.execute(stmt).all()
+            with self.lock:
+                for id_, hostname, ip_address, boot_time in result:
+                    self._set(id_, hostname, ip_address, boot_time)
+        with self.lock:
+            for row in rows:
+                row["host_id"] = self.by_name[row["hostname"]][0]
+        return bool(changed)
+
+class HeartbeatRegistry:
+    """Dernier battement de cœur de chaque host (agents en mode adaptatif).
+
+    Un agent dont les valeurs ne bougent pas n'envoie plus d'échantillon : l'absence de
+    métrique signifie "inchangé" et le battement de cœur prouve seulement qu'il est en vie.
+    Gardé en mémoire sans écriture en base ; après un redémarrage de l'API, le suivant
+    arrive dans l'intervalle de battement de l'agent.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last: Dict[str, datetime] = {}
+
+    def touch(self, hostname: str, when: datetime):
+        with self.lock:
+            current = self.last.get(hostname)
+            if current is None or when > current:
+                self.last[hostname] = when
+
+    def get(self, hostname: str) -> Optional[datetime]:
+        with self.lock:
+            return self.last.get(hostname)
+
+    def last_contact(self, hostname: str, last_seen: datetime) -> datetime:
+        """Dernier signe de vie d'un host : dernière métrique ou dernier battement de cœur"""
+        heartbeat = self.get(hostname)
+        return heartbeat if heartbeat is not None and heartbeat > last_seen else last_seen
+
+# Instances globales
+host_registry = HostRegistry()
+heartbeats = HeartbeatRegistry()
@@ -0,0 +1,240 @@
+import logging
+import math
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.models import HostStateDB
+from app.queries import metrics_range_queries
+from app.rollups import to_epoch
+from app.segments import WINDOW_FIELDS
+from app.config import HOT_TIER_HOURS, HOT_TIER_CAPACITY
+
+logger = logging.getLogger(__name__)
+
+# Octets par échantillon : timestamp float64 + cpu/mémoire/disque + cpu min/max float32
+SAMPLE_BYTES = 8 + 5 * 4
+
+def optional(value: float) -> Optional[float]:
+    """NaN marque un agrégat absent (ancien agent)"""
+    return None if math.isnan(value) else round(value, 2)
+
+def state_to_dict(state: HostStateDB) -> dict:
+    return {
+        "id": state.metrics_id,
+        "hostname": state.hostname,
+        "ip_address": state.ip_address,
+        "cpu_utilization": state.cpu_utilization,
+        "memory_utilization": state.memory_utilization,
+        "disk_usage": state.disk_usage,
+        "last_seen": state.last_seen,
+        "boot_time": state.boot_time,
+        **{field: getattr(state, field) for field in WINDOW_FIELDS},
+    }
+
+class HostRing:
+    """Buffer circulaire préalloué des derniers échantillons d'un host.
+
+    Mémoire fixe par host : capacity * 28 octets (timestamps en float64, cpu, mémoire, disque
+    et extrêmes cpu de la fenêtre en float32), soit ~13 Ko pour 480 échantillons, plus la
+    dernière ligne complète.
+    """
+
+    __slots__ = (
+        "capacity", "timestamps", "cpu", "memory", "disk", "cpu_min", "cpu_max",
+        "start", "size", "complete_since",
+    )
+
+    def __init__(self, capacity: int, complete_since: float):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.cpu = array("f", bytes(4 * capacity))
+        self.memory = array("f", bytes(4 * capacity))
+        self.disk = array("f", bytes(4 * capacity))
+        self.cpu_min = array("f", bytes(4 * capacity))
+        self.cpu_max = array("f", bytes(4 * capacity))
+        self.start = 0
+        self.size = 0
+        # Depuis quand le buffer contient toutes les métriques du host
+        self.complete_since = complete_since
+
+    def newest(self) -> Optional[float]:
+        if not self.size:
+            return None
+        return self.timestamps[(self.start + self.size - 1) % self.capacity]
+
+    def append(self, ts: float, cpu: float, memory: float, disk: float,
+               cpu_min: Optional[float] = None, cpu_max: Optional[float] = None):
+        newest = self.newest()
+        if newest is not None and ts < newest:
+            # Échantillon en retard : le buffer n'est plus complet avant lui
+            self.complete_since = max(self.complete_since, ts + 1e-6)
+            return
+        if self.size == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+            # L'échantillon évincé n'est plus servi : les requêtes plus anciennes iront en base
+            self.complete_since = max(self.complete_since, self.timestamps[self.start])
+        index = (self.start + self.size) % self.capacity
+        self.timestamps[index] = ts
+        self.cpu[index] = cpu
+        self.memory[index] = memory
+        self.disk[index] = disk
+        self.cpu_min[index] = math.nan if cpu_min is None else cpu_min
+        self.cpu_max[index] = math.nan if cpu_max is None else cpu_max
+        self.size += 1
+
+    def _first_at_or_after(self, ts: float) -> int:
+        """Recherche dichotomique sur les index logiques (les timestamps sont croissants)"""
+        low, high = 0, self.size
+        while low < high:
+            mid = (low + high) // 2
+            if self.timestamps[(self.start + mid) % self.capacity] < ts:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def since(self, ts: float) -> List[tuple]:
+        points = []
+        for i in range(self._first_at_or_after(ts), self.size):
+            index = (self.start + i) % self.capacity
+            points.append((
+                self.timestamps[index], self.cpu[index], self.memory[index], self.disk[index],
+                self.cpu_min[index], self.cpu_max[index],
+            ))
+        return points
+
+    def trim(self, ts: float):
+        """Oublie les échantillons antérieurs à ts"""
+        drop = self._first_at_or_after(ts)
+        self.start = (self.start + drop) % self.capacity
+        self.size -= drop
+
+class HotTier:
+    """Dernières heures de métriques de chaque host, en mémoire, alimentées à l'ingestion"""
+
+    def __init__(self, hours: int, capacity: int):
+        self.window = hours * 3600
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.rings: Dict[str, HostRing] = {}
+        self.latest: Dict[str, dict] = {}
+        self.loaded = False
+
+    def _ring(self, hostname: str, complete_since: float) -> HostRing:
+        ring = self.rings.get(hostname)
+        if ring is None:
+            ring = self.rings[hostname] = HostRing(self.capacity, complete_since)
+        return ring
+
+    def add_rows(self, rows: List[dict]):
+        """Ajoute des métriques commitées (dict avec metrics_id) ; ignoré tant que load() n'a pas eu lieu"""
+        if not self.loaded:
+            return
+        with self.lock:
+            for row in sorted(rows, key=lambda r: r["last_seen"]):
+                ts = row["last_seen"].replace(tzinfo=timezone.utc).timestamp()
+                # Nouveau host : toutes ses métriques passent par ici
+                self._ring(row["hostname"], 0.0).append(
+                    ts, row["cpu_utilization"], row["memory_utilization"], row["disk_usage"],
+                    row["cpu_min"], row["cpu_max"],
+                )
+                latest = self.latest.get(row["hostname"])
+                if latest is None or row["last_seen"] >= latest["last_seen"]:
+                    self.latest[row["hostname"]] = {
+                        "id": row.get("metrics_id"),
+                        "hostname": row["hostname"],
+                        "ip_address": row["ip_address"],
+                        "cpu_utilization": row["cpu_utilization"],
+                        "memory_utilization": row["memory_utilization"],
+                        "disk_usage": row["disk_usage"],
+                        "last_seen": row["last_seen"],
+                        "boot_time": row["boot_time"],
+                        **{field: row[field] for field in WINDOW_FIELDS},
+                    }
+
+    def load(self, db: Session):
+        """Reconstruit les buffers depuis la base (au démarrage) ; capacité nulle = cache désactivé"""
+        if self.window <= 0 or self.capacity <= 0:
+            return
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        start = now - timedelta(seconds=self.window)
+        complete_since = float(to_epoch(start))
+        with self.lock:
+            self.rings = {}
+            self.latest = {}
+            for state in db.query(HostStateDB).all():
+                self.latest[state.hostname] = state_to_dict(state)
+                self._ring(state.hostname, complete_since)
+            count = 0
+            for stmt in metrics_range_queries(since=start):
+                for row in db.execute(stmt).mappings():
+                    ts = row["last_seen"].replace(tzinfo=timezone.utc).timestamp()
+                    self._ring(row["hostname"], complete_since).append(
+                        ts, row["cpu_utilization"], row["memory_utilization"], row["disk_usage"],
+                        row["cpu_min"], row["cpu_max"],
+                    )
+                    count += 1
+            self.loaded = True
+        logger.info(f"Hot tier loaded: {len(self.latest)} hosts, {count} samples")
+
+    def get_latest(self, hostname: str) -> Optional[dict]:
+        if not self.loaded:
+            return None
+        with self.lock:
+            return self.latest.get(hostname)
+
+    def all_latest(self) -> Optional[List[dict]]:
+        if not self.loaded:
+            return None
+        with self.lock:
+            return [self.latest[hostname] for hostname in sorted(self.latest)]
+
+    def history(self, hostname: str, since: datetime, limit: int) -> Optional[List[dict]]:
+        """Points depuis `since` (UTC naïf), ou None si le buffer ne couvre pas la période"""
+        if not self.loaded:
+            return None
+        since_ts = since.replace(tzinfo=timezone.utc).timestamp()
+        with self.lock:
+            ring = self.rings.get(hostname)
+            if ring is None or since_ts < ring.complete_since:
+                return None
+            points = ring.since(since_ts)[-limit:]
+        return [
+            {
+                "hostname": hostname,
+                "last_seen": datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None),
+                "cpu_utilization": round(cpu, 2),
+                "memory_utilization": round(memory, 2),
+                "disk_usage": round(disk, 2),
+                "cpu_min": optional(cpu_min),
+                "cpu_max": optional(cpu_max),
+            }
+            for ts, cpu, memory, disk, cpu_min, cpu_max in points
+        ]
+
+    def trim(self, cutoff: datetime):
+        """Aligne le buffer sur une suppression de données brutes antérieures à cutoff"""
+        cutoff_ts = cutoff.replace(tzinfo=timezone.utc).timestamp()
+        with self.lock:
+            for ring in self.rings.values():
+                ring.trim(cutoff_ts)
+
+    def stats(self) -> dict:
+        with self.lock:
+            hosts = len(self.rings)
+            samples = sum(ring.size for ring in self.rings.values())
+        return {
+            "loaded": self.loaded,
+            "window_hours": self.window / 3600,
+            "capacity_per_host": self.capacity,
+            "bytes_per_host": self.capacity * SAMPLE_BYTES,
+            "hosts": hosts,
+            "samples": samples,
+            "buffer_bytes": hosts * self.capacity * SAMPLE_BYTES,
+        }
+
+# Instance globale
+hot_tier = HotTier(HOT_TIER_HOURS, HOT_TIER_CAPACITY)
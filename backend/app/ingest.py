@@ -0,0 +1,139 @@
+import secrets
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import HostStateDB
+from app.segments import segment_registry, mining_segment_registry, segment_day, to_naive_utc, WINDOW_FIELDS
+from app.rollups import upsert_rollups, to_epoch
+from app.hot_tier import hot_tier
+from app.hosts import host_registry, hash_secret, parse_uptime
+from app.mining import miner_registry, mining_samples, insert_mining_samples
+
+# Taille maximale d'un lot accepté par /metrics/batch
+MAX_BATCH_SIZE = 5000
+
+# Colonnes écrites dans les segments
+SAMPLE_COLUMNS = ("host_id", "cpu_utilization", "memory_utilization", "disk_usage", "last_seen", "boot_time") + WINDOW_FIELDS
+
+def resolve_agent(row: dict) -> bool:
+    """Échantillon compact (agent_id) : hostname, IP et boot_time viennent de l'enregistrement.
+
+    Retourne False si l'agent est inconnu (il doit alors se réenregistrer).
+    """
+    agent_id = row.pop("agent_id", None)
+    if agent_id is None:
+        return True
+    host = host_registry.get_host(agent_id)
+    if host is None:
+        return False
+    row["host_id"] = agent_id
+    row["hostname"], row["ip_address"], row["boot_time"] = host
+    return True
+
+def register_host(db: Session, facts: dict) -> Optional[Tuple[int, str]]:
+    """Enregistrement d'un agent, exécuté sur le thread d'écriture ; (agent_id, secret).
+
+    Le premier enregistrement d'un host lui attribue un secret (seul son hash est stocké),
+    exigé à l'ouverture du canal WebSocket. Il ne change plus ensuite : réenregistrer le
+    host (nouvelle IP, redémarrage) demande de présenter ce secret, sinon None est
+    retourné. Connaître un hostname ne suffit donc pas à prendre la place de
+    son agent.
+    """
+    facts = dict(facts)
+    secret = facts.pop("agent_secret", None)
+    hostname = facts["hostname"]
+    if host_registry.has_secret(hostname):
+        if not host_registry.check_secret(host_registry.get_id(hostname), secret):
+            return None
+    else:
+        secret = secrets.token_urlsafe(32)
+        facts["agent_secret_hash"] = hash_secret(secret)
+    agent_id = host_registry.register(db, facts)
+    db.commit()
+    return agent_id, secret
+
+def normalize_row(row: dict) -> dict:
+    """Stocke last_seen en UTC naïf et l'uptime sous forme d'epoch de démarrage"""
+    row["last_seen"] = to_naive_utc(row["last_seen"])
+    for field in WINDOW_FIELDS:
+        row.setdefault(field, None)
+    uptime = row.pop("uptime", None)
+    if row.get("boot_time") is None:
+        # Ancien agent : uptime texte, converti en date de démarrage (à la minute près)
+        seconds = parse_uptime(uptime)
+        row["boot_time"] = to_epoch(row["last_seen"]) - seconds if seconds is not None else None
+    else:
+        row["boot_time"] = int(row["boot_time"])
+    return row
+
+def upsert_host_state(db: Session, rows: List[dict]):
+    """Met à jour host_state avec la ligne la plus récente de chaque host du lot"""
+    latest = {}
+    for row in rows:
+        current = latest.get(row["hostname"])
+        if current is None or row["last_seen"] >= current["last_seen"]:
+            latest[row["hostname"]] = row
+
+    stmt = sqlite_insert(HostStateDB)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[HostStateDB.hostname],
+        set_={
+            "host_id": stmt.excluded.host_id,
+            "metrics_id": stmt.excluded.metrics_id,
+            "ip_address": stmt.excluded.ip_address,
+            "cpu_utilization": stmt.excluded.cpu_utilization,
+            "memory_utilization": stmt.excluded.memory_utilization,
+            "disk_usage": stmt.excluded.disk_usage,
+            "last_seen": stmt.excluded.last_seen,
+            "boot_time": stmt.excluded.boot_time,
+            **{field: stmt.excluded[field] for field in WINDOW_FIELDS},
+        },
+        # Une métrique arrivée en retard ne doit pas écraser un état plus récent
+        where=HostStateDB.last_seen <= stmt.excluded.last_seen,
+    )
+    db.execute(stmt, list(latest.values()))
+
+def insert_metrics(db: Session, rows: List[dict]) -> int:
+    """Insère un lot de métriques en une seule transaction (executemany, sans refresh)"""
+    if not rows:
+        return 0
+    by_day = {}
+    reports = []
+    for row in rows:
+        # Les stats des mineurs partent dans leurs propres segments
+        reports.append((row, row.pop("miners", None) or []))
+        normalize_row(row)
+        by_day.setdefault(segment_day(row["last_seen"]), []).append(row)
+
+    # Création des hosts, mineurs et segments manquants, commitée à part pour ne pas être annulée avec le lot
+    created = host_registry.resolve(db, rows)
+    samples = mining_samples(reports)
+    if samples:
+        created = miner_registry.resolve(db, samples) or created
+    for registry, days in (
+        (segment_registry, by_day),
+        (mining_segment_registry, {segment_day(sample["last_seen"]) for sample in samples}),
+    ):
+        if any(day not in registry.days for day in days):
+            for day in days:
+                registry.ensure(db.connection(), day)
+            created = True
+    if created:
+        db.commit()
+
+    state_rows = []
+    for day, day_rows in by_day.items():
+        table = segment_registry.table(day)
+        ids = db.scalars(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [{column: row[column] for column in SAMPLE_COLUMNS} for row in day_rows],
+        ).all()
+        state_rows.extend(dict(row, metrics_id=id_) for row, id_ in zip(day_rows, ids))
+    upsert_host_state(db, state_rows)
+    upsert_rollups(db, rows)
+    insert_mining_samples(db, samples)
+    db.commit()
+    # Le cache mémoire n'est alimenté qu'une fois les lignes commitées
+    hot_tier.add_rows(state_rows)
+    return len(rows)
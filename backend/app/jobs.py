@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import queue
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import JobDB
+from app.metrics_writer import metrics_writer
+from app.config import JOB_MAX_RUNNING, JOB_TYPE_LIMITS, JOB_MAX_QUEUED, JOB_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# Intervalle minimal entre deux écritures de la progression d'un job (secondes)
+PROGRESS_PERSIST_INTERVAL = 1.0
+
+class JobQueueFull(Exception):
+    pass
+
+class Job:
+    """Job en cours ; l'état en mémoire fait foi, la table jobs en garde une copie"""
+
+    def __init__(self, job_type: str, params: dict, run: Callable[["Job"], Awaitable[dict]]):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.params = params
+        self.run = run
+        self.status = "queued"
+        self.progress_done = 0
+        self.progress_total: Optional[int] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.persisted_at = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None, result: Optional[dict] = None):
+        """Avancement (et résultat partiel) ; écrit en base au plus une fois par seconde"""
+        self.progress_done = done
+        if total is not None:
+            self.progress_total = total
+        if result is not None:
+            self.result = result
+        if time.monotonic() - self.persisted_at >= PROGRESS_PERSIST_INTERVAL:
+            try:
+                self.persist()
+            except queue.Full:
+                pass  # Écrivain en retard : la progression sera écrite à un prochain appel
+
+    def row(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "params": json.dumps(self.params),
+            "progress_done": self.progress_done,
+            "progress_total": self.progress_total,
+            "result": json.dumps(self.result) if self.result is not None else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def persist(self):
+        """Copie l'état en base (thread d'écriture) ; le Future permet d'attendre le commit.
+
+        Lève queue.Full si la file d'écriture est saturée (jamais bloquant).
+        """
+        future = metrics_writer.submit_task(self.save_task())
+        self.persisted_at = time.monotonic()
+        return future
+
+    def save_task(self) -> Callable[[Session], None]:
+        """Écriture de l'état actuel (copié maintenant), pour le thread d'écriture"""
+        return lambda db, row=self.row(): save_job(db, row)
+
+def save_job(db: Session, row: dict):
+    stmt = sqlite_insert(JobDB).values(row)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[JobDB.id],
+        set_={key: stmt.excluded[key] for key in row if key != "id"},
+    )
+    db.execute(stmt)
+    db.commit()
+
+def job_as_dict(row: JobDB) -> dict:
+    return {
+        "id": row.id,
+        "type": row.type,
+        "status": row.status,
+        "params": json.loads(row.params),
+        "progress": {"done": row.progress_done, "total": row.progress_total},
+        "result": json.loads(row.result) if row.result is not None else None,
+        "error": row.error,
+        "created_at": row.created_at.isoformat(),
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
+
+def recover_jobs(db: Session) -> int:
+    """Au démarrage : les jobs actifs d'une exécution précédente sont marqués interrompus,
+    les jobs terminés depuis plus de JOB_RETENTION_DAYS supprimés"""
+    result = db.execute(
+        update(JobDB)
+        .where(JobDB.status.in_(ACTIVE_STATUSES))
+        .values(status="interrupted", error="Backend redémarré pendant l'exécution", finished_at=datetime.utcnow())
+    )
+    db.execute(delete(JobDB).where(
+        JobDB.status.not_in(ACTIVE_STATUSES),
+        JobDB.created_at < datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS),
+    ))
+    db.commit()
+    return result.rowcount
+
+class JobManager:
+    """Exécution en arrière-plan des opérations longues sur le parc.
+
+    submit() retourne immédiatement ; le job attend une place parmi la limite de son type
+    (JOB_TYPE_LIMITS), puis parmi JOB_MAX_RUNNING, et exécute sa coroutine sur la boucle
+    (les opérations elles-mêmes ne bloquent pas : sous-processus asyncio, pool SSH).
+    Statut, progression et résultat sont gardés en mémoire pendant l'exécution et copiés
+    dans la table jobs, ce qui permet de les relire après un rafraîchissement de page ou
+    une fois le job terminé. cancel() annule la coroutine, ce qui tue les processus et
+    ferme les canaux SSH en cours.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}  # Jobs actifs
+        self.slots = asyncio.Semaphore(JOB_MAX_RUNNING)
+        self.type_slots = {job_type: asyncio.Semaphore(limit) for job_type, limit in JOB_TYPE_LIMITS.items()}
+
+    def submit(self, job_type: str, params: dict, run: Callable[[Job], Awaitable[dict]]) -> Job:
+        """Crée un job ; params est stocké tel quel et ne doit pas contenir de secret (gardé par run)"""
+        if sum(job.status == "queued" for job in self.jobs.values()) >= JOB_MAX_QUEUED:
+            raise JobQueueFull()
+        job = Job(job_type, params, run)
+        job.persist()  # queue.Full : file d'écriture saturée, job refusé
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._execute(job))
+        return job
+
+    async def _execute(self, job: Job):
+        try:
+            # Place du type d'abord : un job bloqué par la limite de son type ne garde pas de place globale
+            async with self.type_slots.setdefault(job.type, asyncio.Semaphore(1)):
+                async with self.slots:
+                    job.status = "running"
+                    job.started_at = datetime.utcnow()
+                    try:
+                        job.persist()
+                    except queue.Full:
+                        pass  # Écrit avec la progression ou l'état final
+                    job.result = await job.run(job)
+                    job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.type}) failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        try:
+            await metrics_writer.run_task(job.save_task())
+        except Exception as e:
+            logger.error(f"Job {job.id}: état final non enregistré : {e}")
+        finally:
+            self.jobs.pop(job.id, None)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """État d'un job actif (None s'il est terminé : voir la table jobs)"""
+        job = self.jobs.get(job_id)
+        return job_as_dict(JobDB(**job.row())) if job is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+# Instance globale
+job_manager = JobManager()
@@ -1,22 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, Query, Body, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from app.database import SessionLocal
-from app.schemas import MetricsIn, MetricsOut, InstallMiner
-from app.models import MetricsDB
+from app.schemas import (
+    MetricsIn, MetricsOut, MetricsPageOut, MetricsBatchOut, FleetOverviewOut, InstallMiner, HeartbeatIn,
+    AgentRegisterIn, AgentRegisterOut, SamplingIn,
+)
+from app.models import HostStateDB, MetricsRollupDB, MinerDB, MiningRollupDB, JobDB
+from app.rollups import pick_resolution, to_epoch, ROLLUP_RESOLUTIONS
+from app.queries import metrics_range_queries, mining_range_queries, fetch_rows, oldest_last_seen, encode_cursor, stream_ndjson
+from app.ingest import MAX_BATCH_SIZE, resolve_agent, register_host
+from app.metrics_writer import metrics_writer
+from app.hot_tier import hot_tier, state_to_dict
+from app.hosts import host_registry, heartbeats, uptime_at
+from app.mining import miner_registry, fill_unchanged
+from app.segments import to_naive_utc
+from app.config import (
+    INGEST_DURABILITY, RETENTION_INTERVAL, REPORT_MAX_INTERVAL,
+    COMMAND_CONCURRENCY, COMMAND_HOST_TIMEOUT, COMMAND_DEADLINE, COMMAND_BACKEND, JOB_COMMAND_DEADLINE,
+)
+from app.retention import retention_scheduler, default_policies
+from app.compression import GzipRequestMiddleware
+from app.agent_channel import agent_channels, AgentNotConnected, AgentDisconnected
+from app.commands import (
+    run_process, ansible_shell_args, ansible_output, command_output, reboot_command, iter_fan_out, CommandTimeout,
+)
+from app.ssh_pool import ssh_pool
+from app.jobs import job_manager, job_as_dict, recover_jobs, Job, JobQueueFull
 from sqlalchemy.orm import Session
-from sqlalchemy import text, desc
-from typing import List
+from sqlalchemy import text, desc, select
+from typing import Any, List
 import logging
 from datetime import timedelta, datetime, timezone
 import subprocess
 import os
+import queue
 import json
 import uuid
 import threading
 import time
-from typing import Dict, Optional
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from contextlib import aclosing
 from app.ssh_manager import ssh_manager, SSHSession
 import asyncio
+from functools import partial
 
 app = FastAPI(title="Metrics MineOps", 
               description="API MineOps",
@@ -24,10 +52,14 @@ app = FastAPI(title="Metrics MineOps",
                   {"name": "Metrics", "description": "Gestion des métriques"},
                   {"name": "Maintenance", "description": "Nettoyage et maintenance de la base"},
                   {"name": "Health", "description": "Statut des agents"},
+                  {"name": "Agents", "description": "Enregistrement des agents"},
+                  {"name": "Fleet", "description": "Vue d'ensemble du parc"},
+                  {"name": "Mining", "description": "Statistiques des mineurs CPU"},
                   {"name": "Installation", "description": "Installation/Setup Machine"},
                   {"name": "Device state", "description": "Commande pour gérer l'état de la machine"},
                   {"name": "SSH", "description": "Sessions SSH"}, 
                   {"name": "Commands", "description": "Exécution de commandes"},  
+                  {"name": "Jobs", "description": "Opérations longues en arrière-plan"},
               ])
 
 app.add_middleware(
@@ -37,6 +69,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GzipRequestMiddleware)
 
 def get_db():
     db = SessionLocal()
@@ -47,6 +80,29 @@ def get_db():
 
 mapping_file = "user_mapping.json"
 
+# Délai sans métrique au-delà duquel un agent est considéré offline
+HEALTH_TIMEOUT = timedelta(minutes=2)
+
+def get_health_status(last_seen: datetime, now: datetime) -> str:
+    if last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+    return "online" if last_seen > now - HEALTH_TIMEOUT else "offline"
+
+def latest_sample_time(db: Session, hostname: str) -> Optional[datetime]:
+    """Date de la dernière métrique reçue d'un host (cache mémoire, sinon host_state)"""
+    latest = hot_tier.get_latest(hostname)
+    if latest:
+        return latest["last_seen"]
+    state = db.get(HostStateDB, hostname)
+    return state.last_seen if state else None
+
+def carry_forward(points: List[dict], hostname: str) -> List[dict]:
+    """Prolonge une série jusqu'au dernier battement de cœur : sans nouvel échantillon, les valeurs n'ont pas changé"""
+    heartbeat = heartbeats.get(hostname)
+    if points and heartbeat is not None and heartbeat > points[-1]["last_seen"]:
+        points.append(dict(points[-1], last_seen=heartbeat, carried=True))
+    return points
+
 def save_user_mapping(ip, user):
     if os.path.exists(mapping_file):
         with open(mapping_file, "r") as f:
@@ -66,245 +122,856 @@ def get_user_for_ip(ip):
         return mapping.get(ip)
     return None
 
-@app.get("/metrics", response_model=List[MetricsOut], tags=["Metrics"])
-def get_metrics(db: Session = Depends(get_db)):
-    db_metrics = db.query(MetricsDB).all()
-    if not db_metrics:
-        raise HTTPException(status_code=404, detail="Métrique non trouvée")
-    return db_metrics
+def enqueue_metrics(rows: List[dict]):
+    """Transmet les métriques à l'écrivain ; attend le commit sauf en mode async"""
+    try:
+        future = metrics_writer.submit(rows)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="File d'ingestion saturée, réessayez plus tard")
+    if INGEST_DURABILITY != "async":
+        try:
+            future.result(timeout=30)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erreur lors de l'écriture des métriques : {e}")
+
+# Périodes d'historique proposées par le dashboard (en heures)
+HISTORY_PERIODS = {
+    "1h": 1,
+    "6h": 6,
+    "12h": 12,
+    "24h": 24,
+    "7d": 24 * 7,
+    "30d": 24 * 30
+}
+
+def history_range(period: str):
+    """(heures, début, fin) d'une période d'historique ; 400 si la période est inconnue"""
+    if period not in HISTORY_PERIODS:
+        raise HTTPException(status_code=400, detail="Période invalide. Utilisez: 1h, 6h, 12h, 24h, 7d, 30d")
+    hours = HISTORY_PERIODS[period]
+    end_time = datetime.now(timezone.utc)
+    return hours, end_time - timedelta(hours=hours), end_time
+
+def paginate_metrics(db: Session, hostname, since, until, cursor, limit, format, not_found):
+    """Page de métriques (pagination par curseur sur last_seen, id) ou flux NDJSON"""
+    try:
+        queries = metrics_range_queries(hostname, since, until, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(queries), media_type="application/x-ndjson")
+    rows = fetch_rows(db, queries, limit + 1)
+    if not rows and cursor is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["last_seen"], rows[-1]["id"])
+    return {"items": rows, "next_cursor": next_cursor}
+
+@app.get("/metrics", response_model=MetricsPageOut, tags=["Metrics"])
+def get_metrics(
+    since: Optional[datetime] = Query(None, description="Début de la période (inclus)"),
+    until: Optional[datetime] = Query(None, description="Fin de la période (exclue)"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente (next_cursor)"),
+    limit: int = Query(1000, ge=1, le=5000, description="Nombre de métriques par page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json (page) ou ndjson (flux complet)"),
+    db: Session = Depends(get_db)
+):
+    return paginate_metrics(db, None, since, until, cursor, limit, format, "Métrique non trouvée")
 
 @app.post("/metrics", response_model=MetricsIn, tags=["Metrics"])
-def send_metrics(metrics: MetricsIn, db: Session = Depends(get_db)):
-    db_metrics = MetricsDB(**metrics.model_dump())
-    db.add(db_metrics)
-    db.commit()
-    db.refresh(db_metrics)
-    return db_metrics
+def send_metrics(metrics: MetricsIn):
+    row = metrics.model_dump()
+    if not resolve_agent(row):
+        raise HTTPException(status_code=404, detail="Agent inconnu, réenregistrement nécessaire")
+    enqueue_metrics([row])
+    return metrics
 
-@app.get("/metrics/hostname/{hostname}", response_model=List[MetricsOut], tags=["Metrics"])
-def get_metrics_by_hostname(hostname: str, db: Session = Depends(get_db)):
-    db_metrics = db.query(MetricsDB).filter(MetricsDB.hostname == hostname).all()
-    if not db_metrics:
-        raise HTTPException(status_code=404, detail="Aucune metrique trouvée pour ce hostname")
-    return db_metrics
+@app.post("/metrics/heartbeat", tags=["Metrics"])
+def send_heartbeat(heartbeat: HeartbeatIn):
+    """Signal de vie d'un agent en mode adaptatif (valeurs inchangées depuis son dernier envoi)"""
+    if heartbeat.agent_id is not None:
+        host = host_registry.get_host(heartbeat.agent_id)
+        hostname = host[0] if host else None
+    else:
+        hostname = heartbeat.hostname if host_registry.get_id(heartbeat.hostname or "") is not None else None
+    if hostname is None:
+        # L'agent se réenregistre et renvoie une métrique complète
+        raise HTTPException(status_code=404, detail="Host inconnu, envoyer une métrique complète")
+    heartbeats.touch(hostname, to_naive_utc(heartbeat.last_seen))
+    return {"status": "ok"}
+
+@app.post("/agents/register", response_model=AgentRegisterOut, tags=["Agents"])
+def register_agent(facts: AgentRegisterIn):
+    """Enregistre un agent avec ses faits statiques ; ses métriques ne portent ensuite que l'agent_id"""
+    try:
+        future = metrics_writer.submit_task(partial(register_host, facts=facts.model_dump()))
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="File d'écriture saturée, réessayez plus tard")
+    try:
+        registered = future.result(timeout=30)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'enregistrement de l'agent : {e}")
+    if registered is None:
+        raise HTTPException(
+            status_code=403,
+            detail="Host déjà enregistré : secret d'agent absent ou invalide (effacer hosts.agent_secret_hash et redémarrer l'API pour le réattribuer)",
+        )
+    agent_id, secret = registered
+    return {"agent_id": agent_id, "agent_secret": secret}
+
+@app.post("/metrics/batch", response_model=MetricsBatchOut, tags=["Metrics"])
+def send_metrics_batch(records: List[Any] = Body(...)):
+    """Ingestion d'un lot de métriques (plusieurs hosts possibles) en une seule transaction"""
+    if len(records) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Lot trop volumineux (maximum {MAX_BATCH_SIZE} métriques)")
+    rows = []
+    results = []
+    for index, record in enumerate(records):
+        try:
+            row = MetricsIn.model_validate(record).model_dump()
+            if not resolve_agent(row):
+                results.append({"index": index, "status": "rejected", "detail": "agent_id: agent inconnu"})
+                continue
+            rows.append(row)
+            results.append({"index": index, "status": "accepted"})
+        except ValidationError as e:
+            errors = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" if err["loc"] else err["msg"]
+                for err in e.errors()
+            )
+            results.append({"index": index, "status": "rejected", "detail": errors})
+    enqueue_metrics(rows)
+    return {
+        "accepted": len(rows),
+        "rejected": len(records) - len(rows),
+        "results": results
+    }
+
+@app.get("/metrics/hostname/{hostname}", response_model=MetricsPageOut, tags=["Metrics"])
+def get_metrics_by_hostname(
+    hostname: str,
+    since: Optional[datetime] = Query(None, description="Début de la période (inclus)"),
+    until: Optional[datetime] = Query(None, description="Fin de la période (exclue)"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente (next_cursor)"),
+    limit: int = Query(1000, ge=1, le=5000, description="Nombre de métriques par page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json (page) ou ndjson (flux complet)"),
+    db: Session = Depends(get_db)
+):
+    return paginate_metrics(db, hostname, since, until, cursor, limit, format, "Aucune metrique trouvée pour ce hostname")
 
 @app.get("/metrics/latest/{hostname}", response_model=MetricsOut, tags=["Metrics"])
 def get_latest_metrics_by_hostname(hostname: str, db: Session = Depends(get_db)):
-    db_metrics = db.query(MetricsDB).filter(MetricsDB.hostname == hostname).order_by(MetricsDB.last_seen.desc()).first()
+    db_metrics = hot_tier.get_latest(hostname) or db.get(HostStateDB, hostname)
     if not db_metrics:
         raise HTTPException(status_code=404, detail="Aucune métrique trouvé pour ce hostname")
     return db_metrics
 
 @app.get("/healthcheck/{hostname}", tags=["Health"])
 def get_agent_health(hostname: str, db: Session = Depends(get_db)):
-    current_time = datetime.now(timezone.utc)
-    threshold = current_time - timedelta(minutes=2)
-    latest_metric = db.query(MetricsDB).filter(MetricsDB.hostname == hostname).order_by(MetricsDB.last_seen.desc()).first()
-    if not latest_metric:
-        raise HTTPException(status_code=404, detail="Aucune métrique trouvée pour ce hostname")
-    last_seen = latest_metric.last_seen
+    latest_metric = hot_tier.get_latest(hostname)
+    if latest_metric:
+        last_seen = latest_metric["last_seen"]
+    else:
+        latest_metric = db.get(HostStateDB, hostname)
+        if not latest_metric:
+            raise HTTPException(status_code=404, detail="Aucune métrique trouvée pour ce hostname")
+        last_seen = latest_metric.last_seen
+    last_seen = heartbeats.last_contact(hostname, last_seen)
     if last_seen.tzinfo is None:
         last_seen = last_seen.replace(tzinfo=timezone.utc)
-    status = "online" if last_seen > threshold else "offline"
+    status = get_health_status(last_seen, datetime.now(timezone.utc))
     return {"hostname": hostname, "status": status, "last_seen": last_seen}
 
-@app.post("/metrics/clean", tags=["Maintenance"])
-def clean_db(months: int = Query(0, ge=0, description="Nombre de mois à garder (minimum 1)"), db: Session = Depends(get_db)):
+@app.get("/fleet/overview", response_model=FleetOverviewOut, tags=["Fleet"])
+def get_fleet_overview(db: Session = Depends(get_db)):
+    """Dernière métrique et statut de chaque host (cache mémoire, sinon host_state)"""
     now = datetime.now(timezone.utc)
-    cutoff = now - timedelta(days=30 * months)
-    deleted = db.query(MetricsDB).filter(MetricsDB.last_seen < cutoff).delete()
-    db.commit()
-    try:
-        db.execute(text("VACUUM"))
-        vacuum_status = "VACUUM exécuté avec succès"
-    except Exception as e:
-        vacuum_status = f"Erreur VACUUM: {e}"
+    states = hot_tier.all_latest()
+    if states is None:
+        states = [state_to_dict(state) for state in db.query(HostStateDB).order_by(HostStateDB.hostname).all()]
+    hosts = []
+    for state in states:
+        # Dernier signe de vie : une absence de métrique signifie "inchangé" si l'agent bat
+        last_seen = heartbeats.last_contact(state["hostname"], state["last_seen"])
+        hosts.append({
+            "hostname": state["hostname"],
+            "status": get_health_status(last_seen, now),
+            "last_seen": last_seen,
+            "metrics": state
+        })
+    return {
+        "total": len(hosts),
+        "online": sum(1 for h in hosts if h["status"] == "online"),
+        "hosts": hosts
+    }
+
+@app.post("/metrics/clean", tags=["Maintenance"])
+async def clean_db(months: int = Query(0, ge=0, description="Nombre de mois à garder (minimum 1)")):
+    """Supprime les métriques brutes plus anciennes que `months` mois, par lots, puis libère l'espace"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=30 * months)
+    result = await retention_scheduler.run_once([("raw", None, cutoff.replace(tzinfo=None))])
     return {
-        "deleted": deleted,
+        "deleted": result["deleted"].get("raw", 0),
         "cutoff": cutoff.isoformat(),
-        "vacuum": vacuum_status
+        "vacuum": f"Erreur: {result['error']}" if result["error"] else f"{result['freed_pages']} pages libérées (incremental_vacuum)"
     }
 
 @app.post("/metrics/auto_clean", tags=["Maintenance"])
-def auto_clean(db: Session = Depends(get_db)):
-    oldest = db.query(MetricsDB).order_by(MetricsDB.last_seen.asc()).first()
+async def auto_clean(db: Session = Depends(get_db)):
+    oldest = oldest_last_seen(db)
+    if not oldest:
+        return {"status": "no_clean_needed", "oldest": None}
     now = datetime.now(timezone.utc)
-    age = now - oldest.last_seen
+    oldest_seen = oldest.replace(tzinfo=timezone.utc)
+    age = now - oldest_seen
     if age.days > 365:
         cutoff = now - timedelta(days=30 * 6)
-        deleted = db.query(MetricsDB).filter(MetricsDB.last_seen < cutoff).delete()
-        db.commit()
-        try:
-            db.execute(text("VACUUM"))
-            vacuum_status = "VACUUM exécuté avec succès"
-        except Exception as e:
-            vacuum_status = f"Erreur VACUUM: {e}"
+        result = await retention_scheduler.run_once([("raw", None, cutoff.replace(tzinfo=None))])
         return {
-            "deleted": deleted,
+            "deleted": result["deleted"].get("raw", 0),
             "cutoff": cutoff.isoformat(),
-            "vacuum": vacuum_status,
+            "vacuum": f"Erreur: {result['error']}" if result["error"] else f"{result['freed_pages']} pages libérées (incremental_vacuum)",
             "auto_clean": True
         }
-    return {"status": "no_clean_needed", "oldest": oldest.last_seen.isoformat()}
+    return {"status": "no_clean_needed", "oldest": oldest_seen.isoformat()}
+
+@app.get("/metrics/retention", tags=["Maintenance"])
+def get_retention_status():
+    """Politiques de rétention et progression de la passe en cours (ou de la dernière)"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return {
+        "policies": [
+            {"tier": name, "cutoff": cutoff.isoformat()}
+            for name, _, cutoff in default_policies(now)
+        ],
+        "interval_seconds": RETENTION_INTERVAL,
+        "status": retention_scheduler.status
+    }
+
+@app.get("/metrics/hot-tier", tags=["Maintenance"])
+def get_hot_tier_stats():
+    """Occupation du cache mémoire des dernières métriques"""
+    return hot_tier.stats()
+
+@app.post("/metrics/retention/run", tags=["Maintenance"])
+async def run_retention():
+    """Lance immédiatement une passe de rétention (attend la passe en cours le cas échéant)"""
+    return await retention_scheduler.run_once()
 
 @app.get("/metrics/history/{hostname}", tags=["Metrics"])
 def get_metrics_history(
     hostname: str, 
-    period: str = Query("6h", description="Période d'historique (1h, 6h, 12h, 24h)"),
-    limit: int = Query(500, ge=50, le=1000, description="Nombre maximum de points"),
+    period: str = Query("6h", description="Période d'historique (1h, 6h, 12h, 24h, 7d, 30d)"),
+    limit: int = Query(500, ge=50, le=1000, description="Nombre maximum de points visé pour choisir la résolution"),
     db: Session = Depends(get_db)
 ):
-    period_map = {
-        "1h": 1,
-        "6h": 6, 
-        "12h": 12,
-        "24h": 24
-    }
-    
-    if period not in period_map:
-        raise HTTPException(status_code=400, detail="Période invalide. Utilisez: 1h, 6h, 12h, 24h")
-    
-    hours = period_map[period]
-    end_time = datetime.now(timezone.utc)
-    start_time = end_time - timedelta(hours=hours)
-
-    metrics = (
-        db.query(MetricsDB)
-        .filter(MetricsDB.hostname == hostname)
-        .filter(MetricsDB.last_seen >= start_time)
-        .order_by(MetricsDB.last_seen.asc())
-        .limit(limit)
-        .all()
-    )
+    hours, start_time, end_time = history_range(period)
+    resolution = pick_resolution(hours * 3600, limit)
+
+    if resolution is None:
+        # Période courte : données brutes, depuis le cache mémoire s'il couvre la période
+        metrics = hot_tier.history(hostname, start_time.replace(tzinfo=None), limit)
+        if metrics is None:
+            queries = metrics_range_queries(hostname, since=start_time, descending=True)
+            metrics = [
+                {
+                    "hostname": row["hostname"],
+                    "last_seen": row["last_seen"],
+                    "cpu_utilization": row["cpu_utilization"],
+                    "memory_utilization": row["memory_utilization"],
+                    "disk_usage": row["disk_usage"],
+                    "cpu_min": row["cpu_min"],
+                    "cpu_max": row["cpu_max"],
+                }
+                for row in fetch_rows(db, queries, limit)
+            ]
+            metrics.reverse()
+    else:
+        # Période longue : lecture des agrégats, nombre de points fixe pour la période
+        start_bucket = to_epoch(start_time)
+        rollups = (
+            db.query(MetricsRollupDB)
+            .filter(MetricsRollupDB.resolution == resolution)
+            .filter(MetricsRollupDB.host_id == host_registry.get_id(hostname))
+            .filter(MetricsRollupDB.bucket >= start_bucket - start_bucket % resolution)
+            .order_by(MetricsRollupDB.bucket.asc())
+            .all()
+        )
+        metrics = [rollup.as_dict(hostname) for rollup in rollups]
     
     if not metrics:
         raise HTTPException(status_code=404, detail=f"Aucune métrique trouvée pour {hostname} sur les {hours}h")
+    carry_forward(metrics, hostname)
     
     return {
         "hostname": hostname,
         "period": period,
+        "resolution": resolution or "raw",
         "start_time": start_time.isoformat(),
         "end_time": end_time.isoformat(),
         "count": len(metrics),
-        "metrics": [m.as_dict() for m in metrics]
+        "metrics": metrics
     }
 
-@app.post("/add-miner", tags=["Installation"])
-async def add_miner(data: InstallMiner):
-    ip = data.ip_address
-    user = data.user
-    password = data.password
-    script_path = os.path.join(os.getcwd(), "utils/install_agent.py")
-    result = subprocess.run(
-        [script_path, ip, user, password],
-        capture_output=True,
-        text=True
-    )
-    if result.returncode != 0:
-        print("STDERR:", result.stderr)
-        print("STDOUT:", result.stdout)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de l'installation : {result.stderr.strip() or result.stdout.strip()}"
+@app.get("/mining/latest/{hostname}", tags=["Mining"])
+def get_latest_mining_stats(hostname: str, db: Session = Depends(get_db)):
+    """Dernier état connu de chaque mineur d'un host"""
+    host_id = host_registry.get_id(hostname)
+    miners = db.query(MinerDB).filter(MinerDB.host_id == host_id).order_by(MinerDB.name).all() if host_id else []
+    if not miners:
+        raise HTTPException(status_code=404, detail=f"Aucun mineur connu pour {hostname}")
+    # Un mineur est actif s'il figurait dans le dernier envoi d'un host toujours en vie
+    sample_time = latest_sample_time(db, hostname)
+    host_online = sample_time is not None and get_health_status(
+        heartbeats.last_contact(hostname, sample_time), datetime.now(timezone.utc)
+    ) == "online"
+    status = {
+        miner.id: "online" if host_online and miner.last_seen is not None and miner.last_seen >= sample_time else "offline"
+        for miner in miners
+    }
+    return {
+        "hostname": hostname,
+        "total_hashrate": sum(miner.hashrate or 0 for miner in miners if status[miner.id] == "online"),
+        "miners": [
+            {
+                "miner": miner.name,
+                "status": status[miner.id],
+                "last_seen": miner.last_seen,
+                "hashrate": miner.hashrate,
+                "accepted_shares": miner.accepted_shares,
+                "rejected_shares": miner.rejected_shares,
+                "temp": miner.temp,
+            }
+            for miner in miners
+        ]
+    }
+
+@app.get("/mining/history/{hostname}", tags=["Mining"])
+def get_mining_history(
+    hostname: str,
+    period: str = Query("6h", description="Période d'historique (1h, 6h, 12h, 24h, 7d, 30d)"),
+    limit: int = Query(500, ge=50, le=1000, description="Nombre maximum de points par mineur visé pour choisir la résolution"),
+    db: Session = Depends(get_db)
+):
+    """Historique hashrate/shares/température de chaque mineur d'un host (brut ou agrégé selon la période)"""
+    hours, start_time, end_time = history_range(period)
+    resolution = pick_resolution(hours * 3600, limit)
+    host_id = host_registry.get_id(hostname)
+    miners = miner_registry.miners_of(host_id) if host_id is not None else {}
+
+    series = {name: [] for name in miners.values()}
+    if resolution is None:
+        queries = mining_range_queries(list(miners), since=start_time, descending=True)
+        rows = fetch_rows(db, queries, limit * len(miners))
+        for row in reversed(rows):
+            series[miners[row["miner_id"]]].append({
+                "last_seen": row["last_seen"],
+                "hashrate": row["hashrate"],
+                "accepted_shares": row["accepted_shares"],
+                "rejected_shares": row["rejected_shares"],
+                "temp": row["temp"],
+            })
+    elif miners:
+        start_bucket = to_epoch(start_time)
+        rollups = (
+            db.query(MiningRollupDB)
+            .filter(MiningRollupDB.resolution == resolution)
+            .filter(MiningRollupDB.miner_id.in_(list(miners)))
+            .filter(MiningRollupDB.bucket >= start_bucket - start_bucket % resolution)
+            .order_by(MiningRollupDB.bucket.asc())
+            .all()
         )
-    save_user_mapping(ip, user)
-    return {"output": result.stdout.strip()}
+        for rollup in rollups:
+            series[miners[rollup.miner_id]].append(rollup.as_dict(miners[rollup.miner_id]))
 
-@app.post("/reboot/{ip_address}", tags=["Device state"])
-async def reboot_device(ip_address: str):
+    if not any(series.values()):
+        raise HTTPException(status_code=404, detail=f"Aucune stat de mining trouvée pour {hostname} sur les {hours}h")
+    sample_time = latest_sample_time(db, hostname)
+    for points in series.values():
+        # Seuls les mineurs encore présents dans le dernier envoi sont prolongés
+        if points and sample_time is not None and points[-1]["last_seen"] >= sample_time - timedelta(seconds=resolution or 0):
+            carry_forward(points, hostname)
+
+    return {
+        "hostname": hostname,
+        "period": period,
+        "resolution": resolution or "raw",
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "miners": [{"miner": name, "count": len(points), "points": points} for name, points in sorted(series.items())]
+    }
+
+@app.get("/fleet/hashrate", tags=["Fleet"])
+def get_fleet_hashrate(
+    period: str = Query("24h", description="Période d'historique (1h, 6h, 12h, 24h, 7d, 30d)"),
+    limit: int = Query(500, ge=50, le=1000, description="Nombre maximum de points visé pour choisir la résolution"),
+    db: Session = Depends(get_db)
+):
+    """Hashrate total du parc : valeur courante par host et historique (somme des moyennes par mineur)"""
+    hours, start_time, end_time = history_range(period)
+    # Toujours depuis les agrégats : des échantillons bruts de mineurs différents n'ont pas les mêmes instants
+    resolution = pick_resolution(hours * 3600, limit) or ROLLUP_RESOLUTIONS[0]
+
+    now = datetime.now(timezone.utc)
+    states = {}
+    for host_id, hostname, last_seen in db.query(HostStateDB.host_id, HostStateDB.hostname, HostStateDB.last_seen):
+        contact = heartbeats.last_contact(hostname, last_seen)
+        states[host_id] = (hostname, last_seen, contact, get_health_status(contact, now) == "online")
+    hosts = {}
+    # Date au-delà de laquelle la valeur d'un mineur n'est plus reportée dans l'historique
+    until = {}
+    for miner in db.query(MinerDB).filter(MinerDB.last_seen.is_not(None)).all():
+        if miner.host_id not in states:
+            continue
+        hostname, sample_time, contact, online = states[miner.host_id]
+        # Mineur absent du dernier envoi de son host : arrêté
+        stopped = miner.last_seen < sample_time
+        until[miner.id] = to_epoch(miner.last_seen if stopped else contact)
+        if not online or stopped or miner.hashrate is None:
+            continue
+        host = hosts.setdefault(hostname, {"hostname": hostname, "hashrate": 0.0, "miners": 0})
+        host["hashrate"] += miner.hashrate
+        host["miners"] += 1
+
+    start_bucket = to_epoch(start_time)
+    rows = db.execute(
+        select(MiningRollupDB.bucket, MiningRollupDB.miner_id, MiningRollupDB.hashrate_sum / MiningRollupDB.samples)
+        .where(MiningRollupDB.resolution == resolution)
+        .where(MiningRollupDB.bucket >= start_bucket - start_bucket % resolution)
+        .order_by(MiningRollupDB.bucket)
+    ).all()
+    end_bucket = to_epoch(end_time)
+    history = fill_unchanged(rows, resolution, REPORT_MAX_INTERVAL, end_bucket - end_bucket % resolution, until)
+
+    return {
+        "total_hashrate": sum(host["hashrate"] for host in hosts.values()),
+        "online_miners": sum(host["miners"] for host in hosts.values()),
+        "hosts": sorted(hosts.values(), key=lambda host: host["hostname"]),
+        "period": period,
+        "resolution": resolution,
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "history": [
+            {
+                "last_seen": datetime.fromtimestamp(point["bucket"], timezone.utc).replace(tzinfo=None),
+                "hashrate": point["hashrate"],
+                "miners": point["miners"],
+            }
+            for point in history
+        ]
+    }
+
+class OperationError(Exception):
+    """Échec d'une opération sur un host ; HTTP 500 en synchrone, job failed en arrière-plan"""
+
+async def install_miner(data: InstallMiner) -> dict:
+    script_path = os.path.join(os.getcwd(), "utils/install_agent.py")
+    returncode, stdout, stderr = await run_process([script_path, data.ip_address, data.user, data.password])
+    if returncode != 0:
+        print("STDERR:", stderr)
+        print("STDOUT:", stdout)
+        raise OperationError(f"Erreur lors de l'installation : {stderr.strip() or stdout.strip()}")
+    save_user_mapping(data.ip_address, data.user)
+    return {"output": stdout.strip()}
+
+async def reboot_host(ip_address: str) -> dict:
+    # Agent connecté par WebSocket : commande poussée directement, sinon par SSH
+    agent_id = agent_channels.agent_for_ip(ip_address)
+    if agent_id is not None:
+        try:
+            result = await agent_channels.send_command(agent_id, "reboot")
+            return {"ip": ip_address, "output": result.get("output", ""), "transport": "agent"}
+        except (AgentDisconnected, asyncio.TimeoutError):
+            # Commande reçue par l'agent : un second redémarrage par SSH pourrait suivre le premier
+            raise OperationError("Redémarrage envoyé à l'agent sans réponse : résultat inconnu, pas de nouvel essai par SSH")
+        except AgentNotConnected:
+            pass
     user = get_user_for_ip(ip_address) or "root"
-    result = subprocess.run(
-        [
+    if COMMAND_BACKEND == "ssh":
+        try:
+            returncode, stdout, stderr = await ssh_pool.run(ip_address, user, reboot_command(user), timeout=15)
+        except Exception as e:
+            returncode, stdout, stderr = -1, "", str(e)
+        if returncode == 0:
+            # Les connexions vers ce host vont être coupées par le redémarrage
+            ssh_pool.discard(ip_address)
+            stdout = stdout or "Redémarrage lancé"
+    else:
+        returncode, stdout, stderr = await run_process([
             "ansible",
             ip_address,
             "-i", f"{ip_address},",
             "-m", "reboot",
             "-u", user,
             "--become"
-        ],
-        capture_output=True,
-        text=True
-    )
-    if result.returncode != 0:
-        print("STDERR:", result.stderr)
-        print("STDOUT:", result.stdout)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de l'execution de la commande reboot : {result.stderr.strip() or result.stdout.strip()}"
+        ])
+    if returncode != 0:
+        print("STDERR:", stderr)
+        print("STDOUT:", stdout)
+        raise OperationError(f"Erreur lors de l'execution de la commande reboot : {stderr.strip() or stdout.strip()}")
+    return {"ip": ip_address, "output": stdout.strip(), "transport": COMMAND_BACKEND}
+
+@app.post("/add-miner", tags=["Installation"])
+async def add_miner(data: InstallMiner):
+    """Installation synchrone (plusieurs minutes) ; préférer POST /jobs/add-miner"""
+    try:
+        return await install_miner(data)
+    except OperationError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/reboot/{ip_address}", tags=["Device state"])
+async def reboot_device(ip_address: str):
+    try:
+        return await reboot_host(ip_address)
+    except OperationError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def command_result(hostname: str, ip_address: Optional[str], success: bool, output: str, return_code: int, transport: Optional[str]) -> dict:
+    return {
+        "hostname": hostname,
+        "ip_address": ip_address,
+        "success": success,
+        "output": output,  # Retours à la ligne préservés
+        "return_code": return_code,
+        "transport": transport,
+    }
+
+async def run_command_over_ssh(
+    hostname: str, ip_address: str, command: str, timeout: float,
+    on_output: Optional[Callable[[str, str], None]] = None,
+) -> dict:
+    """Connexion SSH du pool (MINEOPS_COMMAND_BACKEND=ssh) ou processus ansible.
+
+    Avec on_output (pool SSH uniquement), la sortie est transmise au fil de l'eau et le
+    résultat, marqué streamed, ne la contient pas.
+    """
+    user = get_user_for_ip(ip_address) or "root"
+    streamed = False
+    try:
+        if COMMAND_BACKEND == "ssh":
+            returncode, stdout, stderr = await ssh_pool.run(ip_address, user, command, timeout, on_output)
+            output = command_output(returncode, stdout, stderr)
+            streamed = on_output is not None
+        else:
+            returncode, stdout, stderr = await run_process(ansible_shell_args(ip_address, user, command), timeout)
+            output = ansible_output(returncode, stdout, stderr)
+    except CommandTimeout:
+        return command_result(hostname, ip_address, False, f"Commande timeout ({timeout:g}s)", -1, COMMAND_BACKEND)
+    except Exception as e:
+        return command_result(hostname, ip_address, False, f"Erreur: {str(e)}", -1, COMMAND_BACKEND)
+    result = command_result(hostname, ip_address, returncode == 0, output, returncode, COMMAND_BACKEND)
+    if streamed:
+        result["streamed"] = True
+    return result
+
+async def run_command_over_channel(hostname: str, ip_address: str, agent_id: int, command: str, timeout: float) -> Optional[dict]:
+    """Exécution par le canal de l'agent ; None si la commande n'a pas pu lui être transmise (repli SSH)"""
+    try:
+        result = await agent_channels.send_command(agent_id, "run", timeout=timeout + 5, command=command, timeout_seconds=timeout)
+    except AgentDisconnected:
+        # Déjà reçue par l'agent : pas de seconde exécution par SSH
+        result = {"output": "Agent déconnecté pendant la commande : résultat inconnu", "return_code": -1}
+    except AgentNotConnected:
+        return None
+    except asyncio.TimeoutError:
+        result = {"output": f"Commande timeout ({timeout:g}s)", "return_code": -1}
+    return_code = result.get("return_code", -1)
+    return command_result(hostname, ip_address, return_code == 0, result.get("output", "").rstrip(), return_code, "agent")
+
+async def run_command_on_host(
+    hostname: str, ip_address: str, agent_id: Optional[int], command: str, timeout: float,
+    on_output: Optional[Callable[[str, str], None]] = None,
+) -> dict:
+    """Canal WebSocket si l'agent est connecté, sinon (ou déconnecté entre-temps) par SSH"""
+    if agent_channels.is_connected(agent_id):
+        result = await run_command_over_channel(hostname, ip_address, agent_id, command, timeout)
+        if result is not None:
+            return result
+    return await run_command_over_ssh(hostname, ip_address, command, timeout, on_output)
+
+def positive_option(request: dict, key: str, default: float, integer: bool = False) -> float:
+    value = request.get(key)
+    if value is None:
+        return default
+    if integer:
+        # Pas de troncature : 0.5 donnerait un sémaphore à 0 et aucun host ne s'exécuterait
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise HTTPException(status_code=400, detail=f"{key} must be an integer >= 1")
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise HTTPException(status_code=400, detail=f"{key} must be a positive number")
+    return value
+
+class CommandPlan:
+    """Requête d'exécution validée : options, hosts inconnus (résultat immédiat) et un job par host.
+
+    Options de la requête : concurrency (hosts simultanés), timeout (par host) et deadline
+    (globale), en secondes ; par défaut MINEOPS_COMMAND_CONCURRENCY, _HOST_TIMEOUT et _DEADLINE.
+    """
+
+    def __init__(
+        self, request: dict, db: Session,
+        output_for: Optional[Callable[[str], Callable[[str, str], None]]] = None,
+        default_deadline: float = COMMAND_DEADLINE,
+    ):
+        command = request.get("command")
+        hostnames = request.get("hostnames", [])
+        if not command or not hostnames:
+            raise HTTPException(
+                status_code=400, 
+                detail="Command and hostnames are required"
+            )
+        self.hostnames = list(dict.fromkeys(hostnames))
+        self.concurrency = positive_option(request, "concurrency", COMMAND_CONCURRENCY, integer=True)
+        self.timeout = positive_option(request, "timeout", COMMAND_HOST_TIMEOUT)
+        self.deadline = positive_option(request, "deadline", default_deadline)
+
+        self.unknown = {}
+        self.jobs = {}
+        self.addresses = {}
+        for hostname in self.hostnames:
+            metrics = db.get(HostStateDB, hostname)
+            if not metrics:
+                self.unknown[hostname] = {
+                    **command_result(hostname, None, False, f"Hostname {hostname} not found in database", -1, None),
+                    "queued_ms": 0,
+                    "duration_ms": 0,
+                }
+                continue
+            self.addresses[hostname] = metrics.ip_address
+            self.jobs[hostname] = partial(
+                run_command_on_host, hostname, metrics.ip_address, host_registry.get_id(hostname), command,
+                self.timeout, output_for(hostname) if output_for else None,
+            )
+
+    def on_deadline(self, hostname: str) -> dict:
+        return command_result(
+            hostname, self.addresses[hostname], False, f"Échéance globale dépassée ({self.deadline:g}s)", -1, None,
         )
-    return {"ip": ip_address, "output": result.stdout.strip()}
+
+    def results(self) -> AsyncIterator[Tuple[str, dict]]:
+        """(hostname, résultat) dans l'ordre de fin"""
+        return iter_fan_out(self.jobs, self.concurrency, self.deadline, self.on_deadline)
 
 @app.post("/execute-command", tags=["Commands"])
 async def execute_command(request: dict, db: Session = Depends(get_db)):
-    command = request.get("command")
-    hostnames = request.get("hostnames", [])
-    if not command or not hostnames:
-        raise HTTPException(
-            status_code=400, 
-            detail="Command and hostnames are required"
-        )
-    results = []
-    for hostname in hostnames:
-        metrics = db.query(MetricsDB).filter(MetricsDB.hostname == hostname).order_by(MetricsDB.last_seen.desc()).first()
-        if not metrics:
-            results.append({
-                "hostname": hostname,
-                "success": False,
-                "output": f"Hostname {hostname} not found in database",
-                "return_code": -1
-            })
-            continue      
-        ip_address = metrics.ip_address
-        user = get_user_for_ip(ip_address) or "root"
-        try:
-            result = subprocess.run([
-                "ansible",
-                ip_address,
-                "-i", f"{ip_address},",
-                "-m", "shell",
-                "-a", command,
-                "-u", user
-            ], capture_output=True, text=True, timeout=30)
-            # Traitement de la sortie Ansible pour garder les retours à la ligne
-            if result.returncode == 0:
-                raw_output = result.stdout
-                if ">>" in raw_output:
-                    clean_output = raw_output.split(">>", 1)[1].rstrip()
-                else:
-                    clean_output = raw_output.rstrip()
-            else:
-                clean_output = result.stdout.rstrip() or result.stderr.rstrip()
-            results.append({
-                "hostname": hostname,
-                "ip_address": ip_address,
-                "success": result.returncode == 0,
-                "output": clean_output,  # Retours à la ligne préservés
-                "return_code": result.returncode
-            })
-        except subprocess.TimeoutExpired:
-            results.append({
-                "hostname": hostname,
-                "ip_address": ip_address,
-                "success": False,
-                "output": "Commande timeout (30s)",
-                "return_code": -1
-            })
-        except Exception as e:
-            results.append({
-                "hostname": hostname,
-                "ip_address": ip_address,
-                "success": False,
-                "output": f"Erreur: {str(e)}",
-                "return_code": -1
-            })
-    return {"results": results}
+    """Exécute une commande sur plusieurs hosts en parallèle ; réponse quand tous ont terminé.
+
+    Voir CommandPlan pour les options, et /execute-command/ws pour les résultats au fil de l'eau.
+    """
+    started = time.monotonic()
+    plan = CommandPlan(request, db)
+    # La session de lecture n'est plus utile pendant l'exécution
+    db.close()
+
+    results = dict(plan.unknown)
+    async with aclosing(plan.results()) as completed:
+        async for hostname, result in completed:
+            results[hostname] = result
+    return {
+        "results": [results[hostname] for hostname in plan.hostnames],
+        "duration_ms": round((time.monotonic() - started) * 1000),
+    }
+
+@app.websocket("/execute-command/ws")
+async def execute_command_stream(websocket: WebSocket):
+    """Exécution d'une commande avec les résultats au fil de l'eau.
+
+    Le client envoie la requête de /execute-command (plus stream_output: true pour
+    recevoir la sortie en direct des hosts joints par le pool SSH), puis reçoit :
+    start {hostnames}, output {hostname, stream, data} si demandé, result {...} par host
+    dès qu'il termine, et done {duration_ms}. Fermer la connexion annule les commandes en cours.
+
+    Rien n'est accumulé côté backend : chaque résultat est envoyé puis oublié, et la
+    sortie en direct passe par une file bornée ; un client lent ralentit la lecture SSH.
+    """
+    await websocket.accept()
+    try:
+        request = json.loads(await websocket.receive_text())
+        if not isinstance(request, dict):
+            raise ValueError("request must be an object")
+    except WebSocketDisconnect:
+        return
+    except ValueError as e:
+        await websocket.send_text(json.dumps({"type": "error", "message": f"Requête invalide : {e}"}))
+        await websocket.close()
+        return
+
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    messages: asyncio.Queue = asyncio.Queue(maxsize=256)
+    streaming = threading.Event()
+    streaming.set()
+
+    def output_for(hostname: str) -> Callable[[str, str], None]:
+        def forward(stream: str, data: str):
+            if not streaming.is_set():
+                return
+            # Appelé depuis un thread du pool SSH : attend une place dans la file
+            future = asyncio.run_coroutine_threadsafe(
+                messages.put({"type": "output", "hostname": hostname, "stream": stream, "data": data}), loop,
+            )
+            try:
+                future.result(timeout=COMMAND_HOST_TIMEOUT)
+            except Exception:
+                future.cancel()
+        return forward
+
+    db = SessionLocal()
+    try:
+        plan = CommandPlan(request, db, output_for if request.get("stream_output") else None)
+    except HTTPException as e:
+        await websocket.send_text(json.dumps({"type": "error", "message": e.detail}))
+        await websocket.close()
+        return
+    finally:
+        db.close()
+
+    async def produce():
+        for result in plan.unknown.values():
+            await messages.put({"type": "result", **result})
+        async with aclosing(plan.results()) as completed:
+            async for _, result in completed:
+                await messages.put({"type": "result", **result})
+        await messages.put(None)
+
+    async def send_messages():
+        await websocket.send_text(json.dumps({"type": "start", "hostnames": plan.hostnames}))
+        while (message := await messages.get()) is not None:
+            await websocket.send_text(json.dumps(message))
+        await websocket.send_text(json.dumps({"type": "done", "duration_ms": round((time.monotonic() - started) * 1000)}))
+
+    async def wait_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    producer = asyncio.create_task(produce())
+    sender = asyncio.create_task(send_messages())
+    watcher = asyncio.create_task(wait_disconnect())
+    try:
+        await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if sender.done() and not sender.cancelled() and sender.exception() is None:
+            watcher.cancel()
+            await websocket.close()
+    except RuntimeError:
+        pass
+    finally:
+        # Client parti : les commandes encore en cours sont annulées, la file libérée
+        streaming.clear()
+        for task in (producer, sender, watcher):
+            task.cancel()
+        await asyncio.gather(producer, sender, watcher, return_exceptions=True)
+        while not messages.empty():
+            messages.get_nowait()
+
+def submit_job(job_type: str, params: dict, run) -> dict:
+    try:
+        job = job_manager.submit(job_type, params, run)
+    except JobQueueFull:
+        raise HTTPException(status_code=429, detail="Trop de jobs en attente, réessayez plus tard")
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="File d'écriture saturée, réessayez plus tard")
+    return {"job_id": job.id, "status": job.status}
+
+async def run_command_job(job: Job, plan: CommandPlan) -> dict:
+    """Commande sur le parc en job : résultats partiels et progression à chaque host terminé"""
+    results = dict(plan.unknown)
+
+    def ordered() -> dict:
+        return {"results": [results[hostname] for hostname in plan.hostnames if hostname in results]}
+
+    job.progress(len(results), len(plan.hostnames), ordered())
+    async with aclosing(plan.results()) as completed:
+        async for hostname, result in completed:
+            results[hostname] = result
+            job.progress(len(results), result=ordered())
+    return ordered()
+
+@app.post("/jobs/add-miner", tags=["Jobs"], status_code=202)
+async def submit_add_miner(data: InstallMiner):
+    """Installation d'un agent en arrière-plan ; le mot de passe n'est pas enregistré avec le job"""
+    return submit_job(
+        "add-miner", {"ip_address": data.ip_address, "user": data.user},
+        lambda job: install_miner(data),
+    )
+
+@app.post("/jobs/reboot/{ip_address}", tags=["Jobs"], status_code=202)
+async def submit_reboot(ip_address: str):
+    return submit_job("reboot", {"ip_address": ip_address}, lambda job: reboot_host(ip_address))
+
+@app.post("/jobs/execute-command", tags=["Jobs"], status_code=202)
+async def submit_execute_command(request: dict, db: Session = Depends(get_db)):
+    """Même requête que /execute-command ; échéance par défaut MINEOPS_JOB_COMMAND_DEADLINE"""
+    plan = CommandPlan(request, db, default_deadline=JOB_COMMAND_DEADLINE)
+    params = {
+        "command": request["command"], "hostnames": plan.hostnames,
+        "concurrency": plan.concurrency, "timeout": plan.timeout, "deadline": plan.deadline,
+    }
+    return submit_job("execute-command", params, partial(run_command_job, plan=plan))
+
+@app.get("/jobs", tags=["Jobs"])
+def list_jobs(
+    job_type: Optional[str] = Query(None, alias="type"),
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """Jobs les plus récents d'abord (état en mémoire pour ceux en cours)"""
+    stmt = select(JobDB).order_by(desc(JobDB.created_at)).limit(limit)
+    if job_type:
+        stmt = stmt.where(JobDB.type == job_type)
+    if status:
+        stmt = stmt.where(JobDB.status == status)
+    return {"jobs": [job_manager.get(row.id) or job_as_dict(row) for row in db.scalars(stmt)]}
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = job_manager.get(job_id)
+    if job is not None:
+        return job
+    row = db.get(JobDB, job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} introuvable")
+    return job_as_dict(row)
+
+@app.post("/jobs/{job_id}/cancel", tags=["Jobs"])
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    if job_manager.cancel(job_id):
+        return {"job_id": job_id, "status": "cancelling"}
+    if db.get(JobDB, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} introuvable")
+    raise HTTPException(status_code=409, detail=f"Job {job_id} déjà terminé")
+
+@app.websocket("/agents/ws")
+async def agent_websocket(websocket: WebSocket):
+    """Canal persistant des agents : échantillons et battements montants, commandes descendantes"""
+    await agent_channels.handle(websocket)
+
+@app.get("/agents/connected", tags=["Agents"])
+def get_connected_agents():
+    """Agents joignables par WebSocket (les autres le sont par SSH)"""
+    return {"agents": agent_channels.list()}
+
+@app.post("/agents/{hostname}/sampling", tags=["Agents"])
+async def set_agent_sampling(hostname: str, settings: SamplingIn):
+    """Change la fréquence d'échantillonnage et/ou l'intervalle d'envoi d'un agent connecté"""
+    agent_id = host_registry.get_id(hostname)
+    if not agent_channels.is_connected(agent_id):
+        raise HTTPException(status_code=409, detail=f"Agent {hostname} non connecté par WebSocket")
+    try:
+        result = await agent_channels.send_command(agent_id, "set_sampling", **settings.model_dump(exclude_none=True))
+    except (AgentNotConnected, asyncio.TimeoutError):
+        raise HTTPException(status_code=504, detail=f"Pas de réponse de l'agent {hostname}")
+    return {"hostname": hostname, "applied": result.get("applied", {})}
 
 @app.get("/uptime/{hostname}", tags=["Health"])
 def get_hostname_uptime(hostname: str, db: Session = Depends(get_db)):
-    metrics = db.query(MetricsDB).filter(MetricsDB.hostname == hostname).order_by(MetricsDB.last_seen.desc()).first()
+    metrics = db.get(HostStateDB, hostname)
     if not metrics:
         raise HTTPException(status_code=404, detail=f"Aucune données pour {hostname}")
-    return {"hostname": hostname, "uptime": metrics.uptime}
+    return {"hostname": hostname, "uptime": uptime_at(metrics.last_seen, metrics.boot_time)}
 
 # Configuration des sessions SSH - SUPPRIMÉ (utilise maintenant ssh_manager)
 # SESSION_TIMEOUT = 3600  # 1 heure
@@ -328,7 +995,7 @@ async def create_ssh_session(request: dict, db: Session = Depends(get_db)):
         )
     
     # Vérifier que la machine existe
-    metrics = db.query(MetricsDB).filter(MetricsDB.hostname == hostname).order_by(MetricsDB.last_seen.desc()).first()
+    metrics = db.get(HostStateDB, hostname)
     if not metrics:
         raise HTTPException(
             status_code=404,
@@ -395,14 +1062,11 @@ async def ssh_websocket(websocket: WebSocket, session_id: str):
         # Boucle de réception des commandes
         async for message in websocket.iter_text():
             try:
-                print(f"📨 Message reçu pour session {session_id[:8]}...: {message}")
-                
                 # Essayer de parser comme JSON
                 try:
                     data = json.loads(message)
                     if data["type"] == "input":
                         # Envoyer la commande au shell SSH
-                        print(f"📤 Envoi commande SSH: {repr(data['data'])}")
                         await session.send_command(data["data"])
                         
                     elif data["type"] == "resize":
@@ -411,7 +1075,6 @@ async def ssh_websocket(websocket: WebSocket, session_id: str):
                         
                 except json.JSONDecodeError:
                     # Message texte simple (pour compatibilité)
-                    print(f"📤 Envoi message texte SSH: {repr(message)}")
                     await session.send_command(message)
                     
             except Exception as e:
@@ -474,6 +1137,12 @@ async def list_ssh_sessions():
         "total": len(sessions)
     }
 
+@app.get("/ssh/pool", tags=["SSH"])
+def list_ssh_pool():
+    """Connexions SSH gardées ouvertes pour l'exécution des commandes"""
+    connections = ssh_pool.list()
+    return {"backend": COMMAND_BACKEND, "connections": connections, "total": len(connections)}
+
 # Nettoyer périodiquement les sessions SSH
 async def cleanup_ssh_sessions():
     """Nettoie les sessions SSH expirées"""
@@ -482,15 +1151,33 @@ async def cleanup_ssh_sessions():
             removed = ssh_manager.cleanup_old_sessions()
             if removed > 0:
                 print(f"🧹 {removed} sessions SSH expirées nettoyées")
+            expired = await asyncio.get_running_loop().run_in_executor(ssh_pool.executor, ssh_pool.expire_idle)
+            if expired > 0:
+                print(f"🧹 {expired} connexions SSH inactives fermées")
         except Exception as e:
             print(f"❌ Erreur nettoyage SSH: {e}")
         
-        await asyncio.sleep(600)  # 10 minutes
+        await asyncio.sleep(60)  # Le pool SSH expire ses connexions inactives à la minute près
 
 # Démarrer le nettoyage des sessions SSH
 @app.on_event("startup")
 async def startup_event():
+    db = SessionLocal()
+    try:
+        hot_tier.load(db)
+    finally:
+        db.close()
+    metrics_writer.start()
+    metrics_writer.submit_task(recover_jobs)
+    retention_scheduler.start()
     asyncio.create_task(cleanup_ssh_sessions())
     print("🚀 Gestionnaire SSH interactif démarré")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    retention_scheduler.stop()
+    ssh_pool.close_all()
+    # Écrit les métriques encore en file avant l'arrêt
+    metrics_writer.stop()
+
 
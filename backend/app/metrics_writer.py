@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from app.database import SessionLocal
+from app.ingest import insert_metrics
+from app.config import INGEST_FLUSH_INTERVAL_MS, INGEST_MAX_GROUP_SIZE, INGEST_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MetricsWriter:
+    """Écrivain unique : draine une file en mémoire et commite des groupes de métriques"""
+
+    def __init__(self, flush_interval_ms: int, max_group_size: int, queue_size: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_group_size = max_group_size
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self.thread.start()
+        logger.info("Metrics writer started")
+
+    def stop(self, timeout: float = 10):
+        """Vide la file puis arrête le thread d'écriture"""
+        if self.thread and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+        self.thread = None
+
+    def submit(self, rows: List[dict]) -> Future:
+        """Met un lot en file ; le Future est résolu après le commit du groupe. Lève queue.Full si saturée"""
+        if not self.thread or not self.thread.is_alive():
+            self.start()
+        future = Future()
+        if rows:
+            self.queue.put_nowait((rows, future))
+        else:
+            future.set_result(0)
+        return future
+
+    def submit_task(self, task: Callable) -> Future:
+        """Exécute task(db) sur le thread d'écriture, entre deux groupes de métriques (maintenance).
+
+        Lève queue.Full si la file est saturée : ne bloque jamais l'appelant (souvent la boucle asyncio).
+        """
+        if not self.thread or not self.thread.is_alive():
+            self.start()
+        future = Future()
+        self.queue.put_nowait((task, future))
+        return future
+
+    async def run_task(self, task: Callable, retry_interval: float = 0.05):
+        """submit_task depuis la boucle asyncio : attend une place dans la file sans bloquer la boucle, puis le résultat"""
+        while True:
+            try:
+                future = self.submit_task(task)
+                break
+            except queue.Full:
+                await asyncio.sleep(retry_interval)
+        return await asyncio.wrap_future(future)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            if callable(item[0]):
+                self._run_task(item)
+                continue
+            group = [item]
+            size = len(item[0])
+            task = None
+            deadline = time.monotonic() + self.flush_interval
+            # Regroupe les lots arrivés pendant l'intervalle de flush
+            while size < self.max_group_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if callable(item[0]):
+                    task = item
+                    break
+                group.append(item)
+                size += len(item[0])
+            self._flush(group)
+            if task:
+                self._run_task(task)
+        # Arrêt : écrit ce qui reste en file
+        remaining = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                continue
+            if callable(item[0]):
+                item[1].cancel()
+            else:
+                remaining.append(item)
+        if remaining:
+            self._flush(remaining)
+        logger.info("Metrics writer stopped")
+
+    def _flush(self, group):
+        rows = [row for batch, _ in group for row in batch]
+        db = SessionLocal()
+        try:
+            insert_metrics(db, rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write {len(rows)} metrics: {e}")
+            for _, future in group:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+        for batch, future in group:
+            future.set_result(len(batch))
+
+    def _run_task(self, item):
+        task, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+        db = SessionLocal()
+        try:
+            future.set_result(task(db))
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Writer task failed: {e}")
+            future.set_exception(e)
+        finally:
+            db.close()
+
+# Instance globale
+metrics_writer = MetricsWriter(INGEST_FLUSH_INTERVAL_MS, INGEST_MAX_GROUP_SIZE, INGEST_QUEUE_SIZE)
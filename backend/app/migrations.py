@@ -0,0 +1,287 @@
+import logging
+from datetime import date, timedelta
+from sqlalchemy.engine import Connection, Engine
+from app.rollups import ROLLUP_RESOLUTIONS
+from app.segments import SEGMENT_PREFIX
+from app.hosts import parse_uptime
+
+logger = logging.getLogger(__name__)
+
+# Les migrations décrivent explicitement le schéma de leur version : elles ne dépendent pas
+# des modèles actuels, qui peuvent avoir évolué depuis.
+SEGMENT_GLOB = f"{SEGMENT_PREFIX}[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]"
+
+# Dernière date de démarrage connue depuis l'uptime texte d'une métrique (version <= 4)
+LEGACY_BOOT_TIME = "CAST(strftime('%s', {last_seen}) AS INTEGER) - parse_uptime({uptime})"
+
+# last_seen texte ('AAAA-MM-JJ HH:MM:SS.ffffff') -> microsecondes depuis l'epoch (EpochMicros)
+LEGACY_EPOCH_MICROS = (
+    "CAST(strftime('%s', {0}) AS INTEGER) * 1000000 + CAST(substr({0}, 21, 6) AS INTEGER)"
+)
+
+def segment_names(conn: Connection):
+    return conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name",
+        (SEGMENT_GLOB,),
+    ).scalars().all()
+
+def rollup_backfill(resolution: int) -> str:
+    """Reconstruit les agrégats d'une résolution depuis la table metrics"""
+    return f"""
+        INSERT OR REPLACE INTO metrics_rollup
+            (resolution, hostname, bucket, samples,
+             cpu_sum, cpu_min, cpu_max,
+             memory_sum, memory_min, memory_max,
+             disk_sum, disk_min, disk_max)
+        SELECT {resolution}, hostname,
+               (CAST(strftime('%s', last_seen) AS INTEGER) / {resolution}) * {resolution} AS bucket,
+               count(*),
+               sum(cpu_utilization), min(cpu_utilization), max(cpu_utilization),
+               sum(memory_utilization), min(memory_utilization), max(memory_utilization),
+               sum(disk_usage), min(disk_usage), max(disk_usage)
+        FROM metrics
+        GROUP BY hostname, bucket
+        """
+
+def partition_legacy_metrics(conn: Connection):
+    """Répartit les lignes de l'ancienne table metrics dans les segments journaliers"""
+    days = conn.exec_driver_sql("SELECT DISTINCT date(last_seen) FROM metrics").scalars().all()
+    for value in days:
+        day = date.fromisoformat(value)
+        name = f"{SEGMENT_PREFIX}{day:%Y%m%d}"
+        # Schéma des segments en version 4 ; les index sont créés par la migration 5
+        conn.exec_driver_sql(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER NOT NULL PRIMARY KEY,
+                hostname VARCHAR NOT NULL,
+                ip_address VARCHAR NOT NULL,
+                cpu_utilization FLOAT NOT NULL,
+                memory_utilization FLOAT NOT NULL,
+                disk_usage FLOAT NOT NULL,
+                last_seen DATETIME NOT NULL,
+                uptime VARCHAR NOT NULL
+            )
+            """)
+        conn.exec_driver_sql(
+            f"INSERT INTO {name} SELECT id, hostname, ip_address, cpu_utilization, memory_utilization, "
+            f"disk_usage, last_seen, uptime FROM metrics WHERE last_seen >= ? AND last_seen < ?",
+            (day.isoformat(), (day + timedelta(days=1)).isoformat()),
+        )
+    conn.exec_driver_sql("DELETE FROM metrics")
+
+def normalize_schema(conn: Connection):
+    """Table de dimension hosts : les échantillons ne gardent que host_id et des valeurs numériques"""
+    conn.connection.dbapi_connection.create_function("parse_uptime", 1, parse_uptime, deterministic=True)
+    conn.exec_driver_sql("""
+        CREATE TABLE hosts (
+            id INTEGER NOT NULL PRIMARY KEY,
+            hostname VARCHAR NOT NULL UNIQUE,
+            ip_address VARCHAR NOT NULL
+        )
+        """)
+    # Hosts connus : host_state d'abord, puis ceux qui n'ont plus que des métriques anciennes
+    conn.exec_driver_sql(
+        "INSERT INTO hosts (hostname, ip_address) SELECT hostname, ip_address FROM host_state ORDER BY hostname"
+    )
+    names = segment_names(conn)
+    for name in reversed(names):
+        conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO hosts (hostname, ip_address) "
+            f"SELECT hostname, max(ip_address) FROM {name} GROUP BY hostname ORDER BY hostname"
+        )
+
+    for name in names:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS ix_{name}_hostname_last_seen")
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS ix_{name}_last_seen")
+        conn.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_old")
+        conn.exec_driver_sql(f"""
+            CREATE TABLE {name} (
+                id INTEGER NOT NULL PRIMARY KEY,
+                host_id INTEGER NOT NULL,
+                cpu_utilization FLOAT NOT NULL,
+                memory_utilization FLOAT NOT NULL,
+                disk_usage FLOAT NOT NULL,
+                last_seen BIGINT NOT NULL,
+                boot_time INTEGER
+            )
+            """)
+        conn.exec_driver_sql(f"""
+            INSERT INTO {name} (id, host_id, cpu_utilization, memory_utilization, disk_usage, last_seen, boot_time)
+            SELECT s.id, h.id, s.cpu_utilization, s.memory_utilization, s.disk_usage,
+                   {LEGACY_EPOCH_MICROS.format("s.last_seen")},
+                   {LEGACY_BOOT_TIME.format(last_seen="s.last_seen", uptime="s.uptime")}
+            FROM {name}_old s JOIN hosts h ON h.hostname = s.hostname
+            """)
+        conn.exec_driver_sql(f"DROP TABLE {name}_old")
+        conn.exec_driver_sql(f"CREATE INDEX ix_{name}_host_id_last_seen ON {name} (host_id, last_seen)")
+        conn.exec_driver_sql(f"CREATE INDEX ix_{name}_last_seen ON {name} (last_seen)")
+
+    conn.exec_driver_sql("ALTER TABLE metrics_rollup RENAME TO metrics_rollup_old")
+    conn.exec_driver_sql("""
+        CREATE TABLE metrics_rollup (
+            resolution INTEGER NOT NULL,
+            host_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            cpu_sum FLOAT NOT NULL,
+            cpu_min FLOAT NOT NULL,
+            cpu_max FLOAT NOT NULL,
+            memory_sum FLOAT NOT NULL,
+            memory_min FLOAT NOT NULL,
+            memory_max FLOAT NOT NULL,
+            disk_sum FLOAT NOT NULL,
+            disk_min FLOAT NOT NULL,
+            disk_max FLOAT NOT NULL,
+            PRIMARY KEY (resolution, host_id, bucket)
+        ) WITHOUT ROWID
+        """)
+    conn.exec_driver_sql("""
+        INSERT INTO metrics_rollup
+        SELECT r.resolution, h.id, r.bucket, r.samples,
+               r.cpu_sum, r.cpu_min, r.cpu_max,
+               r.memory_sum, r.memory_min, r.memory_max,
+               r.disk_sum, r.disk_min, r.disk_max
+        FROM metrics_rollup_old r JOIN hosts h ON h.hostname = r.hostname
+        """)
+    conn.exec_driver_sql("DROP TABLE metrics_rollup_old")
+
+    conn.exec_driver_sql("ALTER TABLE host_state RENAME TO host_state_old")
+    conn.exec_driver_sql("""
+        CREATE TABLE host_state (
+            hostname VARCHAR NOT NULL PRIMARY KEY,
+            host_id INTEGER NOT NULL,
+            metrics_id INTEGER NOT NULL,
+            ip_address VARCHAR NOT NULL,
+            cpu_utilization FLOAT NOT NULL,
+            memory_utilization FLOAT NOT NULL,
+            disk_usage FLOAT NOT NULL,
+            last_seen DATETIME NOT NULL,
+            boot_time INTEGER
+        )
+        """)
+    conn.exec_driver_sql(f"""
+        INSERT INTO host_state
+        SELECT s.hostname, h.id, s.metrics_id, s.ip_address,
+               s.cpu_utilization, s.memory_utilization, s.disk_usage, s.last_seen,
+               {LEGACY_BOOT_TIME.format(last_seen="s.last_seen", uptime="s.uptime")}
+        FROM host_state_old s JOIN hosts h ON h.hostname = s.hostname
+        """)
+    conn.exec_driver_sql("DROP TABLE host_state_old")
+
+    # L'ancienne table metrics (vide depuis la version 4) n'a plus de rôle
+    conn.exec_driver_sql("DROP TABLE metrics")
+
+def add_window_aggregates(conn: Connection):
+    """Colonnes min/max/p95 de la fenêtre d'échantillonnage de l'agent (NULL pour l'historique)"""
+    fields = ("cpu_min", "cpu_max", "cpu_p95", "memory_min", "memory_max", "memory_p95")
+    for name in segment_names(conn) + ["host_state"]:
+        for field in fields:
+            conn.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN {field} FLOAT")
+
+# Schémas des tables dérivées en version 1 et 2 (les bases d'avant la version 1 n'ont que metrics)
+LEGACY_HOST_STATE = """
+    CREATE TABLE IF NOT EXISTS host_state (
+        hostname VARCHAR NOT NULL PRIMARY KEY,
+        metrics_id INTEGER NOT NULL,
+        ip_address VARCHAR NOT NULL,
+        cpu_utilization FLOAT NOT NULL,
+        memory_utilization FLOAT NOT NULL,
+        disk_usage FLOAT NOT NULL,
+        last_seen DATETIME NOT NULL,
+        uptime VARCHAR NOT NULL
+    )
+    """
+
+LEGACY_METRICS_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS metrics_rollup (
+        resolution INTEGER NOT NULL,
+        hostname VARCHAR NOT NULL,
+        bucket INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        cpu_sum FLOAT NOT NULL,
+        cpu_min FLOAT NOT NULL,
+        cpu_max FLOAT NOT NULL,
+        memory_sum FLOAT NOT NULL,
+        memory_min FLOAT NOT NULL,
+        memory_max FLOAT NOT NULL,
+        disk_sum FLOAT NOT NULL,
+        disk_min FLOAT NOT NULL,
+        disk_max FLOAT NOT NULL,
+        PRIMARY KEY (resolution, hostname, bucket)
+    ) WITHOUT ROWID
+    """
+
+# Migrations des bases metrics.db existantes, versionnées via PRAGMA user_version.
+# Chaque entrée : (version cible, liste d'instructions SQL ou de fonctions recevant la
+# connexion). Une nouvelle base est créée directement au dernier schéma (Base.metadata).
+MIGRATIONS = [
+    (1, [
+        # Index composite (hostname, last_seen) : remplace l'index simple sur hostname
+        "CREATE INDEX IF NOT EXISTS ix_metrics_hostname_last_seen ON metrics (hostname, last_seen)",
+        "DROP INDEX IF EXISTS ix_metrics_hostname",
+        # Initialise host_state avec la dernière ligne de chaque host
+        LEGACY_HOST_STATE,
+        """
+        INSERT OR REPLACE INTO host_state
+            (hostname, metrics_id, ip_address, cpu_utilization, memory_utilization, disk_usage, last_seen, uptime)
+        SELECT m.hostname, m.id, m.ip_address, m.cpu_utilization, m.memory_utilization, m.disk_usage, m.last_seen, m.uptime
+        FROM metrics m
+        WHERE m.id = (
+            SELECT id FROM metrics
+            WHERE hostname = m.hostname
+            ORDER BY last_seen DESC, id DESC
+            LIMIT 1
+        )
+        """,
+    ]),
+    (2, [LEGACY_METRICS_ROLLUP] + [rollup_backfill(resolution) for resolution in ROLLUP_RESOLUTIONS]),
+    (3, ["CREATE INDEX IF NOT EXISTS ix_metrics_last_seen ON metrics (last_seen)"]),
+    # Stockage partitionné par jour : la table metrics ne sert plus que de modèle de colonnes
+    (4, [partition_legacy_metrics]),
+    # Schéma normalisé : table hosts, host_id, last_seen en entier et boot_time au lieu de l'uptime texte
+    (5, [normalize_schema]),
+    (6, [add_window_aggregates]),
+    # Enregistrement des agents : faits statiques portés par hosts, plus par chaque échantillon
+    (7, [
+        "ALTER TABLE hosts ADD COLUMN boot_time INTEGER",
+        "ALTER TABLE hosts ADD COLUMN cpu_count INTEGER",
+        "ALTER TABLE hosts ADD COLUMN os VARCHAR",
+    ]),
+    # Secret des agents pour le canal WebSocket (les agents existants se réenregistrent)
+    (8, ["ALTER TABLE hosts ADD COLUMN agent_secret_hash VARCHAR"]),
+]
+
+def run_migrations(engine: Engine):
+    """Applique les migrations dont la version est supérieure à PRAGMA user_version.
+
+    À appeler avant Base.metadata.create_all : une base vide est marquée directement à
+    la dernière version et ses tables sont créées au schéma courant.
+    """
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if version == 0 and not conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics'"
+        ).first():
+            conn.exec_driver_sql(f"PRAGMA user_version = {MIGRATIONS[-1][0]}")
+            return
+        for target, statements in MIGRATIONS:
+            if version >= target:
+                continue
+            logger.info(f"Migration de la base vers la version {target}")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+            version = target
+
+def enable_incremental_vacuum(engine: Engine):
+    """Passe une base existante en auto_vacuum=INCREMENTAL (un VACUUM complet, une seule fois)"""
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            return
+    logger.info("Conversion de la base en auto_vacuum=INCREMENTAL (VACUUM)")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
@@ -0,0 +1,197 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models import MinerDB, MiningRollupDB
+from app.rollups import ROLLUP_RESOLUTIONS, to_epoch
+from app.segments import mining_segment_registry, segment_day
+
+# Colonnes d'un échantillon de mineur (segments mining_AAAAMMJJ)
+MINING_COLUMNS = ("miner_id", "last_seen", "hashrate", "accepted_shares", "rejected_shares", "temp")
+
+class MinerRegistry:
+    """Correspondance (host_id, nom du mineur) <-> miner_id (table miners), en cache mémoire"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_key: Dict[Tuple[int, str], int] = {}
+        self.by_id: Dict[int, Tuple[int, str]] = {}
+
+    def _set(self, id_: int, host_id: int, name: str):
+        self.by_key[(host_id, name)] = id_
+        self.by_id[id_] = (host_id, name)
+
+    def load(self, engine: Engine):
+        with engine.connect() as conn:
+            rows = conn.execute(select(MinerDB.id, MinerDB.host_id, MinerDB.name)).all()
+        with self.lock:
+            self.by_key = {}
+            self.by_id = {}
+            for id_, host_id, name in rows:
+                self._set(id_, host_id, name)
+
+    def get_miner(self, id_: int) -> Optional[Tuple[int, str]]:
+        with self.lock:
+            return self.by_id.get(id_)
+
+    def miners_of(self, host_id: int) -> Dict[int, str]:
+        """{miner_id: nom} des mineurs connus d'un host"""
+        with self.lock:
+            return {id_: name for (owner, name), id_ in self.by_key.items() if owner == host_id}
+
+    def resolve(self, db: Session, rows: List[dict]) -> bool:
+        """Renseigne row["miner_id"] ; retourne True si la table miners a été modifiée (à commiter)"""
+        with self.lock:
+            missing = {(row["host_id"], row["name"]) for row in rows if (row["host_id"], row["name"]) not in self.by_key}
+        if missing:
+            stmt = sqlite_insert(MinerDB).values([{"host_id": host_id, "name": name} for host_id, name in missing])
+            # DO UPDATE (sans effet) plutôt que DO NOTHING pour que RETURNING renvoie aussi les lignes existantes
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[MinerDB.host_id, MinerDB.name],
+                set_={"name": stmt.excluded.name},
+            ).returning(MinerDB.id, MinerDB.host_id, MinerDB.name)
+            result = db.execute(stmt).all()
+            with self.lock:
+                for id_, host_id, name in result:
+                    self._set(id_, host_id, name)
+        with self.lock:
+            for row in rows:
+                row["miner_id"] = self.by_key[(row["host_id"], row["name"])]
+        return bool(missing)
+
+def mining_samples(reports: List[Tuple[dict, List[dict]]]) -> List[dict]:
+    """Échantillons de mineurs d'un lot : (métrique normalisée, mineurs envoyés avec elle)"""
+    samples = []
+    for row, miners in reports:
+        for miner in miners:
+            samples.append({
+                "host_id": row["host_id"],
+                "name": miner["name"],
+                "last_seen": row["last_seen"],
+                "hashrate": miner.get("hashrate"),
+                "accepted_shares": miner.get("accepted_shares"),
+                "rejected_shares": miner.get("rejected_shares"),
+                "temp": miner.get("temp"),
+            })
+    return samples
+
+def aggregate_mining_samples(samples: List[dict]) -> List[dict]:
+    """Agrège les échantillons par (résolution, miner_id, bucket) ; ceux sans hashrate sont ignorés"""
+    buckets = {}
+    for sample in sorted(samples, key=lambda sample: sample["last_seen"]):
+        hashrate = sample["hashrate"]
+        if hashrate is None:
+            continue
+        epoch = to_epoch(sample["last_seen"])
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (resolution, sample["miner_id"], epoch - epoch % resolution)
+            agg = buckets.get(key)
+            if agg is None:
+                agg = buckets[key] = {
+                    "resolution": key[0], "miner_id": key[1], "bucket": key[2], "samples": 0,
+                    "hashrate_sum": 0.0, "hashrate_min": hashrate, "hashrate_max": hashrate,
+                    "accepted_shares": None, "rejected_shares": None, "temp_max": None,
+                }
+            agg["samples"] += 1
+            agg["hashrate_sum"] += hashrate
+            agg["hashrate_min"] = min(agg["hashrate_min"], hashrate)
+            agg["hashrate_max"] = max(agg["hashrate_max"], hashrate)
+            # Compteurs cumulés : la dernière valeur connue du bucket
+            for field in ("accepted_shares", "rejected_shares"):
+                if sample[field] is not None:
+                    agg[field] = sample[field]
+            if sample["temp"] is not None:
+                agg["temp_max"] = sample["temp"] if agg["temp_max"] is None else max(agg["temp_max"], sample["temp"])
+    return list(buckets.values())
+
+def upsert_mining_rollups(db: Session, samples: List[dict]):
+    aggregates = aggregate_mining_samples(samples)
+    if not aggregates:
+        return
+    stmt = sqlite_insert(MiningRollupDB)
+    table = MiningRollupDB.__table__.c
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MiningRollupDB.resolution, MiningRollupDB.miner_id, MiningRollupDB.bucket],
+        set_={
+            "samples": table.samples + excluded.samples,
+            "hashrate_sum": table.hashrate_sum + excluded.hashrate_sum,
+            "hashrate_min": func.min(table.hashrate_min, excluded.hashrate_min),
+            "hashrate_max": func.max(table.hashrate_max, excluded.hashrate_max),
+            "accepted_shares": func.coalesce(excluded.accepted_shares, table.accepted_shares),
+            "rejected_shares": func.coalesce(excluded.rejected_shares, table.rejected_shares),
+            # max() scalaire de SQLite renvoie NULL dès qu'un argument est NULL
+            "temp_max": func.max(
+                func.coalesce(table.temp_max, excluded.temp_max),
+                func.coalesce(excluded.temp_max, table.temp_max),
+            ),
+        },
+    )
+    db.execute(stmt, aggregates)
+
+def upsert_miner_state(db: Session, samples: List[dict]):
+    """Dernier échantillon de chaque mineur (jamais remplacé par un échantillon plus ancien)"""
+    latest = {}
+    for sample in samples:
+        current = latest.get(sample["miner_id"])
+        if current is None or sample["last_seen"] >= current["last_seen"]:
+            latest[sample["miner_id"]] = sample
+    if not latest:
+        return
+    stmt = sqlite_insert(MinerDB)
+    fields = ("last_seen", "hashrate", "accepted_shares", "rejected_shares", "temp")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MinerDB.id],
+        set_={field: stmt.excluded[field] for field in fields},
+        where=(MinerDB.last_seen.is_(None)) | (MinerDB.last_seen <= stmt.excluded.last_seen),
+    )
+    db.execute(stmt, [
+        {"id": sample["miner_id"], "host_id": sample["host_id"], "name": sample["name"],
+         **{field: sample[field] for field in fields}}
+        for sample in latest.values()
+    ])
+
+def insert_mining_samples(db: Session, samples: List[dict]):
+    """Écrit les échantillons (segments déjà créés), l'état des mineurs et les agrégats, sans commit"""
+    by_day = {}
+    for sample in samples:
+        by_day.setdefault(segment_day(sample["last_seen"]), []).append(sample)
+    for day, day_samples in by_day.items():
+        db.execute(
+            insert(mining_segment_registry.table(day)),
+            [{column: sample[column] for column in MINING_COLUMNS} for sample in day_samples],
+        )
+    upsert_miner_state(db, samples)
+    upsert_mining_rollups(db, samples)
+
+def fill_unchanged(
+    rows: List[Tuple[int, int, float]], resolution: int, max_gap: int, end_bucket: int, until: Dict[int, int],
+) -> List[dict]:
+    """Hashrate total par bucket jusqu'à end_bucket, depuis (bucket, miner_id, hashrate moyen) triés par bucket.
+
+    Un mineur sans agrégat dans un bucket (agent en mode adaptatif, valeurs inchangées)
+    garde sa dernière valeur tant que son dernier échantillon date de moins de max_gap,
+    et jamais au-delà de until[miner_id] (mineur arrêté ou host offline, epoch).
+    """
+    if not rows:
+        return []
+    by_bucket = {}
+    for bucket, miner_id, hashrate in rows:
+        by_bucket.setdefault(bucket, []).append((miner_id, hashrate))
+    latest = {}
+    history = []
+    horizon = max(max_gap, resolution)
+    for bucket in range(rows[0][0], max(rows[-1][0], end_bucket) + resolution, resolution):
+        for miner_id, hashrate in by_bucket.get(bucket, ()):
+            latest[miner_id] = (bucket, hashrate)
+        live = [
+            hashrate for miner_id, (seen, hashrate) in latest.items()
+            if bucket - seen < horizon and (seen == bucket or bucket <= until.get(miner_id, bucket))
+        ]
+        history.append({"bucket": bucket, "hashrate": sum(live), "miners": len(live)})
+    return history
+
+# Instance globale
+miner_registry = MinerRegistry()
@@ -1,29 +1,158 @@
+from sqlalchemy import BigInteger, Integer, TypeDecorator, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+EPOCH = datetime(1970, 1, 1)
+
+class EpochMicros(TypeDecorator):
+    """Datetime UTC naïf stocké en entier (microsecondes depuis l'epoch) : 8 octets au lieu
+    d'une chaîne de 26 caractères, et un aller-retour exact (utilisé par les curseurs)"""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        delta = value - EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return EPOCH + timedelta(microseconds=value)
 
 class Base(DeclarativeBase):
     pass
 
-class MetricsDB(Base):
-    __tablename__ = "metrics"
+class HostDB(Base):
+    """Dimension host : les échantillons ne stockent que host_id"""
+    __tablename__ = "hosts"
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    hostname: Mapped[str] = mapped_column(index=True)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    hostname: Mapped[str] = mapped_column(unique=True)
+    ip_address: Mapped[str]  # Dernière adresse connue
+    # Faits statiques envoyés à l'enregistrement de l'agent (POST /agents/register)
+    boot_time: Mapped[Optional[int]]
+    cpu_count: Mapped[Optional[int]]
+    os: Mapped[Optional[str]]
+    # SHA-256 du secret remis à l'agent par /agents/register (canal WebSocket)
+    agent_secret_hash: Mapped[Optional[str]]
+
+class HostStateDB(Base):
+    """Dernier état connu de chaque host, maintenu par upsert à l'ingestion"""
+    __tablename__ = "host_state"
+
+    hostname: Mapped[str] = mapped_column(primary_key=True)
+    host_id: Mapped[int]
+    metrics_id: Mapped[int]
     ip_address: Mapped[str]
     cpu_utilization: Mapped[float]
     memory_utilization: Mapped[float]
     disk_usage: Mapped[float]
-    last_seen: Mapped[datetime] = mapped_column(default=datetime)
-    uptime: Mapped[str]
+    last_seen: Mapped[datetime]
+    boot_time: Mapped[Optional[int]]  # Epoch UTC du démarrage, l'uptime est calculé à l'affichage
+    cpu_min: Mapped[Optional[float]]
+    cpu_max: Mapped[Optional[float]]
+    cpu_p95: Mapped[Optional[float]]
+    memory_min: Mapped[Optional[float]]
+    memory_max: Mapped[Optional[float]]
+    memory_p95: Mapped[Optional[float]]
+
+class MetricsRollupDB(Base):
+    """Agrégats cpu/mémoire/disque par host et par intervalle de temps (1 min, 5 min, 1 h)"""
+    __tablename__ = "metrics_rollup"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    resolution: Mapped[int] = mapped_column(primary_key=True)  # Taille du bucket en secondes
+    host_id: Mapped[int] = mapped_column(primary_key=True)
+    bucket: Mapped[int] = mapped_column(primary_key=True)  # Début du bucket (epoch UTC)
+    samples: Mapped[int]
+    cpu_sum: Mapped[float]
+    cpu_min: Mapped[float]
+    cpu_max: Mapped[float]
+    memory_sum: Mapped[float]
+    memory_min: Mapped[float]
+    memory_max: Mapped[float]
+    disk_sum: Mapped[float]
+    disk_min: Mapped[float]
+    disk_max: Mapped[float]
 
-    def as_dict(self):
+    def as_dict(self, hostname: str):
         return {
-            "id": self.id,
-            "hostname": self.hostname,
-            "ip_address": self.ip_address,
-            "cpu_utilization": self.cpu_utilization,
-            "memory_utilization": self.memory_utilization,
-            "disk_usage": self.disk_usage,
-            "last_seen": self.last_seen,
-            "uptime": self.uptime,
-        }
\ No newline at end of file
+            "hostname": hostname,
+            "last_seen": datetime.fromtimestamp(self.bucket, timezone.utc).replace(tzinfo=None),
+            "resolution": self.resolution,
+            "samples": self.samples,
+            "cpu_utilization": self.cpu_sum / self.samples,
+            "cpu_min": self.cpu_min,
+            "cpu_max": self.cpu_max,
+            "memory_utilization": self.memory_sum / self.samples,
+            "memory_min": self.memory_min,
+            "memory_max": self.memory_max,
+            "disk_usage": self.disk_sum / self.samples,
+            "disk_min": self.disk_min,
+            "disk_max": self.disk_max,
+        }
+
+class MinerDB(Base):
+    """Dimension mineur (processus de mining d'un host, identifié par son nom) et dernier état connu"""
+    __tablename__ = "miners"
+    __table_args__ = (UniqueConstraint("host_id", "name"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    host_id: Mapped[int]
+    name: Mapped[str]
+    last_seen: Mapped[Optional[datetime]]
+    hashrate: Mapped[Optional[float]]  # H/s
+    accepted_shares: Mapped[Optional[int]]
+    rejected_shares: Mapped[Optional[int]]
+    temp: Mapped[Optional[float]]
+
+class MiningRollupDB(Base):
+    """Agrégats hashrate/shares par mineur et par intervalle de temps (mêmes résolutions que les métriques)"""
+    __tablename__ = "mining_rollup"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    resolution: Mapped[int] = mapped_column(primary_key=True)
+    miner_id: Mapped[int] = mapped_column(primary_key=True)
+    bucket: Mapped[int] = mapped_column(primary_key=True)
+    samples: Mapped[int]  # Échantillons avec un hashrate
+    hashrate_sum: Mapped[float]
+    hashrate_min: Mapped[float]
+    hashrate_max: Mapped[float]
+    accepted_shares: Mapped[Optional[int]]  # Compteurs : dernière valeur du bucket
+    rejected_shares: Mapped[Optional[int]]
+    temp_max: Mapped[Optional[float]]
+
+    def as_dict(self, name: str):
+        return {
+            "miner": name,
+            "last_seen": datetime.fromtimestamp(self.bucket, timezone.utc).replace(tzinfo=None),
+            "resolution": self.resolution,
+            "samples": self.samples,
+            "hashrate": self.hashrate_sum / self.samples,
+            "hashrate_min": self.hashrate_min,
+            "hashrate_max": self.hashrate_max,
+            "accepted_shares": self.accepted_shares,
+            "rejected_shares": self.rejected_shares,
+            "temp": self.temp_max,
+        }
+
+class JobDB(Base):
+    """Opération longue (installation, reboot, commande sur le parc) exécutée en arrière-plan (app/jobs.py)"""
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(primary_key=True)
+    type: Mapped[str]
+    status: Mapped[str]  # queued, running, succeeded, failed, cancelled, interrupted
+    params: Mapped[str]  # JSON, sans secret (mot de passe)
+    progress_done: Mapped[int] = mapped_column(default=0)
+    progress_total: Mapped[Optional[int]]  # None : progression inconnue
+    result: Mapped[Optional[str]]  # JSON
+    error: Mapped[Optional[str]]
+    created_at: Mapped[datetime] = mapped_column(EpochMicros, index=True)
+    started_at: Mapped[Optional[datetime]] = mapped_column(EpochMicros)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(EpochMicros)
@@ -0,0 +1,161 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+from sqlalchemy import Table, select, and_, or_, func
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from app.database import SessionLocal
+from app.models import HostDB
+from app.hosts import host_registry, uptime_at
+from app.mining import MINING_COLUMNS
+from app.segments import SegmentRegistry, segment_registry, mining_segment_registry, segment_bounds, to_naive_utc, WINDOW_FIELDS
+
+# Nombre de lignes lues par aller-retour lors du streaming
+STREAM_CHUNK_SIZE = 1000
+
+def encode_cursor(last_seen: datetime, id_: int) -> str:
+    """Curseur opaque de pagination sur (last_seen, id)"""
+    raw = f"{last_seen.isoformat()}|{id_}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Lève ValueError si le curseur est invalide"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        last_seen, id_ = raw.rsplit("|", 1)
+        return datetime.fromisoformat(last_seen), int(id_)
+    except Exception:
+        raise ValueError("Curseur invalide")
+
+def segment_range_queries(
+    registry: SegmentRegistry,
+    columns: Callable[[Table], Select],
+    where: Optional[Callable[[Table], Any]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+) -> List[Select]:
+    """Une requête par segment recouvrant la période, dans l'ordre de (last_seen, id).
+
+    Un segment correspond à un jour : deux lignes de même last_seen sont donc toujours
+    dans le même segment et (last_seen, id) reste un ordre total sur l'ensemble.
+    `columns` construit le SELECT d'un segment, `where` son filtre éventuel.
+    """
+    since = to_naive_utc(since) if since is not None else None
+    until = to_naive_utc(until) if until is not None else None
+    cursor_key = decode_cursor(cursor) if cursor is not None else None
+    start = since
+    if cursor_key is not None and (start is None or cursor_key[0] > start):
+        start = cursor_key[0]
+
+    queries = []
+    for day in registry.between(start, until):
+        table = registry.table(day)
+        stmt = columns(table)
+        if where is not None:
+            stmt = stmt.where(where(table))
+        # Les bornes déjà garanties par le segment sont inutiles
+        day_start, day_end = segment_bounds(day)
+        if since is not None and since > day_start:
+            stmt = stmt.where(table.c.last_seen >= since)
+        if until is not None and until < day_end:
+            stmt = stmt.where(table.c.last_seen < until)
+        if cursor_key is not None:
+            last_seen, id_ = cursor_key
+            stmt = stmt.where(or_(
+                table.c.last_seen > last_seen,
+                and_(table.c.last_seen == last_seen, table.c.id > id_),
+            ))
+        if descending:
+            stmt = stmt.order_by(table.c.last_seen.desc(), table.c.id.desc())
+        else:
+            stmt = stmt.order_by(table.c.last_seen, table.c.id)
+        queries.append(stmt)
+    if descending:
+        queries.reverse()
+    return queries
+
+def metrics_range_queries(
+    hostname: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+) -> List[Select]:
+    """Métriques brutes d'un host (ou de tous) ; le hostname et l'adresse IP viennent de la table hosts"""
+    host_id = None
+    if hostname is not None:
+        host_id = host_registry.get_id(hostname)
+        if host_id is None:
+            return []
+
+    def columns(table):
+        return select(
+            table.c.id, HostDB.hostname, HostDB.ip_address,
+            table.c.cpu_utilization, table.c.memory_utilization, table.c.disk_usage,
+            table.c.last_seen, table.c.boot_time,
+            *(table.c[field] for field in WINDOW_FIELDS),
+        ).join(HostDB, HostDB.id == table.c.host_id)
+
+    where = (lambda table: table.c.host_id == host_id) if host_id is not None else None
+    return segment_range_queries(segment_registry, columns, where, since, until, cursor, descending)
+
+def mining_range_queries(
+    miner_ids: List[int],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+) -> List[Select]:
+    """Échantillons bruts (hashrate, shares, température) d'un ensemble de mineurs"""
+    if not miner_ids:
+        return []
+    return segment_range_queries(
+        mining_segment_registry,
+        lambda table: select(*(table.c[column] for column in ("id",) + MINING_COLUMNS)),
+        lambda table: table.c.miner_id.in_(miner_ids),
+        since, until, cursor, descending,
+    )
+
+def fetch_rows(db: Session, queries: List[Select], limit: int) -> list:
+    """Lit au plus `limit` lignes en parcourant les segments dans l'ordre"""
+    rows = []
+    for stmt in queries:
+        remaining = limit - len(rows)
+        if remaining <= 0:
+            break
+        rows.extend(db.execute(stmt.limit(remaining)).mappings().all())
+    return rows
+
+def oldest_last_seen(db: Session) -> Optional[datetime]:
+    """Plus ancienne métrique brute (lue dans le premier segment non vide)"""
+    for day in segment_registry.between():
+        table = segment_registry.table(day)
+        oldest = db.execute(select(func.min(table.c.last_seen))).scalar()
+        if oldest is not None:
+            return oldest
+    return None
+
+def render_row(row) -> dict:
+    """Ligne de segment telle que servie par l'API (uptime calculé depuis boot_time)"""
+    data = dict(row)
+    data["uptime"] = uptime_at(data["last_seen"], data["boot_time"])
+    return data
+
+def serialize_row(row) -> dict:
+    data = render_row(row)
+    data["last_seen"] = data["last_seen"].isoformat()
+    return data
+
+def stream_ndjson(queries: List[Select]) -> Iterator[bytes]:
+    """Génère une ligne JSON par métrique depuis un curseur côté serveur (mémoire constante)"""
+    db = SessionLocal()
+    try:
+        for stmt in queries:
+            result = db.execute(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE)).mappings()
+            for row in result:
+                yield (json.dumps(serialize_row(row)) + "\n").encode()
+    finally:
+        db.close()
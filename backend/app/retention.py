@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, func, select, text, tuple_
+from sqlalchemy.orm import Session
+from app.models import MetricsRollupDB, MiningRollupDB
+from app.segments import SegmentRegistry, segment_registry, mining_segment_registry, segment_bounds
+from app.metrics_writer import metrics_writer
+from app.hot_tier import hot_tier
+from app.rollups import to_epoch
+from app.config import (
+    RETENTION_RAW_DAYS, RETENTION_ROLLUP_DAYS, RETENTION_INTERVAL,
+    RETENTION_CHUNK_SIZE, RETENTION_CHUNK_PAUSE_MS, RETENTION_VACUUM_PAGES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Données brutes (segments) et agrégats soumis à la rétention : métriques des hosts et mineurs
+RAW_REGISTRIES = (segment_registry, mining_segment_registry)
+ROLLUP_MODELS = (MetricsRollupDB, MiningRollupDB)
+
+def drop_segment(db: Session, day, registry: SegmentRegistry = segment_registry) -> int:
+    """Supprime un segment journalier entier ; retourne le nombre de lignes qu'il contenait"""
+    table = registry.table(day)
+    rows = db.execute(select(func.count()).select_from(table)).scalar()
+    registry.drop(db.connection(), day)
+    db.commit()
+    return rows
+
+def delete_raw_chunk(db: Session, day, cutoff: datetime, limit: int, registry: SegmentRegistry = segment_registry) -> int:
+    """Supprime au plus `limit` métriques antérieures à cutoff dans le segment partiellement expiré"""
+    table = registry.table(day)
+    ids = select(table.c.id).where(table.c.last_seen < cutoff).order_by(table.c.last_seen).limit(limit)
+    deleted = db.execute(delete(table).where(table.c.id.in_(ids))).rowcount
+    db.commit()
+    return deleted
+
+def delete_rollup_chunk(db: Session, resolution: int, cutoff: datetime, limit: int, model=MetricsRollupDB) -> int:
+    """Supprime au plus `limit` agrégats d'une résolution antérieurs à cutoff"""
+    primary_key = model.__table__.primary_key.columns
+    keys = (
+        select(*primary_key)
+        .where(model.resolution == resolution)
+        .where(model.bucket < to_epoch(cutoff))
+        .limit(limit)
+    )
+    deleted = db.execute(delete(model).where(tuple_(*primary_key).in_(keys))).rowcount
+    db.commit()
+    return deleted
+
+def incremental_vacuum_step(db: Session, pages: int) -> Tuple[int, int]:
+    """Rend au système au plus `pages` pages libres ; retourne (pages libérées, pages libres restantes)"""
+    before = db.execute(text("PRAGMA freelist_count")).scalar()
+    # Chaque pas (step) SQLite libère une page et sqlite3.execute() n'en fait qu'un :
+    # executescript() exécute l'instruction jusqu'au bout
+    db.commit()
+    db.connection().connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({pages})")
+    db.commit()
+    after = db.execute(text("PRAGMA freelist_count")).scalar()
+    return before - after, after
+
+def default_policies(now: datetime) -> List[Tuple[str, Optional[int], datetime]]:
+    """Niveaux de rétention : (nom, résolution ou None pour les données brutes, date limite)"""
+    policies = [("raw", None, now - timedelta(days=RETENTION_RAW_DAYS))]
+    for resolution, days in RETENTION_ROLLUP_DAYS.items():
+        policies.append((f"rollup_{resolution}s", resolution, now - timedelta(days=days)))
+    return policies
+
+class RetentionScheduler:
+    """Rétention incrémentale : suppressions par lots sur le thread d'écriture, puis incremental_vacuum"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.status = {
+            "running": False,
+            "started_at": None,
+            "finished_at": None,
+            "tier": None,
+            "deleted": {},
+            "dropped_segments": 0,
+            "freed_pages": 0,
+            "free_pages": None,
+            "error": None,
+        }
+
+    async def run_once(self, policies: Optional[List[Tuple[str, Optional[int], datetime]]] = None) -> dict:
+        """Applique les politiques de rétention ; une seule passe à la fois"""
+        async with self.lock:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            self.status.update({
+                "running": True,
+                "started_at": now.isoformat(),
+                "finished_at": None,
+                "tier": None,
+                "deleted": {},
+                "dropped_segments": 0,
+                "freed_pages": 0,
+                "error": None,
+            })
+            pause = RETENTION_CHUNK_PAUSE_MS / 1000
+            try:
+                for name, resolution, cutoff in policies or default_policies(now):
+                    self.status["tier"] = name
+                    self.status["deleted"][name] = 0
+                    steps = []
+                    if resolution is None:
+                        # Données brutes : segments entièrement expirés supprimés d'un bloc,
+                        # puis suppression par lots dans le segment qui contient cutoff
+                        for registry in RAW_REGISTRIES:
+                            for day in registry.between(end=cutoff):
+                                if segment_bounds(day)[1] <= cutoff:
+                                    drop = partial(drop_segment, day=day, registry=registry)
+                                    deleted = await metrics_writer.run_task(drop)
+                                    self.status["deleted"][name] += deleted
+                                    self.status["dropped_segments"] += 1
+                                else:
+                                    steps.append(partial(
+                                        delete_raw_chunk, day=day, cutoff=cutoff, limit=RETENTION_CHUNK_SIZE, registry=registry,
+                                    ))
+                        hot_tier.trim(cutoff)
+                    else:
+                        for model in ROLLUP_MODELS:
+                            steps.append(partial(
+                                delete_rollup_chunk, resolution=resolution, cutoff=cutoff, limit=RETENTION_CHUNK_SIZE, model=model,
+                            ))
+                    for step in steps:
+                        while True:
+                            deleted = await metrics_writer.run_task(step)
+                            self.status["deleted"][name] += deleted
+                            if deleted < RETENTION_CHUNK_SIZE:
+                                break
+                            await asyncio.sleep(pause)
+
+                self.status["tier"] = "incremental_vacuum"
+                step = partial(incremental_vacuum_step, pages=RETENTION_VACUUM_PAGES)
+                while True:
+                    freed, remaining = await metrics_writer.run_task(step)
+                    self.status["freed_pages"] += freed
+                    self.status["free_pages"] = remaining
+                    if freed == 0 or remaining == 0:
+                        break
+                    await asyncio.sleep(pause)
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+                self.status["error"] = str(e)
+            finally:
+                self.status["running"] = False
+                self.status["tier"] = None
+                self.status["finished_at"] = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+            return dict(self.status)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(RETENTION_INTERVAL)
+            result = await self.run_once()
+            total = sum(result["deleted"].values())
+            if total:
+                print(f"🧹 Rétention : {total} lignes supprimées, {result['freed_pages']} pages libérées")
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+# Instance globale
+retention_scheduler = RetentionScheduler()
@@ -0,0 +1,79 @@
+import calendar
+from datetime import datetime
+from typing import List
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import MetricsRollupDB
+
+# Résolutions des agrégats maintenus à l'ingestion (en secondes)
+ROLLUP_RESOLUTIONS = (60, 300, 3600)
+
+# Intervalle d'envoi de l'agent, utilisé pour estimer le nombre de points bruts
+RAW_INTERVAL = 30
+
+# Colonnes agrégées : (préfixe rollup, colonne metrics)
+ROLLUP_FIELDS = (
+    ("cpu", "cpu_utilization"),
+    ("memory", "memory_utilization"),
+    ("disk", "disk_usage"),
+)
+
+def to_epoch(value: datetime) -> int:
+    """Epoch UTC d'un datetime naïf stocké en UTC"""
+    return calendar.timegm(value.utctimetuple())
+
+def pick_resolution(period_seconds: int, max_points: int):
+    """Résolution la plus fine qui tient dans max_points (None = données brutes)"""
+    if period_seconds // RAW_INTERVAL <= max_points:
+        return None
+    for resolution in ROLLUP_RESOLUTIONS:
+        if period_seconds // resolution <= max_points:
+            return resolution
+    # Résolution la plus grossière : taille fixe bornée par la période
+    return ROLLUP_RESOLUTIONS[-1]
+
+def aggregate_rows(rows: List[dict]) -> List[dict]:
+    """Agrège un lot de métriques par (résolution, host_id, bucket)"""
+    buckets = {}
+    for row in rows:
+        epoch = to_epoch(row["last_seen"])
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (resolution, row["host_id"], epoch - epoch % resolution)
+            agg = buckets.get(key)
+            if agg is None:
+                agg = {"resolution": key[0], "host_id": key[1], "bucket": key[2], "samples": 0}
+                for prefix, column in ROLLUP_FIELDS:
+                    agg[f"{prefix}_sum"] = 0.0
+                    agg[f"{prefix}_min"] = row[column]
+                    agg[f"{prefix}_max"] = row[column]
+                buckets[key] = agg
+            agg["samples"] += 1
+            for prefix, column in ROLLUP_FIELDS:
+                value = row[column]
+                # Extrêmes de la fenêtre de l'agent quand il les fournit, sinon la moyenne envoyée
+                low = row.get(f"{prefix}_min")
+                high = row.get(f"{prefix}_max")
+                agg[f"{prefix}_sum"] += value
+                agg[f"{prefix}_min"] = min(agg[f"{prefix}_min"], value if low is None else low)
+                agg[f"{prefix}_max"] = max(agg[f"{prefix}_max"], value if high is None else high)
+    return list(buckets.values())
+
+def upsert_rollups(db: Session, rows: List[dict]):
+    """Fusionne un lot de métriques dans les agrégats existants (mise à jour incrémentale)"""
+    aggregates = aggregate_rows(rows)
+    if not aggregates:
+        return
+    stmt = sqlite_insert(MetricsRollupDB)
+    table = MetricsRollupDB.__table__.c
+    set_ = {"samples": table.samples + stmt.excluded.samples}
+    for prefix, _ in ROLLUP_FIELDS:
+        set_[f"{prefix}_sum"] = table[f"{prefix}_sum"] + stmt.excluded[f"{prefix}_sum"]
+        # min()/max() à deux arguments sont des fonctions scalaires en SQLite
+        set_[f"{prefix}_min"] = func.min(table[f"{prefix}_min"], stmt.excluded[f"{prefix}_min"])
+        set_[f"{prefix}_max"] = func.max(table[f"{prefix}_max"], stmt.excluded[f"{prefix}_max"])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MetricsRollupDB.resolution, MetricsRollupDB.host_id, MetricsRollupDB.bucket],
+        set_=set_,
+    )
+    db.execute(stmt, aggregates)
@@ -1,15 +1,62 @@
 from datetime import datetime
-from pydantic import BaseModel, field_serializer
+from typing import List, Optional
+from pydantic import BaseModel, Field, computed_field, field_serializer, model_validator
+from app.hosts import uptime_at
 
 
-class MetricsIn(BaseModel):
+class MinerStatsIn(BaseModel):
+    name: str  # Nom du processus, unique par host
+    hashrate: Optional[float] = None  # H/s, None tant que le log n'en donne pas
+    accepted_shares: Optional[int] = None
+    rejected_shares: Optional[int] = None
+    temp: Optional[float] = None
+
+class AgentRegisterIn(BaseModel):
     hostname: str
     ip_address: str
+    boot_time: int  # Epoch UTC du démarrage
+    cpu_count: Optional[int] = None
+    os: Optional[str] = None
+    agent_secret: Optional[str] = None  # Exigé pour réenregistrer un host qui a déjà un secret
+
+class AgentRegisterOut(BaseModel):
+    agent_id: int
+    agent_secret: str  # À présenter à l'ouverture du canal WebSocket
+
+class SamplingIn(BaseModel):
+    sample_rate: Optional[float] = Field(None, gt=0, le=10)  # Hz
+    report_interval: Optional[int] = Field(None, ge=5, le=3600)  # Secondes
+
+class MetricsIn(BaseModel):
+    # Agent enregistré : agent_id seul ; sinon hostname et adresse IP à chaque métrique
+    agent_id: Optional[int] = None
+    hostname: Optional[str] = None
+    ip_address: Optional[str] = None
     cpu_utilization: float
     memory_utilization: float
     disk_usage: float
     last_seen: datetime
-    uptime: str
+    boot_time: Optional[int] = None  # Epoch UTC du démarrage (agents récents)
+    uptime: Optional[str] = None  # Anciens agents : converti en boot_time à l'ingestion
+    # Agrégats de la fenêtre d'envoi (cpu_utilization et memory_utilization en sont les moyennes)
+    cpu_min: Optional[float] = None
+    cpu_max: Optional[float] = None
+    cpu_p95: Optional[float] = None
+    memory_min: Optional[float] = None
+    memory_max: Optional[float] = None
+    memory_p95: Optional[float] = None
+    miners: Optional[List[MinerStatsIn]] = None  # Stats de mining CPU, absentes sans mineur actif
+
+    @model_validator(mode="after")
+    def check_identity(self):
+        if self.agent_id is None and (self.hostname is None or self.ip_address is None):
+            raise ValueError("agent_id ou hostname et ip_address requis")
+        return self
+
+class HeartbeatIn(BaseModel):
+    agent_id: Optional[int] = None
+    hostname: Optional[str] = None  # Agents non enregistrés
+    last_seen: datetime
 
 class MetricsOut(BaseModel):
     id: int
@@ -19,7 +66,18 @@ class MetricsOut(BaseModel):
     memory_utilization: float
     disk_usage: float
     last_seen: datetime
-    uptime: str
+    boot_time: Optional[int] = None
+    cpu_min: Optional[float] = None
+    cpu_max: Optional[float] = None
+    cpu_p95: Optional[float] = None
+    memory_min: Optional[float] = None
+    memory_max: Optional[float] = None
+    memory_p95: Optional[float] = None
+
+    @computed_field
+    @property
+    def uptime(self) -> Optional[str]:
+        return uptime_at(self.last_seen, self.boot_time)
 
     @field_serializer("last_seen")
     def serialize_last_seen(self, value: datetime, _info):
@@ -28,6 +86,35 @@ class MetricsOut(BaseModel):
     class Config:
         from_attributes = True
 
+class MetricsPageOut(BaseModel):
+    items: List[MetricsOut]
+    next_cursor: Optional[str] = None
+
+class MetricsBatchResult(BaseModel):
+    index: int
+    status: str
+    detail: Optional[str] = None
+
+class MetricsBatchOut(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[MetricsBatchResult]
+
+class FleetHostOut(BaseModel):
+    hostname: str
+    status: str
+    last_seen: datetime
+    metrics: MetricsOut
+
+    @field_serializer("last_seen")
+    def serialize_last_seen(self, value: datetime, _info):
+        return value.isoformat()
+
+class FleetOverviewOut(BaseModel):
+    total: int
+    online: int
+    hosts: List[FleetHostOut]
+
 class InstallMiner(BaseModel):
     ip_address: str
     user: str
@@ -0,0 +1,124 @@
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import Column, Float, Index, Integer, MetaData, Table
+from sqlalchemy.engine import Connection, Engine
+from app.models import EpochMicros
+
+# Les métriques brutes sont stockées dans une table par jour UTC (metrics_AAAAMMJJ).
+# Une requête sur une période ne lit que les segments qui la recouvrent et la rétention
+# supprime des segments entiers (DROP TABLE) au lieu de parcourir une table unique.
+SEGMENT_PREFIX = "metrics_"
+# Même découpage pour les échantillons des mineurs (mining_AAAAMMJJ)
+MINING_SEGMENT_PREFIX = "mining_"
+
+# Agrégats de la fenêtre d'envoi de l'agent (échantillonnage ~1 Hz), absents pour les anciens agents
+WINDOW_FIELDS = ("cpu_min", "cpu_max", "cpu_p95", "memory_min", "memory_max", "memory_p95")
+
+segment_metadata = MetaData()
+
+def segment_name(day: date, prefix: str = SEGMENT_PREFIX) -> str:
+    return f"{prefix}{day:%Y%m%d}"
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Les dates sont stockées en UTC naïf (SQLite ne conserve pas le fuseau horaire)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def segment_day(last_seen: datetime) -> date:
+    return last_seen.date()
+
+def segment_bounds(day: date):
+    """[début, fin) du segment en datetime UTC naïfs"""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+def metrics_columns(name: str) -> list:
+    """Segment de métriques : uniquement des valeurs numériques, le host par son id"""
+    return [
+        Column("id", Integer, primary_key=True),
+        Column("host_id", Integer, nullable=False),
+        Column("cpu_utilization", Float, nullable=False),
+        Column("memory_utilization", Float, nullable=False),
+        Column("disk_usage", Float, nullable=False),
+        Column("last_seen", EpochMicros, nullable=False),
+        Column("boot_time", Integer),
+        *(Column(field, Float) for field in WINDOW_FIELDS),
+        Index(f"ix_{name}_host_id_last_seen", "host_id", "last_seen"),
+        Index(f"ix_{name}_last_seen", "last_seen"),
+    ]
+
+def mining_columns(name: str) -> list:
+    """Segment des mineurs : un échantillon par mineur et par envoi, le mineur par son id"""
+    return [
+        Column("id", Integer, primary_key=True),
+        Column("miner_id", Integer, nullable=False),
+        Column("last_seen", EpochMicros, nullable=False),
+        Column("hashrate", Float),  # H/s
+        Column("accepted_shares", Integer),
+        Column("rejected_shares", Integer),
+        Column("temp", Float),
+        Index(f"ix_{name}_miner_id_last_seen", "miner_id", "last_seen"),
+        Index(f"ix_{name}_last_seen", "last_seen"),
+    ]
+
+class SegmentRegistry:
+    """Liste des segments existants, partagée entre le thread d'écriture et les lectures"""
+
+    def __init__(self, prefix: str = SEGMENT_PREFIX, columns=metrics_columns):
+        self.prefix = prefix
+        self.columns = columns
+        self.lock = threading.Lock()
+        self.days = set()
+        self.tables: Dict[date, Table] = {}
+
+    def table(self, day: date) -> Table:
+        """Objet Table d'un segment"""
+        with self.lock:
+            table = self.tables.get(day)
+            if table is None:
+                name = segment_name(day, self.prefix)
+                table = Table(name, segment_metadata, *self.columns(name))
+                self.tables[day] = table
+            return table
+
+    def load(self, engine: Engine):
+        """Recharge la liste des segments depuis sqlite_master"""
+        with engine.connect() as conn:
+            names = conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                (f"{self.prefix}[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]",),
+            ).scalars().all()
+        with self.lock:
+            self.days = {datetime.strptime(name[len(self.prefix):], "%Y%m%d").date() for name in names}
+
+    def ensure(self, conn: Connection, day: date) -> Table:
+        """Crée le segment d'un jour s'il n'existe pas encore"""
+        table = self.table(day)
+        if day not in self.days:
+            table.create(conn, checkfirst=True)
+            with self.lock:
+                self.days.add(day)
+        return table
+
+    def drop(self, conn: Connection, day: date):
+        self.table(day).drop(conn, checkfirst=True)
+        with self.lock:
+            self.days.discard(day)
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[date]:
+        """Segments qui recouvrent [start, end), par ordre chronologique"""
+        with self.lock:
+            days = sorted(self.days)
+        if start is not None:
+            start = to_naive_utc(start)
+            days = [day for day in days if day >= start.date()]
+        if end is not None:
+            end = to_naive_utc(end)
+            days = [day for day in days if segment_bounds(day)[0] < end]
+        return days
+
+# Instances globales
+segment_registry = SegmentRegistry()
+mining_segment_registry = SegmentRegistry(MINING_SEGMENT_PREFIX, mining_columns)
@@ -1,4 +1,5 @@
 import asyncio
+import codecs
 import paramiko
 import threading
 import uuid
@@ -10,11 +11,13 @@ import logging
 logger = logging.getLogger(__name__)
 
 class SSHSession:
-    def __init__(self, hostname: str, ip_address: str, user: str):
+    def __init__(self, hostname: str, ip_address: str, user: str, port: int = 22, pkey: Optional[paramiko.PKey] = None):
         self.session_id = str(uuid.uuid4())
         self.hostname = hostname
         self.ip_address = ip_address
         self.user = user
+        self.port = port
+        self.pkey = pkey  # Par défaut : clés de ~/.ssh et agent SSH
         self.ssh_client = None
         self.shell_channel = None
         self.created_at = datetime.now(timezone.utc)
@@ -22,31 +25,38 @@ class SSHSession:
         self.status = "connecting"
         self.websocket = None
         self.read_task = None
+        self.reader = None  # (boucle, descripteur) surveillé par read_output
+
+    def _open_shell(self):
+        """Connexion et ouverture du shell (bloquant, exécuté hors de la boucle)"""
+        self.ssh_client = paramiko.SSHClient()
+        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        
+        # Connexion SSH
+        self.ssh_client.connect(
+            hostname=self.ip_address,
+            port=self.port,
+            username=self.user,
+            pkey=self.pkey,
+            timeout=10,
+            look_for_keys=self.pkey is None,
+            allow_agent=self.pkey is None
+        )
+        
+        # Créer un canal shell interactif avec PTY
+        self.shell_channel = self.ssh_client.invoke_shell(
+            term='xterm-256color',
+            width=120,
+            height=30
+        )
+        
+        # Configurer le terminal
+        self.shell_channel.settimeout(0.1)
 
     async def connect(self):
         """Établit la connexion SSH avec PTY"""
         try:
-            self.ssh_client = paramiko.SSHClient()
-            self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Connexion SSH
-            self.ssh_client.connect(
-                hostname=self.ip_address,
-                username=self.user,
-                timeout=10,
-                look_for_keys=True,
-                allow_agent=True
-            )
-            
-            # Créer un canal shell interactif avec PTY
-            self.shell_channel = self.ssh_client.invoke_shell(
-                term='xterm-256color',
-                width=120,
-                height=30
-            )
-            
-            # Configurer le terminal
-            self.shell_channel.settimeout(0.1)
+            await asyncio.to_thread(self._open_shell)
             
             # Attendre un peu que le shell soit prêt
             await asyncio.sleep(0.5)
@@ -55,7 +65,7 @@ class SSHSession:
             try:
                 while self.shell_channel.recv_ready():
                     initial_data = self.shell_channel.recv(4096).decode('utf-8', errors='ignore')
-                    logger.info(f"Initial shell output: {repr(initial_data)}")
+                    logger.debug(f"Initial shell output: {repr(initial_data)}")
             except:
                 pass
             
@@ -73,33 +83,51 @@ class SSHSession:
         """Envoie une commande au shell"""
         if self.shell_channel and self.shell_channel.send_ready():
             try:
-                # Logger pour debug
-                logger.info(f"Sending command to SSH session {self.session_id[:8]}...: {repr(command)}")
-                
-                # Envoyer la commande
-                bytes_sent = self.shell_channel.send(command.encode('utf-8'))
-                logger.info(f"Command sent: {bytes_sent} bytes")
-                
+                logger.debug(f"Sending input to SSH session {self.session_id[:8]}...: {repr(command)}")
+                self.shell_channel.sendall(command.encode('utf-8'))
                 self.last_used = datetime.now(timezone.utc)
-                
-                # Forcer la lecture immédiate pour voir s'il y a une réponse
-                await asyncio.sleep(0.1)
-                
             except Exception as e:
                 logger.error(f"Error sending SSH command: {e}")
         else:
             logger.warning(f"SSH channel not ready for session {self.session_id[:8]}... (send_ready: {self.shell_channel.send_ready() if self.shell_channel else 'No channel'})")
 
+    def _drain(self) -> bytes:
+        """Tout ce que le canal a déjà reçu, sans attendre"""
+        chunks = []
+        while self.shell_channel.recv_ready():
+            chunks.append(self.shell_channel.recv(65536))
+        return b''.join(chunks)
+
     async def read_output(self):
-        """Lit la sortie du shell en continu"""
+        """Transmet la sortie du shell au WebSocket, sans attente active.
+
+        channel.fileno() est un tube que paramiko signale à l'arrivée de données et à la
+        fermeture du canal : il est surveillé par le sélecteur de la boucle (add_reader).
+        Une session inactive ne coûte donc aucun réveil de la boucle. La surveillance est
+        suspendue pendant l'envoi d'un lot (le tube reste signalé tant que le tampon n'est
+        pas vidé), et tout ce qui est arrivé entre-temps part dans un seul message.
+        """
         logger.info(f"Starting SSH output reader for session {self.session_id[:8]}...")
-        
-        while self.status == "connected" and self.shell_channel:
-            try:
-                if self.shell_channel.recv_ready():
-                    data = self.shell_channel.recv(4096).decode('utf-8', errors='ignore')
-                    logger.info(f"SSH output received ({len(data)} chars): {repr(data[:100])}")
-                    
+        loop = asyncio.get_running_loop()
+        channel = self.shell_channel
+        fd = channel.fileno()
+        readable = asyncio.Event()
+
+        def on_readable():
+            loop.remove_reader(fd)
+            readable.set()
+
+        self.reader = (loop, fd)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        try:
+            while self.status == "connected":
+                readable.clear()
+                loop.add_reader(fd, on_readable)
+                await readable.wait()
+
+                data = decoder.decode(self._drain())
+                if data:
+                    logger.debug(f"SSH output received ({len(data)} chars)")
                     if self.websocket:
                         try:
                             # Envoyer en format JSON pour cohérence
@@ -107,20 +135,29 @@ class SSHSession:
                                 "type": "output",
                                 "data": data
                             }))
-                            logger.info(f"SSH output sent to WebSocket")
                         except Exception as ws_error:
                             logger.error(f"Error sending WebSocket message: {ws_error}")
                             break
                     else:
                         logger.warning(f"No WebSocket available to send output")
-                        
-                await asyncio.sleep(0.01)
-            except Exception as e:
-                logger.error(f"Error reading SSH output: {e}")
-                break
+
+                if channel.closed or (channel.eof_received and not channel.recv_ready()):
+                    # Shell terminé (exit) : le tube reste signalé, inutile de le surveiller
+                    break
+        except Exception as e:
+            logger.error(f"Error reading SSH output: {e}")
+        finally:
+            self._stop_reader()
                 
         logger.info(f"SSH output reader stopped for session {self.session_id[:8]}...")
 
+    def _stop_reader(self):
+        # Avant la fermeture du canal, qui ferme le tube (son numéro pourrait être réutilisé)
+        if self.reader:
+            loop, fd = self.reader
+            self.reader = None
+            loop.remove_reader(fd)
+
     def resize_terminal(self, width: int, height: int):
         """Redimensionne le terminal"""
         if self.shell_channel:
@@ -132,6 +169,7 @@ class SSHSession:
         
         if self.read_task:
             self.read_task.cancel()
+        self._stop_reader()
             
         if self.shell_channel:
             self.shell_channel.close()
@@ -0,0 +1,284 @@
+import asyncio
+import codecs
+import logging
+import select
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+import paramiko
+from app.commands import CommandTimeout
+from app.config import (
+    SSH_CONNECT_TIMEOUT, SSH_POOL_IDLE_TIMEOUT, SSH_POOL_MAX_CHANNELS,
+    SSH_POOL_MAX_CONNECTIONS_PER_HOST, SSH_POOL_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+class PooledConnection:
+    """Connexion SSH authentifiée ; chaque commande y ouvre un canal exec"""
+
+    def __init__(self, ip_address: str, user: str, client: paramiko.SSHClient):
+        self.ip_address = ip_address
+        self.user = user
+        self.client = client
+        self.channels = 0  # Commandes en cours
+        self.created_at = datetime.now(timezone.utc)
+        self.last_used = time.monotonic()
+        self.commands = 0
+
+    def healthy(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+class SSHConnectionPool:
+    """Connexions SSH gardées ouvertes par (ip, utilisateur) pour l'exécution de commandes.
+
+    Une commande ouvre un canal exec sur une connexion existante : ni processus ansible,
+    ni poignée de main SSH à chaque appel. Jusqu'à SSH_POOL_MAX_CHANNELS commandes
+    partagent une connexion (MaxSessions d'OpenSSH vaut 10), avec au plus
+    SSH_POOL_MAX_CONNECTIONS_PER_HOST connexions par host.
+
+    Santé : keepalive SSH sur chaque transport, connexions inactives écartées à
+    l'acquisition, et une commande qui échoue à ouvrir son canal sur une connexion
+    réutilisée est relancée une fois sur une connexion neuve. Les connexions sans
+    commande depuis SSH_POOL_IDLE_TIMEOUT secondes sont fermées par expire_idle().
+
+    paramiko étant bloquant, connexions et lectures tournent dans un pool de threads dédié.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.connections: Dict[Tuple[str, str], List[PooledConnection]] = {}
+        self.connecting: Dict[Tuple[str, str], int] = {}  # Connexions en cours d'établissement
+        self.executor = ThreadPoolExecutor(max_workers=SSH_POOL_WORKERS, thread_name_prefix="ssh-pool")
+
+    def _connect(self, ip_address: str, user: str) -> PooledConnection:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=ip_address,
+            username=user,
+            timeout=SSH_CONNECT_TIMEOUT,
+            banner_timeout=SSH_CONNECT_TIMEOUT,
+            auth_timeout=SSH_CONNECT_TIMEOUT,
+            look_for_keys=True,
+            allow_agent=True
+        )
+        transport = client.get_transport()
+        transport.set_keepalive(30)
+        # Sans Nagle : les petits paquets d'une commande partent sans attendre d'acquittement
+        transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logger.info(f"SSH pool: nouvelle connexion {user}@{ip_address}")
+        return PooledConnection(ip_address, user, client)
+
+    def _acquire(self, ip_address: str, user: str, fresh: bool = False) -> Tuple[PooledConnection, bool]:
+        """(connexion, réutilisée) ; une place de canal y est réservée"""
+        key = (ip_address, user)
+        with self.condition:
+            while True:
+                pool = self.connections.setdefault(key, [])
+                for connection in [connection for connection in pool if not connection.healthy()]:
+                    if connection.channels == 0:
+                        pool.remove(connection)
+                        connection.close()
+                if fresh:
+                    break
+                available = [
+                    connection for connection in pool
+                    if connection.healthy() and connection.channels < SSH_POOL_MAX_CHANNELS
+                ]
+                if available:
+                    connection = min(available, key=lambda connection: connection.channels)
+                    connection.channels += 1
+                    return connection, True
+                if len(pool) + self.connecting.get(key, 0) < SSH_POOL_MAX_CONNECTIONS_PER_HOST:
+                    break
+                if self.connecting.get(key, 0) == 0:
+                    # Host saturé : la connexion la moins chargée (le serveur peut refuser le canal)
+                    connection = min(pool, key=lambda connection: connection.channels)
+                    connection.channels += 1
+                    return connection, True
+                # Une connexion vers ce host est en cours d'établissement : on l'attend
+                self.condition.wait()
+            self.connecting[key] = self.connecting.get(key, 0) + 1
+        connection = None
+        try:
+            connection = self._connect(ip_address, user)
+            connection.channels = 1
+        finally:
+            with self.condition:
+                self.connecting[key] -= 1
+                if not self.connecting[key]:
+                    del self.connecting[key]
+                if connection is not None:
+                    self.connections.setdefault(key, []).append(connection)
+                self.condition.notify_all()
+        return connection, False
+
+    def _release(self, connection: PooledConnection, broken: bool = False):
+        with self.lock:
+            connection.channels -= 1
+            connection.last_used = time.monotonic()
+            pool = self.connections.get((connection.ip_address, connection.user), [])
+            if (broken or not connection.healthy()) and connection in pool:
+                pool.remove(connection)
+            # Écartée (cassée ou discard()) : fermée à la fin de sa dernière commande
+            close = connection not in pool and connection.channels == 0
+        if close:
+            connection.close()
+
+    def _open_channel(self, ip_address: str, user: str) -> Tuple[PooledConnection, paramiko.Channel]:
+        connection, reused = self._acquire(ip_address, user)
+        try:
+            return connection, connection.client.get_transport().open_session(timeout=SSH_CONNECT_TIMEOUT)
+        except (paramiko.SSHException, EOFError, OSError, AttributeError):
+            self._release(connection, broken=True)
+            if not reused:
+                raise
+        # Connexion réutilisée morte entre-temps : une nouvelle tentative sur une connexion neuve
+        connection, _ = self._acquire(ip_address, user, fresh=True)
+        try:
+            return connection, connection.client.get_transport().open_session(timeout=SSH_CONNECT_TIMEOUT)
+        except Exception:
+            self._release(connection, broken=True)
+            raise
+
+    def _execute(
+        self, ip_address: str, user: str, command: str, timeout: Optional[float], running: dict,
+        on_output: Optional[Callable[[str, str], None]] = None,
+    ) -> Tuple[int, str, str]:
+        connection, channel = self._open_channel(ip_address, user)
+        running["channel"] = channel
+        broken = False
+        output = {"stdout": [], "stderr": []}
+        decoders = {stream: codecs.getincrementaldecoder("utf-8")(errors="replace") for stream in output}
+
+        def receive(stream: str, data: bytes):
+            if on_output is None:
+                output[stream].append(data)
+                return
+            # Transmis au fil de l'eau, rien n'est gardé ; le décodeur garde les caractères coupés
+            text = decoders[stream].decode(data)
+            if text:
+                on_output(stream, text)
+
+        try:
+            channel.exec_command(command)
+            deadline = time.monotonic() + timeout if timeout else None
+            while True:
+                if channel.recv_ready():
+                    receive("stdout", channel.recv(32768))
+                elif channel.recv_stderr_ready():
+                    receive("stderr", channel.recv_stderr(32768))
+                elif channel.exit_status_ready() or channel.closed:
+                    break
+                else:
+                    remaining = deadline - time.monotonic() if deadline else 0.5
+                    if remaining <= 0:
+                        raise CommandTimeout(timeout)
+                    # fileno() : tube signalé à l'arrivée de données et à la fermeture du canal
+                    select.select([channel], [], [], min(remaining, 0.5))
+            # Le statut de sortie arrive après les données : il ne reste qu'à vider les tampons
+            while channel.recv_ready():
+                receive("stdout", channel.recv(32768))
+            while channel.recv_stderr_ready():
+                receive("stderr", channel.recv_stderr(32768))
+            returncode = channel.recv_exit_status() if channel.exit_status_ready() else -1
+            connection.commands += 1
+            return (
+                returncode,
+                b"".join(output["stdout"]).decode("utf-8", errors="replace"),
+                b"".join(output["stderr"]).decode("utf-8", errors="replace"),
+            )
+        except (paramiko.SSHException, EOFError, OSError):
+            broken = True
+            raise
+        finally:
+            channel.close()
+            self._release(connection, broken)
+
+    async def run(
+        self, ip_address: str, user: str, command: str, timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], None]] = None,
+    ) -> Tuple[int, str, str]:
+        """Exécute une commande sur le host ; (code retour, stdout, stderr).
+
+        Avec on_output(flux, texte), appelé depuis un thread du pool, la sortie est
+        transmise par morceaux au fil de l'exécution et stdout/stderr sont retournés vides.
+        À l'annulation (échéance globale), le canal est fermé, ce qui interrompt la
+        lecture ; la connexion reste dans le pool.
+        """
+        running = {}
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, self._execute, ip_address, user, command, timeout, running, on_output,
+        )
+        try:
+            return await future
+        except asyncio.CancelledError:
+            channel = running.get("channel")
+            if channel is not None:
+                channel.close()
+            raise
+
+    def discard(self, ip_address: str):
+        """Oublie les connexions vers un host (redémarrage) ; celles en cours se ferment à la fin de leur commande"""
+        with self.lock:
+            keys = [key for key in self.connections if key[0] == ip_address]
+            dropped = [connection for key in keys for connection in self.connections.pop(key)]
+        for connection in dropped:
+            if connection.channels == 0:
+                connection.close()
+
+    def expire_idle(self) -> int:
+        """Ferme les connexions sans commande depuis SSH_POOL_IDLE_TIMEOUT ou mortes"""
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            for key, pool in list(self.connections.items()):
+                for connection in list(pool):
+                    idle = connection.channels == 0 and now - connection.last_used > SSH_POOL_IDLE_TIMEOUT
+                    if connection.channels == 0 and (idle or not connection.healthy()):
+                        pool.remove(connection)
+                        expired.append(connection)
+                if not pool:
+                    del self.connections[key]
+        for connection in expired:
+            connection.close()
+        return len(expired)
+
+    def close_all(self):
+        with self.lock:
+            connections = [connection for pool in self.connections.values() for connection in pool]
+            self.connections = {}
+        for connection in connections:
+            connection.close()
+
+    def list(self) -> list:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "ip_address": connection.ip_address,
+                    "user": connection.user,
+                    "created_at": connection.created_at.isoformat(),
+                    "active_channels": connection.channels,
+                    "commands": connection.commands,
+                    "idle_seconds": round(now - connection.last_used, 1),
+                    "healthy": connection.healthy(),
+                }
+                for pool in self.connections.values()
+                for connection in pool
+            ]
+
+# Instance globale
+ssh_pool = SSHConnectionPool()
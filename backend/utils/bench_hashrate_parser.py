@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Le parseur fait partie de l'agent (répertoire de scripts, pas un package)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app" / "agent"))
+from hashrate_parser import profile_for  # noqa: E402
+
+NOISE = [
+    "[{ts}]  net      new job from pool.example.org:3333 diff 100001 algo rx/0 height 3012345",
+    "[{ts}]  randomx  init dataset algo rx/0 (8 threads) seed 5a3f...",
+    "[{ts}]  cpu      READY threads 8/8 (8) huge pages 100% 8/8 memory 16384 KB (14 ms)",
+    "[{ts}]  net      use pool pool.example.org:3333  1.2.3.4",
+]
+
+SAMPLES = {
+    "xmrig": [
+        "[{ts}]  miner    speed 10s/60s/15m {r:.1f} {r:.1f} n/a H/s max {r:.1f} H/s",
+        "[{ts}]  cpu      accepted ({n}/{k}) diff 100001 (45 ms)",
+    ],
+    "cpuminer": [
+        "[{ts}] Accepted {n}/{m} (99.9%), diff 0.01, {r:.2f} kH/s",
+        "[{ts}] CPU temp: curr {t}C max {t}C, Freq: 3.9/3.9 GHz",
+        "[{ts}] thread 3: 2097152 hashes, {r:.2f} khash/s",
+    ],
+    "generic": [
+        "[{ts}] hashrate: {r:.2f} KH/s",
+        "[{ts}] accepted: {n} rejected: {k} temp: {t}C",
+    ],
+}
+
+def generate(miner, count, ratio):
+    """Log synthétique : `ratio` de lignes utiles, le reste sans valeur à extraire"""
+    lines = []
+    for i in range(count):
+        values = {"ts": f"2024-01-01 12:{i // 60 % 60:02d}:{i % 60:02d}.123", "r": random.uniform(500, 9000),
+                  "n": i, "k": i // 100, "m": i + i // 100, "t": random.randint(50, 80)}
+        template = random.choice(SAMPLES[miner]) if random.random() < ratio else random.choice(NOISE)
+        lines.append(template.format(**values))
+    return lines
+
+# Ancien parseur (six re.search non compilées par ligne, unité recherchée dans la ligne), pour comparaison
+LEGACY_PATTERNS = [
+    r'(\d+(?:\.\d+)?)\s*H/s',
+    r'(\d+(?:\.\d+)?)\s*KH/s',
+    r'(\d+(?:\.\d+)?)\s*MH/s',
+    r'speed[:\s]*(\d+(?:\.\d+)?)\s*(H/s|KH/s|MH/s)',
+    r'hashrate[:\s]*(\d+(?:\.\d+)?)\s*(H/s|KH/s|MH/s)',
+    r'CPU[:\s]*(\d+(?:\.\d+)?)\s*(H/s|KH/s|MH/s)',
+]
+
+def legacy_parse_line(line):
+    for pattern in LEGACY_PATTERNS:
+        match = re.search(pattern, line, re.IGNORECASE)
+        if match:
+            unit = match.group(2).upper() if len(match.groups()) >= 2 else (
+                'KH/S' if 'KH/s' in line.upper() else 'MH/S' if 'MH/s' in line.upper() else 'H/S')
+            value = float(match.group(1))
+            break
+    if 'accepted' in line.lower():
+        re.search(r'accepted[:\s]*(\d+)', line, re.IGNORECASE)
+
+def measure(label, func, lines, size):
+    started = time.perf_counter()
+    func(lines)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:10} {len(lines) / elapsed:12,.0f} lignes/s  {size / elapsed / 1024 / 1024:8.1f} Mo/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit du parseur de hashrate (lignes par seconde)")
+    parser.add_argument("logs", nargs="*", help="Fichiers de log réels (sinon logs synthétiques)")
+    parser.add_argument("--miner", default=None, help="Nom du processus pour choisir le profil des fichiers fournis")
+    parser.add_argument("--lines", type=int, default=500_000)
+    parser.add_argument("--ratio", type=float, default=0.3, help="Part de lignes contenant une valeur")
+    args = parser.parse_args()
+
+    if args.logs:
+        lines = []
+        for path in args.logs:
+            with open(path, errors="ignore") as f:
+                lines.extend(line.rstrip("\n") for line in f)
+        datasets = [(args.miner or Path(args.logs[0]).stem, lines)]
+    else:
+        random.seed(1)
+        datasets = [(miner, generate(miner, args.lines, args.ratio)) for miner in SAMPLES]
+
+    for miner, lines in datasets:
+        profile = profile_for(miner)
+        size = sum(len(line) + 1 for line in lines)
+        print(f"{miner} : {len(lines):,} lignes, {size / 1024 / 1024:.1f} Mo, profil {profile.name}")
+        measure("profil", profile.parse_lines, lines, size)
+        measure("ancien", lambda lines: [legacy_parse_line(line) for line in lines], lines, size)
+        print(f"  dernières valeurs : {profile.parse_lines(lines)}")
+
+if __name__ == "__main__":
+    main()
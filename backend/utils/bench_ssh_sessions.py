@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import paramiko
+
+# Le script se lance depuis backend/ ou backend/utils/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.ssh_manager import SSHSession  # noqa: E402
+
+class EchoServer(paramiko.ServerInterface):
+    """Serveur SSH de test : toute clé acceptée, shell qui renvoie ce qu'il reçoit"""
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+    def check_channel_window_change_request(self, channel, width, height, pixelwidth, pixelheight):
+        return True
+
+def echo(transport):
+    channel = transport.accept(30)
+    if channel is None:
+        return
+    channel.sendall(b"bench$ ")
+    while True:
+        data = channel.recv(4096)
+        if not data:
+            break
+        channel.sendall(data)
+
+def serve():
+    """Mode serveur (processus séparé : son CPU n'est pas compté dans celui du backend)"""
+    host_key = paramiko.RSAKey.generate(2048)
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1024)
+    print(listener.getsockname()[1], flush=True)
+    while True:
+        sock, _ = listener.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(host_key)
+        transport.start_server(server=EchoServer())
+        threading.Thread(target=echo, args=(transport,), daemon=True).start()
+
+class Collector:
+    """Remplace le WebSocket du navigateur : garde la sortie reçue"""
+
+    def __init__(self):
+        self.output = ""
+        self.messages = 0
+        self.received = asyncio.Event()
+
+    async def send_text(self, text):
+        self.output += json.loads(text)["data"]
+        self.messages += 1
+        self.received.set()
+
+    async def wait_for(self, marker):
+        while marker not in self.output:
+            self.received.clear()
+            await self.received.wait()
+
+class LegacySession(SSHSession):
+    """Ancienne lecture (recv_ready() toutes les 10 ms), pour comparaison"""
+
+    async def read_output(self):
+        while self.status == "connected":
+            if self.shell_channel.recv_ready():
+                data = self.shell_channel.recv(1024).decode('utf-8', errors='ignore')
+                if data and self.websocket:
+                    await self.websocket.send_text(json.dumps({"type": "output", "data": data}))
+            await asyncio.sleep(0.01)
+
+async def open_sessions(args, port, pkey):
+    session_class = LegacySession if args.legacy else SSHSession
+    connecting = asyncio.Semaphore(args.connect_concurrency)
+
+    async def open_one(i):
+        async with connecting:
+            session = session_class(f"bench-{i}", "127.0.0.1", "bench", port=port, pkey=pkey)
+            if not await session.connect():
+                return None
+            session.websocket = Collector()
+            session.read_task = asyncio.create_task(session.read_output())
+            return session
+
+    started = time.perf_counter()
+    sessions = await asyncio.gather(*(open_one(i) for i in range(args.sessions)))
+    return [session for session in sessions if session], time.perf_counter() - started
+
+async def idle_cpu(window):
+    """CPU du processus et du seul thread de la boucle pendant `window` secondes sans trafic"""
+    process, loop_thread, wall = time.process_time(), time.thread_time(), time.perf_counter()
+    await asyncio.sleep(window)
+    wall = time.perf_counter() - wall
+    return (time.process_time() - process) / wall * 100, (time.thread_time() - loop_thread) / wall * 100
+
+async def round_trips(sessions, count):
+    """Latence frappe -> écho reçu par le WebSocket, une session à la fois"""
+    latencies = []
+    for i in range(count):
+        session = sessions[i % len(sessions)]
+        marker = f"ping-{i}\n"
+        started = time.perf_counter()
+        await session.send_command(marker)
+        await session.websocket.wait_for(marker)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+async def run(args, port):
+    pkey = paramiko.RSAKey.generate(2048)
+    sessions, elapsed = await open_sessions(args, port, pkey)
+    print(f"{len(sessions)}/{args.sessions} sessions ouvertes en {elapsed:.1f} s "
+          f"({'ancienne lecture, sondage 10 ms' if args.legacy else 'lecture sur événement'})")
+    if not sessions:
+        return
+
+    await asyncio.sleep(1)  # Fin des bannières et invites
+    process_cpu, loop_cpu = await idle_cpu(args.idle)
+    print(f"  inactives ({args.idle:.0f} s) : CPU processus {process_cpu:5.1f} %, boucle asyncio {loop_cpu:5.1f} %")
+
+    latencies = sorted(await round_trips(sessions, args.round_trips))
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  aller-retour : p50 {statistics.median(latencies):.2f} ms, p99 {p99:.2f} ms ({len(latencies)} frappes)")
+    print(f"  mémoire max du processus : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} Mo")
+
+    for session in sessions:
+        session.disconnect()
+    await asyncio.gather(*(session.read_task for session in sessions), return_exceptions=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sessions de terminal SSH simultanées tenues par un processus backend")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--idle", type=float, default=10, help="Durée de mesure du CPU sans trafic (secondes)")
+    parser.add_argument("--round-trips", type=int, default=200)
+    parser.add_argument("--connect-concurrency", type=int, default=20)
+    parser.add_argument("--legacy", action="store_true", help="Ancienne lecture par sondage, pour comparaison")
+    parser.add_argument("--port", type=int, default=None, help="Serveur SSH existant (sinon serveur d'écho local)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+
+    # Chaque session : une socket et un tube côté backend, plusieurs descripteurs côté serveur
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = None
+    port = args.port
+    if port is None:
+        server = subprocess.Popen([sys.executable, __file__, "--serve"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        port = int(server.stdout.readline())
+    try:
+        asyncio.run(run(args, port))
+    finally:
+        if server:
+            server.kill()
+    print("Note : le thread de transport paramiko de chaque session se réveille ~10 fois/s "
+          "(délai de socket de 0,1 s), d'où le CPU résiduel hors boucle asyncio.")
+
+if __name__ == "__main__":
+    main()
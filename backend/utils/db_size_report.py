@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Le script se lance depuis backend/ ou backend/utils/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def table_sizes(path):
+    """Octets occupés par table (index de la table inclus), via la table virtuelle dbstat"""
+    conn = sqlite3.connect(path)
+    try:
+        tables = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+        sizes = {}
+        for name, size in conn.execute("SELECT name, sum(pgsize) FROM dbstat GROUP BY name"):
+            group = tables.get(name, name)
+            if group.startswith("metrics_2"):
+                group = "metrics_AAAAMMJJ (segments)"
+            elif group.startswith("mining_2"):
+                group = "mining_AAAAMMJJ (segments)"
+            sizes[group] = sizes.get(group, 0) + size
+        total = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+        return sizes, total
+    finally:
+        conn.close()
+
+def compact(path):
+    """VACUUM pour comparer des fichiers sans pages libres"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("VACUUM")
+    conn.close()
+
+def generate_legacy_db(path, hosts, days, interval):
+    """Base au format d'origine (table metrics unique, uptime texte) pour mesurer la migration"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE metrics (
+            id INTEGER NOT NULL PRIMARY KEY,
+            hostname VARCHAR NOT NULL,
+            ip_address VARCHAR NOT NULL,
+            cpu_utilization FLOAT NOT NULL,
+            memory_utilization FLOAT NOT NULL,
+            disk_usage FLOAT NOT NULL,
+            last_seen DATETIME NOT NULL,
+            uptime VARCHAR NOT NULL
+        )
+        """)
+    conn.execute("CREATE INDEX ix_metrics_id ON metrics (id)")
+    conn.execute("CREATE INDEX ix_metrics_hostname ON metrics (hostname)")
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    rows = []
+    for host in range(hosts):
+        hostname = f"mineops-rig-{host:03d}"
+        ip_address = f"192.168.1.{host % 250 + 2}"
+        boot = start - timedelta(hours=random.randint(1, 500))
+        ts = start
+        while ts < end:
+            uptime = int((ts - boot).total_seconds())
+            text = ", ".join(part for part in (
+                f"{uptime // 86400} jours" if uptime >= 86400 else "",
+                f"{uptime % 86400 // 3600} heures" if uptime % 86400 >= 3600 else "",
+                f"{uptime % 3600 // 60} minutes" if uptime % 3600 >= 60 else "",
+            ) if part) or "moins d'une minute"
+            rows.append((
+                hostname, ip_address, round(random.uniform(80, 100), 1), round(random.uniform(20, 60), 1),
+                round(random.uniform(30, 40), 1), (ts + timedelta(microseconds=random.randint(0, 999999))).isoformat(" "),
+                text,
+            ))
+            ts += timedelta(seconds=interval)
+    rows.sort(key=lambda row: row[5])
+    conn.executemany(
+        "INSERT INTO metrics (hostname, ip_address, cpu_utilization, memory_utilization, disk_usage, last_seen, uptime) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def print_report(label, sizes, total, rows):
+    print(f"\n{label} : {total / 1024 / 1024:.2f} Mo ({total / rows:.1f} octets par métrique)")
+    for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        print(f"  {name:32} {size / 1024:10.0f} Ko")
+
+def main():
+    parser = argparse.ArgumentParser(description="Taille de la base avant/après migration vers le dernier schéma")
+    parser.add_argument("database", nargs="?", help="Base metrics.db à mesurer (copiée, jamais modifiée)")
+    parser.add_argument("--synthetic", action="store_true", help="Génère une base au format d'origine")
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval", type=int, default=30, help="Intervalle d'envoi simulé (secondes)")
+    args = parser.parse_args()
+    if not args.database and not args.synthetic:
+        parser.error("indiquer une base ou --synthetic")
+
+    workdir = tempfile.mkdtemp(prefix="mineops-size-")
+    try:
+        before = os.path.join(workdir, "before.db")
+        after = os.path.join(workdir, "after.db")
+        if args.synthetic:
+            generate_legacy_db(before, args.hosts, args.days, args.interval)
+        else:
+            shutil.copyfile(args.database, before)
+        compact(before)
+        shutil.copyfile(before, after)
+
+        # La migration s'exécute à l'import, comme au démarrage de l'API
+        os.environ["MINEOPS_DATABASE_URL"] = f"sqlite:///{after}"
+        import app.database  # noqa: F401
+        app.database.engine.dispose()
+        compact(after)
+
+        conn = sqlite3.connect(after)
+        rows = sum(
+            conn.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'metrics_[0-9]*'"
+            )
+        )
+        conn.close()
+        if not rows:
+            print("Aucune métrique dans la base")
+            return
+
+        before_sizes, before_total = table_sizes(before)
+        after_sizes, after_total = table_sizes(after)
+        print(f"{rows} métriques")
+        print_report("Avant", before_sizes, before_total, rows)
+        print_report("Après", after_sizes, after_total, rows)
+        raw_before = sum(size for name, size in before_sizes.items() if name.startswith("metrics") and "rollup" not in name)
+        raw_after = sum(size for name, size in after_sizes.items() if name.startswith("metrics") and "rollup" not in name)
+        print(f"\nMétriques brutes : {raw_before / rows:.1f} -> {raw_after / rows:.1f} octets par métrique "
+              f"({100 * (1 - raw_after / raw_before):.1f} %)")
+        print(f"Fichier complet (agrégats inclus) : {100 * (1 - after_total / before_total):.1f} %")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -18,14 +18,17 @@ export default function HostnameDashboard() {
     const isOnline = health?.status === "online";
 
     // Fonction helper pour déterminer le nombre de points selon la période
+    // (correspond à la résolution choisie par /metrics/history)
     const getMaxPointsForPeriod = (period) => {
         const map = {
-            "1h": 12,   // 1 point toutes les 5 minutes
-            "6h": 72,   // 1 point toutes les 5 minutes
+            "1h": 120,  // Données brutes (1 point toutes les 30 secondes)
+            "6h": 360,  // 1 point par minute
             "12h": 144, // 1 point toutes les 5 minutes
-            "24h": 288  // 1 point toutes les 5 minutes
+            "24h": 288, // 1 point toutes les 5 minutes
+            "7d": 168,  // 1 point par heure
+            "30d": 720  // 1 point par heure
         };
-        return map[period] || 72;
+        return map[period] || 360;
     };
 
     // Fonction pour générer des labels temporels corrects
@@ -49,6 +52,8 @@ export default function HostnameDashboard() {
                         minute: '2-digit' 
                     });
                 case "24h":
+                case "7d":
+                case "30d":
                     return date.toLocaleString('fr-FR', { 
                         day: '2-digit',
                         month: '2-digit',
@@ -203,7 +208,7 @@ export default function HostnameDashboard() {
                     <div className="flex flex-wrap items-center justify-center gap-4">
                         {/* Sélecteur de période */}
                         <div className="flex gap-2">
-                            {["1h", "6h", "12h", "24h"].map(period => (
+                            {["1h", "6h", "12h", "24h", "7d", "30d"].map(period => (
                                 <button
                                     key={period}
                                     onClick={() => setSelectedPeriod(period)}
@@ -2,7 +2,7 @@
 
 import { useState, useEffect, useRef } from "react";
 import Card from "@/components/Card";
-import { getLastMetricsByHostname, getMetrics, getAgentHealth } from "@/services/metrics";
+import { getFleetOverview } from "@/services/metrics";
 import AddMiner from "@/components/AddMiner";
 
 const Dashboard = () => {
@@ -19,8 +19,8 @@ const Dashboard = () => {
     useEffect(() => {
         const fetchMetrics = async () => {
             try {
-                const response = await getMetrics();
-                const uniqueHostnames = [...new Set(response.data.map(metric => metric.hostname))];
+                const response = await getFleetOverview();
+                const uniqueHostnames = response.data.hosts.map(host => host.hostname);
                 
                 // Détecter si une nouvelle machine a été ajoutée
                 if (previousHostnamesCount.current > 0 && uniqueHostnames.length > previousHostnamesCount.current) {
@@ -36,19 +36,14 @@ const Dashboard = () => {
                 const latestData = {};
                 const healthData = {};
 
-                await Promise.all(
-                    uniqueHostnames.map(async (hostname) => {
-                        const latestResponse = await getLastMetricsByHostname(hostname);
-                        latestData[hostname] = latestResponse.data;
-
-                        try {
-                            const healthResponse = await getAgentHealth(hostname);
-                            healthData[hostname] = healthResponse.data;
-                        } catch (e) {
-                            healthData[hostname] = { status: "offline" };
-                        }
-                    })
-                );
+                response.data.hosts.forEach(host => {
+                    latestData[host.hostname] = host.metrics;
+                    healthData[host.hostname] = {
+                        hostname: host.hostname,
+                        status: host.status,
+                        last_seen: host.last_seen
+                    };
+                });
                 setLatestMetrics(latestData);
                 setHealthStatus(healthData);
 
@@ -1,10 +1,10 @@
 "use client";
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import Terminal from "@/components/Terminal";
 import MachineSelector from "@/components/MachineSelector";
-import { executeCommand } from "@/services/commands";
-import { getMetrics } from "@/services/metrics";
+import { executeCommandStream } from "@/services/commands";
+import { getFleetOverview } from "@/services/metrics";
 
 const TerminalPage = () => {
     const [hostnames, setHostnames] = useState([]);
@@ -12,14 +12,15 @@ const TerminalPage = () => {
     const [terminalOutput, setTerminalOutput] = useState([]);
     const [isExecuting, setIsExecuting] = useState(false);
     const [showMachineSelector, setShowMachineSelector] = useState(false);
+    const [progress, setProgress] = useState(null);
+    const cancelRef = useRef(null);
 
     // Récupérer la liste des machines
     useEffect(() => {
         const fetchMachines = async () => {
             try {
-                const response = await getMetrics();
-                const uniqueHostnames = [...new Set(response.data.map(metric => metric.hostname))];
-                setHostnames(uniqueHostnames);
+                const response = await getFleetOverview();
+                setHostnames(response.data.hosts.map(host => host.hostname));
             } catch (error) {
                 console.error("Erreur lors de la récupération des machines:", error);
             }
@@ -40,21 +41,57 @@ const TerminalPage = () => {
             machines: selectedMachines 
         }]);
 
-        try {
-            const results = await executeCommand(command, selectedMachines);
-            results.forEach(result => {
+        // Sortie reçue par morceaux : seules les lignes complètes sont affichées, par machine
+        const partial = {};
+        const appendLines = (machine, stream, lines) => {
+            if (lines.length === 0) return;
+            setTerminalOutput(prev => [...prev, ...lines.map(line => ({
+                type: stream === 'stderr' ? 'stderr' : 'output',
+                machine,
+                message: line
+            }))]);
+        };
+        const flush = (machine) => {
+            Object.entries(partial[machine] || {}).forEach(([stream, rest]) => {
+                if (rest) appendLines(machine, stream, [rest]);
+            });
+            delete partial[machine];
+        };
+
+        const execution = executeCommandStream(command, selectedMachines, {
+            onStart: (hostnames) => setProgress({ done: 0, total: hostnames.length }),
+            onOutput: (machine, stream, data) => {
+                const buffers = partial[machine] = partial[machine] || {};
+                const lines = ((buffers[stream] || '') + data).split('\n');
+                buffers[stream] = lines.pop();
+                appendLines(machine, stream, lines);
+            },
+            onResult: (result) => {
+                flush(result.hostname);
+                const seconds = (result.duration_ms / 1000).toFixed(1);
                 setTerminalOutput(prev => [...prev, {
                     type: result.success ? 'success' : 'error',
                     machine: result.hostname,
-                    message: result.output
+                    // Sortie déjà affichée au fil de l'eau : seul le statut reste à afficher
+                    message: result.streamed
+                        ? `${result.success ? '✔' : '✘'} code ${result.return_code} (${seconds} s)`
+                        : result.output
                 }]);
-            });
+                setProgress(prev => prev && { ...prev, done: prev.done + 1 });
+            }
+        });
+        cancelRef.current = execution.cancel;
+
+        try {
+            await execution.done;
         } catch (error) {
             setTerminalOutput(prev => [...prev, { 
                 type: 'error', 
                 message: `Erreur: ${error.message}` 
             }]);
         } finally {
+            cancelRef.current = null;
+            setProgress(null);
             setIsExecuting(false);
         }
     };
@@ -80,6 +117,8 @@ const TerminalPage = () => {
                 output={terminalOutput}
                 onCommandExecute={executeCommandOnMachines}
                 isExecuting={isExecuting}
+                progress={progress}
+                onCancel={() => cancelRef.current?.()}
                 selectedMachinesCount={selectedMachines.length}
                 onToggleMachines={() => setShowMachineSelector(!showMachineSelector)}
                 className="flex-1"
@@ -1,5 +1,8 @@
-import { useState, useImperativeHandle, forwardRef } from "react";
-import { addMiner } from "@/services/install";
+import { useState, useEffect, useRef, useImperativeHandle, forwardRef } from "react";
+import { submitAddMiner, waitForJob } from "@/services/jobs";
+
+// Job d'installation en cours, retrouvé après un rafraîchissement de la page
+const JOB_STORAGE_KEY = "mineops.addMinerJob";
 
 const AddMiner = forwardRef((props, ref) => {
     const [showForm, setShowForm] = useState(false);
@@ -16,17 +19,18 @@ const AddMiner = forwardRef((props, ref) => {
         hideWaitingMessage: () => setShowWaitingMessage(false)
     }));
 
-    const handleSubmit = async (e) => {
-        e.preventDefault();
+    const [jobStatus, setJobStatus] = useState(null);
+    const mounted = useRef(true);
+
+    const followJob = async (jobId) => {
         setLoading(true);
-        setSuccess("");
-        setError("");
-        
         try {
-            const res = await addMiner(ip, user, pwd);
-            if (res.data.error) {
-                setError(res.data.error);
-            } else {
+            const job = await waitForJob(jobId, (job) => setJobStatus(job.status), {
+                shouldStop: () => !mounted.current
+            });
+            if (!job) return; // Composant démonté : le suivi reprendra au prochain affichage
+            localStorage.removeItem(JOB_STORAGE_KEY);
+            if (job.status === "succeeded") {
                 setSuccess("Installation réussie !");
                 setTimeout(() => {
                     setShowForm(false);
@@ -38,15 +42,56 @@ const AddMiner = forwardRef((props, ref) => {
                     setSuccess("");
                     setError("");
                 }, 2000);
+            } else {
+                setError(job.error || "Installation interrompue.");
+            }
+        } catch (err) {
+            console.error("Erreur lors du suivi de l'installation :", err);
+            if (err?.response?.status === 404) {
+                localStorage.removeItem(JOB_STORAGE_KEY);
+            }
+            setError(err?.response?.data?.detail || err?.message || "Erreur lors de l'installation.");
+        } finally {
+            if (mounted.current) {
+                setLoading(false);
+                setJobStatus(null);
             }
+        }
+    };
+
+    // Reprise du suivi d'une installation lancée avant un rafraîchissement
+    useEffect(() => {
+        mounted.current = true;
+        const pending = localStorage.getItem(JOB_STORAGE_KEY);
+        if (pending) {
+            const { jobId, ip: pendingIp } = JSON.parse(pending);
+            setShowForm(true);
+            setIp(pendingIp || "");
+            followJob(jobId);
+        }
+        return () => {
+            mounted.current = false;
+        };
+    }, []);
+
+    const handleSubmit = async (e) => {
+        e.preventDefault();
+        setLoading(true);
+        setSuccess("");
+        setError("");
+        
+        try {
+            const res = await submitAddMiner(ip, user, pwd);
+            localStorage.setItem(JOB_STORAGE_KEY, JSON.stringify({ jobId: res.data.job_id, ip }));
+            setPwd("");
+            await followJob(res.data.job_id);
         } catch (err) {
             console.error("Erreur lors de l'installation :", err);
             setError(
-                err?.response?.data?.error ||
+                err?.response?.data?.detail ||
                 err?.message ||
                 "Erreur lors de l'installation."
             );
-        } finally {
             setLoading(false);
         }
     };
@@ -117,7 +162,9 @@ const AddMiner = forwardRef((props, ref) => {
                         {loading && (
                             <div className="flex items-center justify-center gap-2 text-blue-400 py-2">
                                 <span className="animate-spin h-4 w-4 border-b-2 border-blue-400 rounded-full"></span>
-                                <span className="text-sm">Installation en cours...</span>
+                                <span className="text-sm">
+                                    {jobStatus === "queued" ? "Installation en attente..." : "Installation en cours..."}
+                                </span>
                             </div>
                         )}
                         
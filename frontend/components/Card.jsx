@@ -1,6 +1,6 @@
 import Link from "next/link";
 import { useState } from "react";
-import { rebootDevice } from "@/services/device";
+import { submitReboot, waitForJob } from "@/services/jobs";
 import InteractiveSSHTerminal from "./InteractiveSSHTerminal";
 
 const Card = ({ hostname, metrics, health }) => {
@@ -23,42 +23,28 @@ const Card = ({ hostname, metrics, health }) => {
         setShowConfirm(false);
         setRebootStatus(null);
         
-        try {
-            await rebootDevice(metrics?.ip_address);
-            // TOUJOURS TRAITER COMME UN SUCCÈS car le reboot fonctionne même avec timeout
-            setRebootStatus('success');
-            setRebootMessage(`Reboot lancé pour ${hostname}`);
-            
-            // Auto-hide success message after 3 seconds
+        const showStatus = (status, message, delay) => {
+            setRebootStatus(status);
+            setRebootMessage(message);
             setTimeout(() => {
                 setRebootStatus(null);
                 setRebootMessage("");
                 setIsRebooting(false); // RESET APRÈS LE MESSAGE
-            }, 3000);
-            
-        } catch (error) {
-            // DIFFÉRENCIER LES ERREURS TIMEOUT DES VRAIES ERREURS
-            if (error.message.includes('timeout') || error.code === 'ECONNABORTED') {
-                // Timeout = reboot probablement réussi (machine redémarre)
-                setRebootStatus('success');
-                setRebootMessage(`Reboot lancé pour ${hostname} (machine redémarre...)`);
-                
-                setTimeout(() => {
-                    setRebootStatus(null);
-                    setRebootMessage("");
-                    setIsRebooting(false);
-                }, 4000);
+            }, delay);
+        };
+
+        try {
+            // Job en arrière-plan : la requête répond tout de suite, le résultat est suivi par /jobs/{id}
+            const res = await submitReboot(metrics?.ip_address);
+            const job = await waitForJob(res.data.job_id, null, { interval: 1000 });
+            if (job.status === 'succeeded') {
+                showStatus('success', `Reboot lancé pour ${hostname}`, 3000);
             } else {
-                // Vraie erreur (SSH, connexion, etc.)
-                setRebootStatus('error');
-                setRebootMessage(`Erreur lors du reboot: ${error.message}`);
-                
-                setTimeout(() => {
-                    setRebootStatus(null);
-                    setRebootMessage("");
-                    setIsRebooting(false);
-                }, 5000);
+                showStatus('error', `Erreur lors du reboot: ${job.error || job.status}`, 5000);
             }
+        } catch (error) {
+            // Vraie erreur (API injoignable, file de jobs pleine, etc.)
+            showStatus('error', `Erreur lors du reboot: ${error?.response?.data?.detail || error.message}`, 5000);
         }
     };
 
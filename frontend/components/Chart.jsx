@@ -39,6 +39,8 @@ const Chart = ({ title, labels, values, color = "#5ca3fa", maxPoints = 72, perio
             case "6h": return 8;   // Toutes les 45 minutes environ
             case "12h": return 10; // Toutes les 1h15 environ
             case "24h": return 12; // Toutes les 2h
+            case "7d": return 7;   // Un par jour
+            case "30d": return 10; // Tous les 3 jours
             default: return 8;
         }
     };
@@ -6,6 +6,8 @@ const Terminal = ({
     output, 
     onCommandExecute, 
     isExecuting, 
+    progress,
+    onCancel,
     selectedMachinesCount,
     className = ""
 }) => {
@@ -63,6 +65,19 @@ const Terminal = ({
             <div className="flex items-center justify-between p-4 border-b border-white/20">
                 <h2 className="text-white font-bold text-xl">Terminal</h2>
                 <div className="flex items-center space-x-4">
+                    {isExecuting && progress && (
+                        <span className="text-white/70 text-sm">
+                            {progress.done}/{progress.total} terminée{progress.done > 1 ? 's' : ''}
+                        </span>
+                    )}
+                    {isExecuting && onCancel && (
+                        <button
+                            onClick={onCancel}
+                            className="px-3 py-1 bg-red-600 hover:bg-red-700 text-white text-sm rounded"
+                        >
+                            Annuler
+                        </button>
+                    )}
                     <span className="text-white/70 text-sm">
                         {selectedMachinesCount} machine{selectedMachinesCount > 1 ? 's' : ''} sélectionnée{selectedMachinesCount > 1 ? 's' : ''}
                     </span>
@@ -81,7 +96,7 @@ const Terminal = ({
                 className="flex-1 p-4 font-mono text-sm overflow-y-auto bg-black/20"
             >
                 {output.map((line, index) => (
-                    <div key={index} className={`mb-2 ${getOutputClass(line.type)}`}>
+                    <div key={index} className={`${isStreamLine(line.type) ? '' : 'mb-2'} ${getOutputClass(line.type)}`}>
                         {line.machine && (
                             <span className="text-blue-400">[{line.machine}] </span>
                         )}
@@ -125,6 +140,9 @@ const Terminal = ({
     );
 };
 
+// Lignes de sortie reçues au fil de l'eau : affichées sans espacement
+const isStreamLine = (type) => type === 'output' || type === 'stderr';
+
 const getOutputClass = (type) => {
     switch (type) {
         case 'command':
@@ -133,6 +151,10 @@ const getOutputClass = (type) => {
             return 'text-green-400';
         case 'error':
             return 'text-red-400';
+        case 'output':
+            return 'text-white';
+        case 'stderr':
+            return 'text-orange-300';
         default:
             return 'text-white';
     }
@@ -16,6 +16,65 @@ export const executeCommand = async (command, hostnames) => {
     }
 };
 
+// Exécution avec résultats au fil de l'eau (WebSocket /execute-command/ws).
+// handlers : onStart(hostnames), onOutput(hostname, stream, data), onResult(result)
+// Résout avec la durée totale (ms) ; retourne aussi cancel() pour interrompre l'exécution.
+export const executeCommandStream = (command, hostnames, handlers = {}) => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const host = window.location.hostname;
+    const port = '8000'; // Port backend
+    const ws = new WebSocket(`${protocol}//${host}:${port}/execute-command/ws`);
+
+    const done = new Promise((resolve, reject) => {
+        let finished = false;
+
+        ws.onopen = () => {
+            ws.send(JSON.stringify({ command, hostnames, stream_output: true }));
+        };
+
+        ws.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+            switch (message.type) {
+                case 'start':
+                    handlers.onStart?.(message.hostnames);
+                    break;
+                case 'output':
+                    handlers.onOutput?.(message.hostname, message.stream, message.data);
+                    break;
+                case 'result':
+                    handlers.onResult?.(message);
+                    break;
+                case 'done':
+                    finished = true;
+                    resolve(message.duration_ms);
+                    break;
+                case 'error':
+                    finished = true;
+                    reject(new Error(message.message));
+                    break;
+                default:
+                    break;
+            }
+        };
+
+        ws.onerror = () => {
+            if (!finished) {
+                finished = true;
+                reject(new Error('Erreur de connexion WebSocket'));
+            }
+        };
+
+        ws.onclose = () => {
+            if (!finished) {
+                finished = true;
+                reject(new Error('Exécution interrompue'));
+            }
+        };
+    });
+
+    return { done, cancel: () => ws.close() };
+};
+
 export const createSSHSession = async (hostname, ipAddress) => {
     try {
         const response = await instance.post("/ssh/create-session", {
@@ -0,0 +1,42 @@
+import instance from "@/lib/axios";
+
+// Opérations longues exécutées en arrière-plan par le backend (/jobs)
+// Chaque soumission répond immédiatement avec { job_id, status }
+
+export const submitAddMiner = (ip, user, password) =>
+    instance.post("/jobs/add-miner", {
+        ip_address: ip,
+        user,
+        password
+    });
+
+export const submitReboot = (ip_address) =>
+    instance.post(`/jobs/reboot/${ip_address}`);
+
+export const submitExecuteCommand = (command, hostnames) =>
+    instance.post("/jobs/execute-command", { command, hostnames });
+
+// { id, type, status, params, progress: { done, total }, result, error, ... }
+export const getJob = (jobId) => instance.get(`/jobs/${jobId}`);
+
+export const listJobs = (params = {}) => instance.get("/jobs", { params });
+
+export const cancelJob = (jobId) => instance.post(`/jobs/${jobId}/cancel`);
+
+const ACTIVE_STATUSES = ["queued", "running"];
+
+export const isJobActive = (job) => ACTIVE_STATUSES.includes(job?.status);
+
+// Interroge le job jusqu'à sa fin ; onUpdate(job) à chaque état reçu.
+// Résout avec l'état final. shouldStop() permet d'arrêter le suivi (composant démonté).
+export const waitForJob = async (jobId, onUpdate, { interval = 2000, shouldStop = () => false } = {}) => {
+    while (!shouldStop()) {
+        const { data: job } = await getJob(jobId);
+        onUpdate?.(job);
+        if (!isJobActive(job)) {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+    return null;
+};
@@ -1,16 +1,20 @@
 import instance from "@/lib/axios";
 
-// Récupérer les métriques
-export const getMetrics = () => instance.get("/metrics");
+// Récupérer les métriques (paginées : { items, next_cursor })
+// params : since, until, cursor, limit
+export const getMetrics = (params = {}) => instance.get("/metrics", { params });
 
-// Récupérer par hostname
-export const getMetricsByHostname = (hostname) =>
-    instance.get(`/metrics/hostname/${hostname}`);
+// Récupérer par hostname (paginées : { items, next_cursor })
+export const getMetricsByHostname = (hostname, params = {}) =>
+    instance.get(`/metrics/hostname/${hostname}`, { params });
 
 // Récupérer les dernières métrique du hostname
 export const getLastMetricsByHostname = (hostname) => 
     instance.get(`/metrics/latest/${hostname}`);
 
+// Vue d'ensemble du parc : dernière métrique et statut de chaque machine
+export const getFleetOverview = () => instance.get("/fleet/overview");
+
 // Récupérer la santé d'un agent
 export const getAgentHealth = (hostname) =>
     instance.get(`/healthcheck/${hostname}`);